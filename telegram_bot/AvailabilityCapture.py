@@ -0,0 +1,131 @@
+"""
+Reads the fares straight from the availability JSON the Ryanair SPA fetches,
+using Chrome's performance (CDP network) log instead of the rendered DOM.
+"""
+import base64
+import json
+import time
+
+# Path fragment of the booking API call that returns fares for a search
+AVAILABILITY_URL_MARKER = '/api/booking/v4/'
+AVAILABILITY_URL_SUFFIX = '/availability'
+
+
+def is_availability_url(url):
+    path = url.split('?', 1)[0]
+    return AVAILABILITY_URL_MARKER in path and path.endswith(AVAILABILITY_URL_SUFFIX)
+
+
+def finished_availability_requests(log_entries, pending):
+    """
+    Scan raw performance-log entries for availability responses.
+
+    Request ids whose response headers arrived are added to `pending`; the
+    ids whose body has finished loading are returned in arrival order and
+    removed from `pending`.
+    """
+    finished = []
+    for entry in log_entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.responseReceived':
+            if is_availability_url(params.get('response', {}).get('url', '')):
+                pending.add(params.get('requestId'))
+        elif method == 'Network.loadingFinished' and params.get('requestId') in pending:
+            pending.discard(params['requestId'])
+            finished.append(params['requestId'])
+    return finished
+
+
+def decode_response_body(body):
+    """Turn a Network.getResponseBody result into the parsed JSON payload."""
+    text = body.get('body', '')
+    if body.get('base64Encoded'):
+        text = base64.b64decode(text).decode('utf-8')
+    return json.loads(text)
+
+
+def parse_availability(payload):
+    """
+    Flatten an availability payload into structured fares.
+
+    Returns a dict of 'YYYY-MM-DD' -> list of flights, every flight being a
+    dict with flight_number, origin, destination, departure, arrival,
+    amount, currency and fares_left. Dates without flights map to [].
+    """
+    currency = payload.get('currency', '?')
+    fares = {}
+    for trip in payload.get('trips', []):
+        for day in trip.get('dates', []):
+            date = day.get('dateOut', '')[:10]
+            flights = fares.setdefault(date, [])
+            for flight in day.get('flights', []):
+                adult_fares = [
+                    fare for fare in (flight.get('regularFare') or {}).get('fares', [])
+                    if fare.get('type') == 'ADT'
+                ]
+                if not adult_fares or flight.get('faresLeft') == 0:
+                    continue  # sold out
+                times = flight.get('time') or [None, None]
+                flights.append({
+                    'flight_number': flight.get('flightNumber'),
+                    'origin': trip.get('origin'),
+                    'destination': trip.get('destination'),
+                    'departure': times[0],
+                    'arrival': times[-1],
+                    'amount': float(adult_fares[0]['amount']),
+                    'currency': currency,
+                    'fares_left': flight.get('faresLeft'),
+                })
+    return fares
+
+
+def fares_by_date(payload):
+    """
+    Cheapest fare per date, in the same shape FlightSearcher returns for the
+    DOM carousel, with every flight of the day attached under 'flights'.
+    """
+    prices = {}
+    for date, flights in parse_availability(payload).items():
+        if not flights:
+            continue
+        cheapest = min(flights, key=lambda f: f['amount'])
+        prices[date] = {
+            'currency': cheapest['currency'],
+            'amount': cheapest['amount'],
+            'date': date,
+            'flights': flights,
+        }
+    return prices
+
+
+def drain_performance_log(driver):
+    """Discard buffered log entries so only the next navigation is inspected."""
+    driver.get_log('performance')
+
+
+def wait_for_availability(driver, timeout, poll_interval=0.1, seen=None):
+    """
+    Poll the performance log until the availability response has loaded and
+    return its parsed payload, or None if it did not arrive within `timeout`.
+    Returns as soon as the response is complete, without waiting for the
+    page to render it. Log entries read along the way are appended to `seen`.
+    """
+    pending = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        entries = driver.get_log('performance')
+        if seen is not None:
+            seen.extend(entries)
+        for request_id in finished_availability_requests(entries, pending):
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            try:
+                return decode_response_body(body)
+            except ValueError as e:
+                print(f"Error decoding availability response: {e}")
+        time.sleep(poll_interval)
+    return None
@@ -0,0 +1,100 @@
+"""
+Lean browser profile: blocks the parts of the Ryanair page we don't need
+(images, fonts, analytics, ads) over CDP and measures what every page cost.
+"""
+import json
+import threading
+from collections import deque
+from utils.config import lean_calibrate_every
+
+# URL patterns (CDP wildcard syntax) never needed to read fares
+LEAN_BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.avif',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm',
+    '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*',
+    '*googleadservices.com*', '*facebook.net*', '*facebook.com/tr*',
+    '*hotjar.com*', '*optimizely.com*', '*newrelic.com*', '*nr-data.net*',
+    '*bing.com*', '*tiktok.com*', '*criteo.*', '*adnxs.com*', '*quantummetric.com*',
+]
+
+
+def set_blocking(driver, enabled):
+    """Turn CDP URL blocking of the lean patterns on or off for this driver."""
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URL_PATTERNS if enabled else []})
+
+
+def page_traffic(log_entries):
+    """
+    Sum up a page's traffic from its performance-log entries.
+    Returns (bytes transferred, requests finished, requests blocked).
+    """
+    transferred, finished, blocked = 0, 0, 0
+    for entry in log_entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.loadingFinished':
+            transferred += int(params.get('encodedDataLength', 0))
+            finished += 1
+        elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+            blocked += 1
+    return transferred, finished, blocked
+
+
+class PageStats:
+    """
+    Rolling per-profile page cost, used to report what the lean profile saves.
+
+    The 'full' average comes from calibration pages: every `calibrate_every`
+    lean pages, one is loaded without blocking to keep the baseline current.
+    """
+
+    def __init__(self, window=50, calibrate_every=lean_calibrate_every):
+        self.calibrate_every = calibrate_every
+        self._samples = {'lean': deque(maxlen=window), 'full': deque(maxlen=window)}
+        self._lean_since_calibration = 0
+        self._lock = threading.Lock()
+
+    def needs_calibration(self):
+        """Whether the next lean page should be loaded unblocked as a baseline."""
+        if not self.calibrate_every:
+            return False
+        with self._lock:
+            return not self._samples['full'] or self._lean_since_calibration >= self.calibrate_every
+
+    def record(self, profile, transferred, seconds, blocked):
+        """Store one page and return a one-line report for the log."""
+        with self._lock:
+            self._samples[profile].append((transferred, seconds))
+            if profile == 'lean':
+                self._lean_since_calibration += 1
+            else:
+                self._lean_since_calibration = 0
+            full = list(self._samples['full'])
+
+        line = f"[{profile}] page: {transferred / 1024:.0f} KB in {seconds:.2f}s, {blocked} request(s) blocked"
+        if profile == 'lean' and full:
+            full_bytes = sum(b for b, _ in full) / len(full)
+            full_seconds = sum(s for _, s in full) / len(full)
+            line += f" (saved ~{(full_bytes - transferred) / 1024:.0f} KB, {full_seconds - seconds:.2f}s vs full page)"
+        return line
+
+    def summary(self):
+        with self._lock:
+            result = {}
+            for profile, samples in self._samples.items():
+                if samples:
+                    result[profile] = {
+                        'pages': len(samples),
+                        'avg_kb': round(sum(b for b, _ in samples) / len(samples) / 1024, 1),
+                        'avg_seconds': round(sum(s for _, s in samples) / len(samples), 3),
+                    }
+            return result
+
+
+page_stats = PageStats()
@@ -0,0 +1,138 @@
+"""
+Reads the fare carousel of the results page with a single execute_script
+call, instead of one WebDriver round trip per box, child and attribute.
+"""
+import re
+from datetime import timedelta
+
+# Runs in the page: returns one entry per carousel box, in display order
+CAROUSEL_SCRIPT = """
+return Array.prototype.map.call(
+    document.querySelectorAll('carousel-container carousel-item'),
+    function (item, index) {
+        var price = item.querySelector('ry-price');
+        var selected = Array.prototype.some.call(item.children, function (child) {
+            return child.classList.contains('date-item--selected');
+        });
+        return {
+            index: index,
+            selected: selected,
+            price: price ? price.textContent.replace(/\\s+/g, ' ').trim() : null
+        };
+    }
+);
+"""
+
+# Polled while waiting for the results page: gathers in one round trip what
+# page_state() needs to tell fares, no-flight and block pages apart
+PAGE_FACTS_SCRIPT = """
+var selected = document.querySelector('carousel-container carousel-item .date-item--selected');
+return {
+    title: document.title || '',
+    captcha: !!document.querySelector('iframe[src*="captcha"], #px-captcha, .g-recaptcha'),
+    fares: !!document.querySelector('flight-card-new'),
+    selected: selected ? {
+        price: !!selected.querySelector('ry-price'),
+        no_flights: !!selected.querySelector('.date-item__price--no-flights')
+    } : null,
+    any_price: !!document.querySelector('carousel-container carousel-item ry-price')
+};
+"""
+
+BLOCK_MARKERS = ('access denied', 'request unsuccessful', 'attention required',
+                 'pardon our interruption', 'just a moment', 'are you a robot')
+
+
+def page_state(facts):
+    """
+    Classify the PAGE_FACTS_SCRIPT result as 'blocked', 'fares' or
+    'no_flight'. Returns None while the page is still loading.
+    """
+    if not facts:
+        return None
+    title = facts.get('title', '').lower()
+    if facts.get('captcha') or any(marker in title for marker in BLOCK_MARKERS):
+        return 'blocked'
+    if facts.get('fares'):
+        return 'fares'
+    selected = facts.get('selected')
+    if selected and not selected.get('price'):
+        # The box says so itself, or a neighbour is priced so the carousel has rendered
+        if selected.get('no_flights') or facts.get('any_price'):
+            return 'no_flight'
+    return None
+
+
+def read_page_state(driver):
+    return page_state(driver.execute_script(PAGE_FACTS_SCRIPT))
+
+
+_PRICE_RE = re.compile(r'^\s*([^\d\s.,]*)\s*([\d][\d.,\s]*?)\s*([^\d\s.,]*)\s*$')
+
+
+def parse_amount(number):
+    """Parse '1.234,50', '1,234.50', '19,99' or '19.99' into a float."""
+    number = number.replace(' ', '')
+    if ',' in number and '.' in number:
+        # Whichever separator comes last is the decimal one
+        decimal = ',' if number.rfind(',') > number.rfind('.') else '.'
+        thousands = '.' if decimal == ',' else ','
+        number = number.replace(thousands, '').replace(decimal, '.')
+    elif ',' in number:
+        number = number.replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(\.\d{3})+', number):
+        number = number.replace('.', '')
+    return float(number)
+
+
+def parse_price_text(text):
+    """
+    Split a rendered price such as '€ 19,99' or '19,99 €' into
+    (currency, amount). Returns None if the text is not a price.
+    """
+    match = _PRICE_RE.match(text or '')
+    if not match:
+        return None
+    currency = match.group(1) or match.group(3)
+    try:
+        return currency, parse_amount(match.group(2))
+    except ValueError:
+        return None
+
+
+def covered_dates(items, flightDate):
+    """Every date shown in the carousel, priced or not."""
+    selected = next((item['index'] for item in items if item.get('selected')), None)
+    if selected is None:
+        return []
+    return [
+        (flightDate + timedelta(days=item['index'] - selected)).strftime("%Y-%m-%d")
+        for item in items
+    ]
+
+
+def parse_carousel(items, flightDate):
+    """
+    Turn the CAROUSEL_SCRIPT result into a dict of 'YYYY-MM-DD' -> price info.
+
+    The carousel lists consecutive days around the searched one, so each
+    box's date is derived from its offset to the selected box. Days with no
+    flight (no ry-price) are left out.
+    """
+    selected = next((item['index'] for item in items if item.get('selected')), None)
+    if selected is None:
+        return {}
+
+    prices = {}
+    for item in items:
+        parsed = parse_price_text(item.get('price'))
+        if not parsed:
+            continue
+        date = (flightDate + timedelta(days=item['index'] - selected)).strftime("%Y-%m-%d")
+        currency, amount = parsed
+        prices[date] = {
+            'currency': currency,
+            'amount': amount,
+            'date': date,
+        }
+    return prices
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from utils.config import consent_cookie_file
+
+
+def _to_cdp_cookie(cookie):
+    """Convert a Selenium cookie dict into the shape Network.setCookies expects."""
+    cdp_cookie = {
+        'name': cookie['name'],
+        'value': cookie['value'],
+        'domain': cookie.get('domain', '.ryanair.com'),
+        'path': cookie.get('path', '/'),
+        'secure': cookie.get('secure', False),
+        'httpOnly': cookie.get('httpOnly', False),
+    }
+    if cookie.get('sameSite'):
+        cdp_cookie['sameSite'] = cookie['sameSite']
+    if cookie.get('expiry'):
+        cdp_cookie['expires'] = cookie['expiry']
+    return cdp_cookie
+
+
+class ConsentStore:
+    """
+    Keeps the cookies the site sets when the cookie popup is accepted, so
+    pooled browsers (whose cookies are wiped between lookups) can start every
+    page with consent already given and skip waiting for the popup.
+
+    The cookies are persisted to a JSON file, shared by every process.
+    """
+
+    def __init__(self, path=consent_cookie_file):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cookies = None
+
+    def load(self):
+        with self._lock:
+            if self._cookies is None:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._cookies = json.load(f)
+                except (OSError, ValueError):
+                    self._cookies = []
+            now = time.time()
+            self._cookies = [c for c in self._cookies if not c.get('expiry') or c['expiry'] > now]
+            return list(self._cookies)
+
+    def save(self, cookies):
+        with self._lock:
+            self._cookies = list(cookies)
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._cookies, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not persist consent cookies: {e}")
+
+    def clear(self):
+        self.save([])
+
+    def seed(self, driver):
+        """Pre-load stored consent cookies into the browser. Returns True if any were set."""
+        cookies = self.load()
+        if not cookies:
+            return False
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': [_to_cdp_cookie(c) for c in cookies]})
+        return True
+
+    def capture(self, before, after):
+        """
+        Store the cookies that appeared or changed when the popup was accepted.
+        `before` and `after` are driver.get_cookies() results around the click.
+        """
+        previous = {c['name']: c['value'] for c in before}
+        consent = [c for c in after if previous.get(c['name']) != c['value']]
+        if consent:
+            self.save(consent)
+            print(f"Stored {len(consent)} consent cookie(s): {', '.join(c['name'] for c in consent)}")
+        return consent
+
+
+consent_store = ConsentStore()
@@ -0,0 +1,293 @@
+import atexit
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from utils.config import driver_pool_size, driver_max_pages, driver_max_rss_mb
+from utils.config import lean_browser, page_load_strategy
+import BrowserProfile
+from ProxyPool import get_shared_proxy_pool
+
+
+def _free_port():
+    """Ask the OS for an unused local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _process_tree_rss_mb(root_pid):
+    """
+    Resident memory (MB) of a process and all of its descendants.
+    Reads /proc directly, so it returns None on platforms without it.
+    """
+    if not root_pid or not os.path.isdir('/proc'):
+        return None
+
+    children = {}
+    rss_kb = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                ppid, rss = None, 0
+                for line in f:
+                    if line.startswith('PPid:'):
+                        ppid = int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss = int(line.split()[1])
+        except (OSError, ValueError):
+            continue
+        pid = int(entry)
+        rss_kb[pid] = rss
+        children.setdefault(ppid, []).append(pid)
+
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss_kb.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total / 1024
+
+
+class PooledDriver:
+    """A Chrome instance owned by the pool, plus its usage counters."""
+
+    def __init__(self, driver, port, proxy=None):
+        self.driver = driver
+        self.port = port
+        # The ProxyPool proxy this browser is bound to (None: direct)
+        self.proxy = proxy
+        self.pages = 0
+        self.broken = False
+
+    @property
+    def pid(self):
+        service = getattr(self.driver, 'service', None)
+        process = getattr(service, 'process', None)
+        return getattr(process, 'pid', None)
+
+    def rss_mb(self):
+        return _process_tree_rss_mb(self.pid)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error quitting driver on port {self.port}: {e}")
+
+
+class DriverPool:
+    """
+    Bounded pool of warm Chrome drivers.
+
+    Drivers are handed out with `with pool.driver() as driver:` and come back
+    to the pool afterwards. Between uses they are reset (cookies and web
+    storage cleared), on checkout they are health-checked, and they are
+    recycled once they have served `max_pages` pages or their process tree
+    grows past `max_rss_mb`. With a proxy pool every browser is started
+    bound to one proxy, spreading the browsers over the proxies.
+    """
+
+    def __init__(self, size=driver_pool_size, max_pages=driver_max_pages, max_rss_mb=driver_max_rss_mb,
+                 lean=lean_browser, load_strategy=page_load_strategy, proxy_pool=None):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.lean = lean
+        self.load_strategy = load_strategy
+        self.proxy_pool = proxy_pool
+        self._idle = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def ensure_size(self, size):
+        """Grow the pool so that at least `size` drivers can be checked out at once."""
+        with self._cond:
+            if size > self.size:
+                self.size = size
+                self._cond.notify_all()
+
+    def _build_options(self, port, proxy=None):
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.add_argument("--headless=new")  # Use new headless mode
+        chrome_options.add_argument("--no-sandbox")  # Required for running as root/in containers
+        chrome_options.add_argument("--disable-dev-shm-usage")  # Overcome limited /dev/shm size
+        chrome_options.add_argument("--disable-gpu")  # Recommended for headless mode
+        chrome_options.add_argument("--disable-cache")
+        chrome_options.add_argument("--disable-application-cache")
+        chrome_options.add_argument("--disable-offline-load-stale-cache")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-software-rasterizer")
+        chrome_options.add_argument("--window-size=1920,1080")
+        # Every driver gets its own port so several browsers can run side by side
+        chrome_options.add_argument(f"--remote-debugging-port={port}")
+        # Network events feed the availability-JSON extraction mode and page stats
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        # 'eager'/'none' return from get() before images and late scripts finish
+        chrome_options.page_load_strategy = self.load_strategy
+        if proxy:
+            # Chrome takes no credentials here: proxies must allow this host by IP
+            chrome_options.add_argument(f"--proxy-server={proxy.name}")
+        return chrome_options
+
+    def _create(self):
+        port = _free_port()
+        proxy = self.proxy_pool.assign() if self.proxy_pool else None
+        try:
+            driver = webdriver.Chrome(options=self._build_options(port, proxy))
+        except Exception:
+            if proxy:
+                self.proxy_pool.unassign(proxy)
+            raise
+        driver.delete_all_cookies()
+        if self.lean:
+            # Images are blocked by URL pattern rather than a content setting,
+            # so calibration pages can turn them back on
+            BrowserProfile.set_blocking(driver, True)
+        return PooledDriver(driver, port, proxy)
+
+    def _discard(self, slot):
+        slot.quit()
+        if slot.proxy:
+            self.proxy_pool.unassign(slot.proxy)
+
+    def _is_healthy(self, slot):
+        if slot.broken:
+            return False
+        try:
+            slot.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _should_recycle(self, slot):
+        if slot.broken:
+            return True
+        if self.max_pages and slot.pages >= self.max_pages:
+            return True
+        if self.max_rss_mb:
+            rss = slot.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                print(f"Recycling driver on port {slot.port}: {rss:.0f} MB RSS")
+                return True
+        return False
+
+    def _reset(self, slot):
+        """Wipe per-session state so the next lookup starts clean."""
+        driver = slot.driver
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except WebDriverException:
+            pass  # about:blank and error pages have no storage
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def acquire(self, timeout=None):
+        """Check out a healthy driver, starting a new one if the pool has room."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self._idle:
+                    slot = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use + len(self._idle) < self.size:
+                    slot = None
+                    self._in_use += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No browser available in the driver pool")
+                self._cond.wait(remaining)
+
+        try:
+            if slot is not None and not self._is_healthy(slot):
+                print(f"Driver on port {slot.port} failed health check, replacing it.")
+                self._discard(slot)
+                slot = None
+            if slot is None:
+                slot = self._create()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return slot
+
+    def release(self, slot):
+        """Return a driver to the pool, resetting or recycling it."""
+        slot.pages += 1
+        recycle = self._should_recycle(slot)
+        if not recycle:
+            try:
+                self._reset(slot)
+            except WebDriverException as e:
+                print(f"Driver reset failed on port {slot.port}: {e}")
+                recycle = True
+
+        with self._cond:
+            self._in_use -= 1
+            keep = not recycle and not self._closed
+            if keep:
+                self._idle.append(slot)
+            self._cond.notify()
+        if not keep:
+            self._discard(slot)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        with self.slot(timeout) as slot:
+            yield slot.driver
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Like driver(), but yields the PooledDriver (driver plus its proxy)."""
+        slot = self.acquire(timeout)
+        try:
+            yield slot
+        except TimeoutException:
+            raise  # a slow page is not a broken browser
+        except WebDriverException:
+            slot.broken = True
+            raise
+        finally:
+            self.release(slot)
+
+    def drain(self):
+        """Quit idle drivers; drivers in use are quit when they come back."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for slot in idle:
+            self._discard(slot)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.drain()
+
+    def stats(self):
+        with self._cond:
+            return {'size': self.size, 'idle': len(self._idle), 'in_use': self._in_use}
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """Process-wide pool shared by every FlightSearcher in this process."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None or _shared_pool._closed:
+            _shared_pool = DriverPool(proxy_pool=get_shared_proxy_pool())
+            atexit.register(_shared_pool.close)
+        return _shared_pool
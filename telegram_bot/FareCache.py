@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.config import fare_cache_file, fare_cache_ttl, fare_cache_lease
+from SearchBackend import LookupFailure, NO_FLIGHT, TIMEOUT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fares (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inflight (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def cache_key(origin, destination, date, pax):
+    return f"{origin}-{destination}-{date}-{pax}"
+
+
+def _encode(value):
+    if isinstance(value, LookupFailure):
+        return json.dumps({'no_flight': True})
+    return json.dumps(value)
+
+
+def _decode(text):
+    value = json.loads(text)
+    if value.get('no_flight'):
+        return LookupFailure(NO_FLIGHT, 'cached')
+    return value
+
+
+def _wait(event, timeout, cancelled=None, poll=0.2):
+    """event.wait(timeout), cut short when `cancelled` is set. False if it was."""
+    if cancelled is None:
+        event.wait(timeout)
+        return True
+    deadline = time.monotonic() + timeout
+    while not cancelled.is_set():
+        remaining = deadline - time.monotonic()
+        if event.wait(min(poll, max(0, remaining))) or remaining <= 0:
+            return True
+    return False
+
+
+class FareCache:
+    """
+    Short-lived fare cache in a SQLite file shared by the bot and the web
+    app, keyed by (origin, destination, date, pax).
+
+    Prices and definitive "no flight" answers are kept for `ttl` seconds;
+    retryable failures are never cached. fetch() is single-flight: while a
+    key is being looked up, other threads of the process wait for that
+    lookup, and other processes see its claim in the `inflight` table and
+    wait for the result (at most `lease` seconds) instead of scraping too.
+    Setting the `cancelled` event passed to fetch() ends those waits.
+    """
+
+    def __init__(self, path=fare_cache_file, ttl=fare_cache_ttl, lease=fare_cache_lease):
+        self.path = str(path)
+        self.ttl = ttl
+        self.lease = lease
+        self.owner = f"{os.getpid()}"
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def __connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def get(self, origin, destination, date, pax=1):
+        """The cached price info or LookupFailure(NO_FLIGHT), or None on a miss."""
+        if not self.ttl:
+            return None
+        conn = self.__connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM fares WHERE key = ? AND stored_at > ?",
+                (cache_key(origin, destination, date, pax), time.time() - self.ttl),
+            ).fetchone()
+        finally:
+            conn.close()
+        return _decode(row[0]) if row else None
+
+    def put(self, origin, destination, fares, pax=1):
+        """Store a lookup's 'YYYY-MM-DD' -> value dict; retryable failures are skipped."""
+        if not self.ttl:
+            return
+        now = time.time()
+        rows = [
+            (cache_key(origin, destination, date, pax), _encode(value), now)
+            for date, value in fares.items()
+            if not (isinstance(value, LookupFailure) and value.retryable)
+        ]
+        if not rows:
+            return
+        conn = self.__connect()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO fares (key, value, stored_at) VALUES (?, ?, ?)", rows)
+            conn.execute("DELETE FROM fares WHERE stored_at <= ?", (now - self.ttl,))
+        finally:
+            conn.close()
+
+    def fetch(self, origin, destination, date, loader, pax=1, cancelled=None):
+        """
+        Return {date: cached value} on a hit; otherwise run `loader()` (a
+        backend get_prices call), cache what it returned and return it.
+        If `cancelled` is set while waiting for another lookup of the key,
+        the date comes back as a TIMEOUT failure.
+        """
+        cached = self.get(origin, destination, date, pax)
+        if cached is not None:
+            return {date: cached}
+        if not self.ttl:
+            return loader()
+
+        key = cache_key(origin, destination, date, pax)
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            # Same key being looked up by another thread: wait for its answer
+            if not _wait(event, self.lease, cancelled):
+                return {date: LookupFailure(TIMEOUT, 'search cancelled')}
+            cached = self.get(origin, destination, date, pax)
+            if cached is not None:
+                return {date: cached}
+            return self.fetch(origin, destination, date, loader, pax, cancelled)
+
+        try:
+            if not self.__claim(key):
+                cached = self.__wait_for_other_process(origin, destination, date, pax, key, cancelled)
+                if cached is not None:
+                    return {date: cached}
+            result = loader()
+            if isinstance(result, dict):
+                self.put(origin, destination, result, pax)
+            return result
+        finally:
+            self.__release(key)
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def __claim(self, key):
+        """Mark `key` as being looked up by this process. False if another process holds it."""
+        now = time.time()
+        conn = self.__connect()
+        try:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO inflight (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, self.owner, now + self.lease),
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def __wait_for_other_process(self, origin, destination, date, pax, key, cancelled=None):
+        # Like time.sleep, but cut short by the searcher's cancel event
+        stop = cancelled or threading.Event()
+        deadline = time.time() + self.lease
+        while time.time() < deadline:
+            if stop.wait(0.2):
+                return LookupFailure(TIMEOUT, 'search cancelled')
+            cached = self.get(origin, destination, date, pax)
+            if cached is not None:
+                return cached
+            if self.__claim(key):
+                return None  # the other process gave up: look it up ourselves
+        self.__claim(key)
+        return None
+
+    def __release(self, key):
+        conn = self.__connect()
+        try:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, self.owner))
+        finally:
+            conn.close()
+
+
+fare_cache = FareCache()
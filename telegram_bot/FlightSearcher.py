@@ -1,150 +1,168 @@
 import csv
-from selenium import webdriver
-import subprocess
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-import datetime
-from FlightURLBuilder import FlightURLBuilder
-from selenium.webdriver.common.by import By
-from datetime import datetime
 import random
+import threading
 import time
-from utils.config import bash_script_connect
-from utils.config import bash_script_disconnect
-from utils.config import vpn_countries
+from utils.config import search_backend
+from utils.config import retry_backoff_base, retry_backoff_max
+from SearchBackend import BackendBlocked, LookupFailure, BLOCKED, PARSE_ERROR
+from SeleniumBackend import SeleniumBackend
+from HttpBackend import HttpBackend
+from VpnSession import vpn_session as shared_vpn_session
+from ProxyPool import get_shared_proxy_pool
+from RateLimiter import rate_limiter as shared_rate_limiter
+from FareCache import fare_cache as shared_fare_cache
 
-class FlightSearcher:
-    def __init__(self, vpn):
-        self.vpn = vpn
 
-    def __disconnect_vpn(self):
-        if self.vpn:
-            command = f"{bash_script_disconnect}"
-            subprocess.run(command, shell=True)
+def backoff_delay(attempt, base=retry_backoff_base, cap=retry_backoff_max):
+    """Seconds to wait before retry number `attempt` (0-based): jittered exponential, capped."""
+    return min(cap, base * 2 ** attempt * random.uniform(0.5, 1.5))
 
-    def __connect_vpn(self, vpn_server):
-        if self.vpn:
-            command = f"{bash_script_connect} {vpn_server}"
-            result = subprocess.run(command, shell=True)
-
-            if result.returncode == 0:
-                print("Connected to NordVPN successfully.")
-                # Wait for a few seconds to ensure the VPN connection is established
-                time.sleep(10)
-                return True
-            else:
-                print("Failed to connect to NordVPN.")
-                return False
-            
+
+class SearchCancelled(Exception):
+    """Raised inside a search once FlightSearcher.cancel() has been called."""
 
 
-    def __search_flights(self, origins, destinations, dates):
+class FlightSearcher:
+    def __init__(self, vpn, driver_pool=None, extraction=None, backend=None, vpn_session=None,
+                 proxy_pool=None, rate_limiter=None, fare_cache=None, egress=None):
+        self.vpn = vpn
+        # The tunnel is shared by every searcher of the process and kept across searches
+        self.vpn_session = vpn_session or shared_vpn_session
+        # Why each requested date of the last search_flights_with_retry came back without a price
+        self.last_failures = {}
+        # Lookups are for one adult (FlightURLBuilder and HttpBackend defaults)
+        self.pax = 1
+        # Recent answers are shared with every searcher, in this process or another
+        self.fare_cache = fare_cache or shared_fare_cache
+        # Every lookup, whatever process started it, goes through one governor; the
+        # backends consult it since only they know which proxy a lookup leaves from
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        # Set from another thread to abort the running search between lookups
+        self.cancelled = threading.Event()
+        self.backend = backend or search_backend
+        if self.backend not in ('selenium', 'http'):
+            raise ValueError(f"Unknown search backend '{self.backend}'")
+        # Selenium is always available: it is the fallback when HTTP is blocked
+        self.selenium_backend = SeleniumBackend(driver_pool=driver_pool, extraction=extraction,
+                                                rate_limiter=self.rate_limiter, cancelled=self.cancelled)
+        # HTTP requests spread over the proxy pool (PROXIES); browsers get theirs from the driver pool
+        self.proxy_pool = proxy_pool or get_shared_proxy_pool()
+        self.http_backend = None
+        if self.backend == 'http':
+            self.http_backend = HttpBackend(proxy_pool=self.proxy_pool, rate_limiter=self.rate_limiter,
+                                            cancelled=self.cancelled)
+        # Without vpn, lookups may still ride a tunnel another process connected:
+        # `egress` names that exit for rate limits and timeouts
+        if egress:
+            self.selenium_backend.egress = egress
+            if self.http_backend:
+                self.http_backend.egress = egress
+
+    def cancel(self):
+        """Abort the running search: it stops before its next lookup or wait."""
+        self.cancelled.set()
+
+    def __check_cancelled(self):
+        if self.cancelled.is_set():
+            raise SearchCancelled("Search cancelled")
+
+    def __wait(self, seconds):
+        # Like time.sleep, but cut short by cancel()
+        if self.cancelled.wait(seconds):
+            raise SearchCancelled("Search cancelled")
+
+    def __search_flights(self, origins, destinations, dates, all_carousel_dates=False):
         prices = {}
         for origin in origins:
             for destination in destinations:
-                for date in dates:
+                # One lookup also prices the neighbouring days (fare carousel or
+                # flex days), so dates it already covered don't need their own
+                harvested = {}
+                for date in sorted(dates):
+                    if date not in harvested:
+                        self.__check_cancelled()
+                        result = self.fare_cache.fetch(
+                            origin, destination, date,
+                            lambda: self.__timed_price(origin, destination, date),
+                            pax=self.pax, cancelled=self.cancelled,
+                        )
+                        if isinstance(result, dict):
+                            for day, value in result.items():
+                                # Never let a failed answer overwrite a price found earlier
+                                if not isinstance(value, LookupFailure) or day not in harvested:
+                                    harvested[day] = value
+                        else:
+                            harvested[date] = result
                     flight_key = f"{origin}-{destination} on {date}"
-                    prices[flight_key] = self.__get_price(origin, destination, date)
+                    prices[flight_key] = harvested.get(
+                        date, LookupFailure(PARSE_ERROR, 'date missing from the answer')
+                    )
+
+                if all_carousel_dates:
+                    for date, price_info in harvested.items():
+                        if not isinstance(price_info, LookupFailure):
+                            prices.setdefault(f"{origin}-{destination} on {date}", price_info)
         return prices
-    
-    def __setupWebDriver(self):
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument("--headless=new")  # Use new headless mode
-        chrome_options.add_argument("--no-sandbox")  # Required for running as root/in containers
-        chrome_options.add_argument("--disable-dev-shm-usage")  # Overcome limited /dev/shm size
-        chrome_options.add_argument("--disable-gpu")  # Recommended for headless mode
-        chrome_options.add_argument("--disable-cache")
-        chrome_options.add_argument("--disable-application-cache")
-        chrome_options.add_argument("--disable-offline-load-stale-cache")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-software-rasterizer")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--remote-debugging-port=9222")
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.delete_all_cookies()
+
+    def __timed_price(self, origin, destination, date):
+        """
+        Look a date up and credit the outcome to the VPN exit it went through.
+        The backends take care of the rate limit and circuit breaker.
+        """
+        country = self.vpn_session.country if self.vpn else None
+        started = time.monotonic()
+        result = self.__get_price(origin, destination, date)
+        # Cancelled while waiting for the rate limiter
+        self.__check_cancelled()
+        if country:
+            failed = isinstance(result, LookupFailure) and result.retryable
+            self.vpn_session.record_lookup(country, not failed, time.monotonic() - started)
+        return result
 
     def __get_price(self, origin, destination, date):
-        flightBuilder = FlightURLBuilder()
-        flightBuilder.set_origin(origin)
-        flightBuilder.set_destination(destination)
-        flightBuilder.set_date_out(date)
-
-        url = flightBuilder.build_url()
-        self.__setupWebDriver()
-        self.driver.get(url)
-
-        try:
-            #Wait for the cookie button to be clickable
-            cookie_button = WebDriverWait(self.driver, 5).until(
-                EC.element_to_be_clickable((By.CLASS_NAME, 'cookie-popup-with-overlay__button-settings'))
-            )
-            cookie_button.click()
-        except TimeoutException:
-            print("Cookie button not found or not clickable.")
-
-        try:
-            #Wait for the card of the price to be visible
-            WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "flight-card-new"))
-            )
-            price_carousel = self.driver.find_elements(By.CSS_SELECTOR, "carousel-container carousel-item")
-            price_info = self.__get_price_selected(price_carousel, datetime.strptime(date, "%Y-%m-%d"))
-
-            self.driver.delete_all_cookies()
-            self.driver.quit()
-            return price_info
-        except TimeoutException:
-            return "Flight not found"
-
-    def __get_price_selected(self, priceCarousel, flightDate):
-        priceSelected = None
-        for box in priceCarousel:
-            child_elements = box.find_elements(By.XPATH, "./*")
-            for element in child_elements:
-                isSelected = 'date-item--selected' in element.get_attribute('class').split()
-                if isSelected:
-                    priceSelected = box.find_element(By.CSS_SELECTOR, 'ry-price')
-                    break
-        return self.__extract_price_info(priceSelected.text, flightDate)
-
-    def __extract_price_info(self, text, flightDate):
-        try:
-            parts = text.split()
-            currency = parts[0]
-            amount_str = ''.join(parts[1:]).replace(',', '.')
-            amount = float(amount_str)
-            return {
-                'currency': currency,
-                'amount': amount,
-                'date': flightDate.strftime("%Y-%m-%d")
-            }
-        except Exception as e:
-            print(f"Error extracting price info: {e}")
-            return None
+        if self.http_backend:
+            try:
+                return self.http_backend.get_prices(origin, destination, date)
+            except BackendBlocked as e:
+                print(f"HTTP backend blocked ({e}), falling back to Selenium.")
+        return self.selenium_backend.get_prices(origin, destination, date)
 
     def close(self):
-        if hasattr(self, 'driver'):
-            self.driver.quit()
-        self.__disconnect_vpn()
+        self.selenium_backend.close()
+        if self.http_backend:
+            self.http_backend.close()
+        self.end_cycle()
+
+    def end_cycle(self):
+        """Drop the VPN connection kept for the cycle of searches that just ended."""
+        if self.vpn:
+            self.vpn_session.disconnect()
 
-    def __execute_search(self, origins, destinations, dates):
-        #If the vpn is on, i connect everytime to a different one from the configs
+    def __execute_search(self, origins, destinations, dates, all_carousel_dates=False, blocked_on=None):
+        """
+        Search on the current VPN exit, connecting it if needed. `blocked_on` is the
+        connection a block was seen on: the exit is rotated away from it first.
+        Returns the prices and the connection they were looked up through.
+        """
         if self.vpn:
-            self.__connect_vpn(random.choice(vpn_countries))
-        
-        flight_prices = self.__search_flights(origins, destinations, dates)
+            if blocked_on is None:
+                connected = self.vpn_session.ensure_connected(self.cancelled)
+            else:
+                connected = self.vpn_session.rotate(blocked_on, self.cancelled)
+            self.__check_cancelled()
+            if not connected:
+                print("No VPN exit reachable, searching without VPN.")
+            # Timeouts and rate limits are kept per exit, so tell the backends where we are
+            self.selenium_backend.egress = self.vpn_session.egress
+            if self.http_backend:
+                self.http_backend.egress = self.vpn_session.egress
+        generation = self.vpn_session.generation
+
+        flight_prices = self.__search_flights(origins, destinations, dates, all_carousel_dates)
         print(flight_prices)
-        
-        # Filter out flights not found and save to CSV if needed
-        valid_flights = {}
-        for key, value in flight_prices.items():
-            if value != "Flight not found" and value is not None:
-                valid_flights[key] = value
-
-        return valid_flights
-        
-    def search_flights_with_retry(self, origin, destination, dates, max_retries):
+        return flight_prices, generation
+
+    def search_flights_with_retry(self, origin, destination, dates, max_retries, all_carousel_dates=False):
         """
         Searches for flights based on the provided origins, destinations, and dates.
 
@@ -158,15 +176,57 @@ class FlightSearcher:
         - destination (str): Destination location.
         - dates (list): A list of dates for the flight search.
         - max_retries (int): Maximum number of retry attempts.
+        - all_carousel_dates (bool): Also return the neighbouring days shown in
+          the fare carousel, not only the requested dates.
+
+        Only the dates whose lookup failed for a reason that can change (block,
+        timeout, parse error) are retried, after a jittered exponential backoff;
+        a definitive "no flight" answer is never retried. The VPN connection is
+        kept between searches and only rotated after a block. Why the remaining dates failed is left in
+        self.last_failures.
 
         Returns:
         - dict: Dictionary with flight data if flights are found, empty dict otherwise.
+
+        Raises:
+        - SearchCancelled: cancel() was called while the search was running.
         """
+        found = {}
+        pending = sorted(dates)
+        self.last_failures = {}
+        blocked_on = None
         for attempt in range(max_retries):
-            flight_data = self.__execute_search([origin], [destination], dates)
-            if flight_data:  # If we found any valid flights
-                return flight_data
-            time.sleep(5)
-            print(f"Attempt {attempt + 1} failed. Retrying...")
-        print('All Attempts failed.')
-        return {}  # Return empty dict instead of False
\ No newline at end of file
+            if attempt:
+                delay = backoff_delay(attempt - 1)
+                print(f"Retrying {len(pending)} date(s) in {delay:.1f}s...")
+                self.__wait(delay)
+
+            results, generation = self.__execute_search(
+                [origin], [destination], pending, all_carousel_dates, blocked_on
+            )
+            failures = {}
+            for key, value in results.items():
+                if isinstance(value, LookupFailure):
+                    failures[key] = value
+                    self.last_failures[key] = value
+                elif value is not None:
+                    found[key] = value
+                    self.last_failures.pop(key, None)
+
+            pending = [
+                date for date in pending
+                if f"{origin}-{destination} on {date}" in failures
+                and failures[f"{origin}-{destination} on {date}"].retryable
+            ]
+            kinds = sorted({failure.kind for failure in failures.values()})
+            print(f"Attempt {attempt + 1}: {len(found)} found, {len(pending)} to retry"
+                  f"{' (' + ', '.join(kinds) + ')' if kinds else ''}.")
+            if not pending:
+                break
+            # A new exit only helps against blocks; timeouts and parse errors retry on the same one
+            blocked = any(failure.kind == BLOCKED for failure in failures.values())
+            blocked_on = generation if blocked else None
+        else:
+            print('All Attempts failed.')
+
+        return found
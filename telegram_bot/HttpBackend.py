@@ -0,0 +1,155 @@
+import requests
+from requests.adapters import HTTPAdapter
+from SearchBackend import SearchBackend, BackendBlocked, LookupFailure, with_no_flights, NO_FLIGHT, TIMEOUT, PARSE_ERROR
+from utils.config import http_base_url, http_locale, http_timeout, http_pool_size, http_flex_days
+import AvailabilityCapture
+import ProxyPool
+
+# Status codes the site answers with when it refuses to serve us
+BLOCK_STATUS_CODES = (403, 409, 429, 503)
+
+
+class HttpBackend(SearchBackend):
+    """
+    Calls the availability endpoint the Ryanair SPA uses, without a browser.
+
+    A single requests.Session keeps connections alive between lookups, so a
+    price costs one HTTP round trip. Block answers raise BackendBlocked.
+    With a proxy pool every request leaves through the next free proxy, and a
+    blocked proxy is swapped for another one before giving up. Requests are
+    rate-limited per proxy (or per egress without one), so each proxy adds
+    to the budget and a block only pauses the proxy that served it.
+
+    The rate limiter keys HTTP requests apart from browser lookups on the same
+    egress ('http:<egress>'): the API refusing plain HTTP pauses only this
+    backend, and while it is paused lookups go straight to the browser.
+    """
+
+    name = 'http'
+
+    def __init__(self, base_url=None, locale=None, timeout=None, pool_size=None, flex_days=None,
+                 proxy_pool=None, rate_limiter=None, cancelled=None):
+        self.base_url = (base_url or http_base_url).rstrip('/')
+        self.locale = locale or http_locale
+        self.timeout = timeout or http_timeout
+        self.flex_days = http_flex_days if flex_days is None else flex_days
+        pool_size = pool_size or http_pool_size
+        self.proxy_pool = proxy_pool
+        self.rate_limiter = rate_limiter
+        self.cancelled = cancelled
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': (
+                'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+            ),
+            'Accept': 'application/json, text/plain, */*',
+            'Accept-Language': 'it-IT,it;q=0.9,en;q=0.8',
+        })
+
+    def availability_url(self):
+        return f"{self.base_url}/api/booking/v4/{self.locale}/availability"
+
+    def availability_params(self, origin, destination, date):
+        return {
+            'ADT': 1, 'TEEN': 0, 'CHD': 0, 'INF': 0,
+            'Origin': origin,
+            'Destination': destination,
+            'DateOut': date,
+            'DateIn': '',
+            'Disc': 0,
+            'promoCode': '',
+            'IncludeConnectingFlights': 'false',
+            'FlexDaysBeforeOut': self.flex_days,
+            'FlexDaysOut': self.flex_days,
+            'RoundTrip': 'false',
+            'ToUs': 'AGREED',
+        }
+
+    def get_prices(self, origin, destination, date):
+        if not self.proxy_pool:
+            key = self.__key(self.egress)
+            if self.rate_limiter and key in self.rate_limiter.paused():
+                raise BackendBlocked(f"HTTP lookups paused on {self.egress}")
+            return self.__governed_fetch(key, origin, destination, date)
+
+        blocked = []
+        while True:
+            # A proxy whose circuit breaker is open would only make us wait out its pause
+            paused = self.rate_limiter.paused() if self.rate_limiter else set()
+            try:
+                proxy = self.proxy_pool.acquire(
+                    exclude=blocked + [p for p in self.proxy_pool.proxies if self.__key(p.name) in paused]
+                )
+            except ProxyPool.NoProxyAvailable as e:
+                raise BackendBlocked(f"No usable proxy: {e}")
+            outcome = ProxyPool.FAILED
+            try:
+                prices = self.__governed_fetch(self.__key(proxy.name), origin, destination, date, proxy.proxies)
+                failed = isinstance(prices, LookupFailure) and prices.retryable
+                outcome = ProxyPool.FAILED if failed else ProxyPool.OK
+                return prices
+            except BackendBlocked as e:
+                outcome = ProxyPool.BLOCKED
+                print(f"Blocked through proxy {proxy.name} ({e}), trying another one.")
+                blocked.append(proxy)
+            finally:
+                self.proxy_pool.release(proxy, outcome)
+
+    def __key(self, egress):
+        """Rate limiter key of HTTP requests leaving from `egress`."""
+        return f"{self.name}:{egress}"
+
+    def __governed_fetch(self, key, origin, destination, date, proxies=None):
+        """__fetch within the rate limit of `key`, reporting the outcome to its breaker."""
+        if not self.wait_turn(key):
+            return LookupFailure(TIMEOUT, 'search cancelled')
+        try:
+            prices = self.__fetch(origin, destination, date, proxies)
+        except BackendBlocked as e:
+            self.record_outcome(key, e)
+            raise
+        self.record_outcome(key, prices)
+        return prices
+
+    def __fetch(self, origin, destination, date, proxies=None):
+        try:
+            response = self.session.get(
+                self.availability_url(),
+                params=self.availability_params(origin, destination, date),
+                timeout=self.timeout,
+                proxies=proxies,
+            )
+        except requests.RequestException as e:
+            print(f"HTTP availability request failed: {e}")
+            return LookupFailure(TIMEOUT, str(e))
+
+        if response.status_code in BLOCK_STATUS_CODES:
+            raise BackendBlocked(f"HTTP {response.status_code} from {response.url}")
+        if response.status_code == 404:
+            # The route is not operated
+            return LookupFailure(NO_FLIGHT, f"HTTP 404 from {response.url}")
+        if not response.ok:
+            print(f"HTTP availability request returned {response.status_code}")
+            return LookupFailure(TIMEOUT, f"HTTP {response.status_code}")
+
+        try:
+            payload = response.json()
+        except ValueError:
+            # A bot challenge comes back as an HTML page with status 200
+            raise BackendBlocked(f"Non-JSON availability response from {response.url}")
+
+        try:
+            # Dates the answer covers without a flight are definitive no-flight answers
+            prices = with_no_flights(AvailabilityCapture.parse_availability(payload),
+                                     AvailabilityCapture.fares_by_date(payload))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            return LookupFailure(PARSE_ERROR, str(e))
+        return prices or LookupFailure(NO_FLIGHT)
+
+    def close(self):
+        self.session.close()
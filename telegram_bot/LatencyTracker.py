@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from utils.config import (
+    adaptive_timeout_default, adaptive_timeout_min, adaptive_timeout_max,
+    adaptive_timeout_percentile, adaptive_timeout_factor, adaptive_timeout_window,
+)
+
+# Phases of a Selenium lookup, in the order they happen
+PHASES = ('driver_start', 'navigation', 'consent', 'fare_card', 'availability', 'extraction')
+MIN_SAMPLES = 10
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class PhaseTimer:
+    """Collects how long each phase of a single lookup took."""
+
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+
+class LatencyTracker:
+    """
+    Rolling per-egress, per-phase latencies of successful lookups.
+
+    Waits use timeout(egress, phase): the configured percentile of recent
+    successful timings times a safety factor, clamped to [min, max]. Until a
+    phase has MIN_SAMPLES timings the fixed default is used.
+    """
+
+    def __init__(self, window=adaptive_timeout_window, pct=adaptive_timeout_percentile,
+                 factor=adaptive_timeout_factor, default=adaptive_timeout_default,
+                 minimum=adaptive_timeout_min, maximum=adaptive_timeout_max):
+        self.window = window
+        self.pct = pct
+        self.factor = factor
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self._samples = {}
+        self._timeouts = {}
+        self._lock = threading.Lock()
+
+    def record(self, egress, phases):
+        """Store the phase timings (seconds) of one successful lookup."""
+        with self._lock:
+            for phase, seconds in phases.items():
+                key = (egress, phase)
+                if key not in self._samples:
+                    self._samples[key] = deque(maxlen=self.window)
+                self._samples[key].append(seconds)
+
+    def record_timeout(self, egress, phase):
+        with self._lock:
+            key = (egress, phase)
+            self._timeouts[key] = self._timeouts.get(key, 0) + 1
+
+    def timeout(self, egress, phase, default=None):
+        default = self.default if default is None else default
+        with self._lock:
+            samples = list(self._samples.get((egress, phase), ()))
+        if len(samples) < MIN_SAMPLES:
+            return default
+        learned = percentile(samples, self.pct) * self.factor
+        return min(self.maximum, max(self.minimum, learned))
+
+    def snapshot(self):
+        """Per-egress, per-phase p50/p95, derived timeout and timeout count."""
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+            timeouts = dict(self._timeouts)
+
+        result = {}
+        for (egress, phase) in sorted(set(samples) | set(timeouts)):
+            values = samples.get((egress, phase), [])
+            result.setdefault(egress, {})[phase] = {
+                'samples': len(values),
+                'p50': round(percentile(values, 50), 3) if values else None,
+                'p95': round(percentile(values, 95), 3) if values else None,
+                'timeout': round(self.timeout(egress, phase), 3),
+                'timeouts': timeouts.get((egress, phase), 0),
+            }
+        return result
+
+
+latency_tracker = LatencyTracker()
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+from utils.config import proxy_list, proxy_rate_per_minute, proxy_block_cooldown, proxy_max_wait
+
+# Lookup outcomes reported back to the pool
+OK = 'ok'
+FAILED = 'failed'
+BLOCKED = 'blocked'
+
+
+class NoProxyAvailable(Exception):
+    """Every proxy is cooling down or out of budget for longer than the caller wants to wait."""
+
+
+class Proxy:
+    """One egress proxy, with its request budget and block history."""
+
+    def __init__(self, url):
+        self.url = url if '://' in url else f"http://{url}"
+        parts = urlsplit(self.url)
+        # host:port without credentials, used in logs and as the latency egress
+        self.name = parts.hostname + (f":{parts.port}" if parts.port else '')
+        self.requests = deque()
+        self.last_used = 0
+        self.cooling_until = 0
+        self.drivers = 0
+        self.lookups = 0
+        self.failures = 0
+        self.blocks = 0
+
+    @property
+    def proxies(self):
+        """The `proxies` argument of requests for this proxy."""
+        return {'http': self.url, 'https': self.url}
+
+    def ready_at(self, now, rate_per_minute):
+        """When this proxy may serve its next request (now or later)."""
+        while self.requests and now - self.requests[0] >= 60:
+            self.requests.popleft()
+        ready = self.cooling_until
+        if rate_per_minute and len(self.requests) >= rate_per_minute:
+            ready = max(ready, self.requests[0] + 60)
+        return max(now, ready)
+
+
+class ProxyPool:
+    """
+    Egress proxies handed out per request (HTTP engine) or per browser
+    (Selenium, through --proxy-server), so parallel workers leave from
+    different addresses.
+
+    Requests rotate over the least recently used proxy that is within its
+    `rate_per_minute` budget. A proxy that served a block rests for
+    `block_cooldown` seconds.
+    """
+
+    def __init__(self, urls=None, rate_per_minute=proxy_rate_per_minute,
+                 block_cooldown=proxy_block_cooldown, max_wait=proxy_max_wait):
+        urls = proxy_list if urls is None else urls
+        self.proxies = [Proxy(url) for url in urls]
+        self.rate_per_minute = rate_per_minute
+        self.block_cooldown = block_cooldown
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def acquire(self, max_wait=None, exclude=(), proxy=None):
+        """
+        Take a request slot on the proxy that can serve soonest (or on `proxy`,
+        for a browser bound to it), waiting for its budget if needed. Raises
+        NoProxyAvailable past `max_wait` seconds.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = [proxy] if proxy else [p for p in self.proxies if p not in exclude]
+                if not candidates:
+                    raise NoProxyAvailable("No proxy left to try")
+                chosen = min(candidates, key=lambda p: (p.ready_at(now, self.rate_per_minute), p.last_used))
+                ready = chosen.ready_at(now, self.rate_per_minute)
+                if ready <= now:
+                    chosen.requests.append(now)
+                    chosen.last_used = now
+                    return chosen
+                if ready > deadline:
+                    raise NoProxyAvailable(f"Next proxy is free in {ready - now:.0f}s")
+                self._cond.wait(ready - now)
+
+    def release(self, proxy, outcome):
+        """Report how a request through `proxy` went."""
+        with self._cond:
+            proxy.lookups += 1
+            if outcome == BLOCKED:
+                proxy.blocks += 1
+                proxy.cooling_until = time.monotonic() + self.block_cooldown
+                print(f"Proxy {proxy.name} got blocked, cooling down for {self.block_cooldown:.0f}s.")
+            elif outcome == FAILED:
+                proxy.failures += 1
+            self._cond.notify_all()
+
+    def assign(self):
+        """
+        Pick the proxy a new browser will be bound to: the one serving the
+        fewest browsers, preferring proxies that are not cooling down.
+        """
+        with self._cond:
+            now = time.monotonic()
+            proxy = min(self.proxies, key=lambda p: (p.cooling_until > now, p.drivers, p.cooling_until, p.last_used))
+            proxy.drivers += 1
+            return proxy
+
+    def unassign(self, proxy):
+        with self._cond:
+            proxy.drivers = max(0, proxy.drivers - 1)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            return {
+                proxy.name: {
+                    'lookups': proxy.lookups,
+                    'failures': proxy.failures,
+                    'blocks': proxy.blocks,
+                    'cooling': proxy.cooling_until > now,
+                    'drivers': proxy.drivers,
+                    'last_minute': len([t for t in proxy.requests if now - t < 60]),
+                }
+                for proxy in self.proxies
+            }
+
+
+_shared_proxy_pool = None
+_shared_proxy_pool_lock = threading.Lock()
+
+
+def get_shared_proxy_pool():
+    """Process-wide proxy pool built from PROXIES, or None when no proxy is configured."""
+    global _shared_proxy_pool
+    with _shared_proxy_pool_lock:
+        if _shared_proxy_pool is None and proxy_list:
+            _shared_proxy_pool = ProxyPool()
+        return _shared_proxy_pool
@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from utils.config import rate_limit_file, scrape_rate_per_minute, scrape_burst
+from utils.config import breaker_threshold, breaker_pause, breaker_max_pause
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS egress (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    consecutive_blocks INTEGER NOT NULL,
+    trips INTEGER NOT NULL,
+    open_until REAL NOT NULL,
+    paused INTEGER NOT NULL,
+    probing INTEGER NOT NULL
+);
+"""
+
+COLUMNS = ('tokens', 'updated', 'consecutive_blocks', 'trips', 'open_until', 'paused', 'probing')
+
+
+class EgressState:
+    """Token bucket and circuit breaker of one egress."""
+
+    def __init__(self, burst):
+        self.tokens = burst
+        self.updated = time.time()
+        self.consecutive_blocks = 0
+        self.trips = 0
+        self.open_until = 0
+        self.paused = False
+        # After a pause, the first lookup decides whether the breaker closes again
+        self.probing = False
+
+    @classmethod
+    def from_row(cls, row):
+        state = cls(0)
+        for column, value in zip(COLUMNS, row):
+            setattr(state, column, value)
+        state.paused, state.probing = bool(state.paused), bool(state.probing)
+        return state
+
+    def to_row(self):
+        return tuple(getattr(self, column) for column in COLUMNS)
+
+
+class RateLimiter:
+    """
+    Governor shared by every scrape of every process (web app, run_scraper,
+    bot and their worker processes), through a SQLite file like FareCache.
+
+    Each egress (VPN exit, proxy or direct) gets a token bucket of
+    `rate_per_minute` lookups with bursts of up to `burst`, and a circuit
+    breaker: after `threshold` consecutive block pages lookups on that egress
+    pause for `pause` seconds, doubling (up to `max_pause`) while the first
+    lookup after a pause is blocked again. Pause and resume events are passed
+    to the listeners of the process that saw them, as log lines.
+    """
+
+    def __init__(self, path=rate_limit_file, rate_per_minute=scrape_rate_per_minute, burst=scrape_burst,
+                 threshold=breaker_threshold, pause=breaker_pause, max_pause=breaker_max_pause):
+        self.path = str(path)
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(1, burst)
+        self.threshold = max(1, threshold)
+        self.pause = pause
+        self.max_pause = max_pause
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def __connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    @contextmanager
+    def __state(self, egress):
+        """
+        The state of `egress`, locked against every other thread and process
+        for the duration of the block and saved at its end.
+        """
+        conn = self.__connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM egress WHERE name = ?", (egress,)
+            ).fetchone()
+            state = EgressState.from_row(row) if row else EgressState(self.burst)
+            yield state
+            conn.execute(
+                f"INSERT OR REPLACE INTO egress (name, {', '.join(COLUMNS)}) VALUES (?{', ?' * len(COLUMNS)})",
+                (egress, *state.to_row()),
+            )
+            conn.execute("COMMIT")
+        finally:
+            # Closing an uncommitted transaction rolls it back
+            conn.close()
+
+    def add_listener(self, listener):
+        """Call `listener(message)` on every pause and resume."""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def acquire(self, egress, stop=None):
+        """
+        Wait until a lookup on `egress` is allowed. Returns False if `stop`
+        (a threading.Event) was set while waiting.
+        """
+        while True:
+            message = None
+            with self.__state(egress) as state:
+                now = time.time()
+                if state.open_until > now:
+                    wait = state.open_until - now
+                else:
+                    if state.paused:
+                        state.paused = False
+                        state.probing = True
+                        message = f"▶️ Scraping resumed on {egress}"
+                    wait = self.__take_token(state, now)
+            if message:
+                self.__emit(message)
+            if wait <= 0:
+                return True
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+    def record(self, egress, blocked):
+        """Feed the outcome of a lookup on `egress` to its circuit breaker."""
+        message = None
+        with self.__state(egress) as state:
+            if not blocked:
+                state.consecutive_blocks = 0
+                state.trips = 0
+                state.probing = False
+                return
+            state.consecutive_blocks += 1
+            if state.probing or state.consecutive_blocks >= self.threshold:
+                state.trips += 1
+                pause = min(self.max_pause, self.pause * 2 ** (state.trips - 1))
+                state.open_until = time.time() + pause
+                state.paused = True
+                state.probing = False
+                blocks = state.consecutive_blocks
+                state.consecutive_blocks = 0
+                message = f"⏸️ Scraping paused on {egress} for {pause:.0f}s after {blocks} block(s) in a row"
+        if message:
+            self.__emit(message)
+
+    def paused(self):
+        """Names of the egresses whose breaker is open right now."""
+        conn = self.__connect()
+        try:
+            rows = conn.execute("SELECT name FROM egress WHERE open_until > ?", (time.time(),)).fetchall()
+        finally:
+            conn.close()
+        return {name for name, in rows}
+
+    def snapshot(self):
+        now = time.time()
+        conn = self.__connect()
+        try:
+            rows = conn.execute(f"SELECT name, {', '.join(COLUMNS)} FROM egress ORDER BY name").fetchall()
+        finally:
+            conn.close()
+        states = {name: EgressState.from_row(row) for name, *row in rows}
+        return {
+            egress: {
+                'tokens': round(min(self.burst, state.tokens + self.__refill(state, now)), 2),
+                'consecutive_blocks': state.consecutive_blocks,
+                'paused_for': round(max(0, state.open_until - now), 1),
+                'trips': state.trips,
+            }
+            for egress, state in states.items()
+        }
+
+    def __refill(self, state, now):
+        if not self.rate_per_minute:
+            return self.burst
+        return (now - state.updated) * self.rate_per_minute / 60
+
+    def __take_token(self, state, now):
+        """Take a token if there is one; otherwise return how long until there is."""
+        if not self.rate_per_minute:
+            return 0
+        state.tokens = min(self.burst, state.tokens + self.__refill(state, now))
+        state.updated = now
+        if state.tokens >= 1:
+            state.tokens -= 1
+            return 0
+        return (1 - state.tokens) * 60 / self.rate_per_minute
+
+    def __emit(self, message):
+        print(message)
+        self.notify(message)
+
+    def notify(self, message):
+        """Pass `message` to the listeners; also relays the events of worker processes."""
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(message)
+            except Exception as e:
+                print(f"Rate limiter listener failed: {e}")
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,144 @@
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import util as mp_util
+from FlightSearcher import FlightSearcher
+from DriverPool import get_shared_pool
+from VpnSession import vpn_session
+from RateLimiter import rate_limiter
+
+WORKER_MODES = ('thread', 'process')
+
+# How often, in seconds, the parent relays the rate limiter events of its worker processes
+EVENT_RELAY_INTERVAL = 1.0
+
+# Per-process searcher used by process workers (set by _init_process_worker)
+_process_searcher = None
+
+
+def _init_process_worker(egress, events):
+    global _process_searcher
+    # A forked worker must not reuse the parent's browsers: start a fresh pool
+    import DriverPool
+    DriverPool._shared_pool = None
+    pool = get_shared_pool()
+    # Worker processes skip atexit handlers, so quit the browsers via a finalizer
+    mp_util.Finalize(None, pool.close, exitpriority=10)
+    # Pauses and resumes seen here reach the parent's listeners (scrape log, live stream)
+    rate_limiter.add_listener(events.put)
+    # The traffic leaves through the parent's tunnel, so it is governed as that exit's
+    _process_searcher = FlightSearcher(vpn=False, driver_pool=pool, egress=egress)
+
+
+def _relay_events(events):
+    """Pass the rate limiter messages of the worker processes to this process' listeners."""
+    while True:
+        try:
+            message = events.get_nowait()
+        except queue.Empty:
+            return
+        rate_limiter.notify(message)
+
+
+def _process_search(origin, destination, dates, max_retries):
+    return _process_searcher.search_flights_with_retry(origin, destination, dates, max_retries)
+
+
+class ScrapeEngine:
+    """
+    Runs flight lookups on several workers and yields each result as soon as
+    its worker finishes.
+
+    In 'thread' mode every worker thread gets a FlightSearcher of its own,
+    closed when the run ends, and draws its browser from the shared driver
+    pool. In 'process' mode every worker process owns a searcher and a pool
+    of its own.
+
+    With the VPN on, one connection serves the whole run. Thread workers
+    rotate it after a block; process workers use the tunnel the parent
+    connected, since they cannot coordinate a rotation.
+    """
+
+    def __init__(self, vpn, workers=1, mode='thread', max_retries=3):
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Unknown worker mode '{mode}', expected one of {WORKER_MODES}")
+        self.vpn = vpn
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.max_retries = max_retries
+
+    def run(self, jobs, tick=None, on_tick=None):
+        """
+        Search every job and yield (key, results) pairs in completion order.
+
+        Parameters:
+        - jobs (iterable): (key, origin, destination, dates) tuples. The key is
+          handed back untouched so callers can map results to their own objects.
+        - tick (float): with `on_tick`, call on_tick() in the caller's thread at
+          least every `tick` seconds, also while no worker finishes.
+
+        Yields:
+        - tuple: (key, dict) where dict is what search_flights_with_retry returns,
+          or (key, Exception) if the lookup raised.
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return
+
+        events = None
+        searchers = []
+        if self.mode == 'process':
+            if self.vpn:
+                vpn_session.ensure_connected()
+            events = multiprocessing.Queue()
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker,
+                initargs=(vpn_session.egress, events),
+            )
+            submit = lambda job: executor.submit(_process_search, job[1], job[2], job[3], self.max_retries)
+        else:
+            pool = get_shared_pool()
+            pool.ensure_size(self.workers)
+            # A searcher keeps the state of the search it runs (last_failures): one per thread
+            local = threading.local()
+
+            def search(origin, destination, dates):
+                if not hasattr(local, 'searcher'):
+                    local.searcher = FlightSearcher(vpn=self.vpn, driver_pool=pool)
+                    searchers.append(local.searcher)
+                return local.searcher.search_flights_with_retry(origin, destination, dates, self.max_retries)
+
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scrape-worker')
+            submit = lambda job: executor.submit(search, job[1], job[2], job[3])
+
+        # Wake up at least this often, even while no worker finishes
+        wakes = [seconds for seconds, wanted in ((tick, on_tick), (EVENT_RELAY_INTERVAL, events)) if wanted]
+        timeout = min(wakes) if wakes else None
+
+        futures = {submit(job): job[0] for job in jobs}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if events:
+                    _relay_events(events)
+                for future in done:
+                    key = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                    yield key, result
+                if on_tick:
+                    on_tick()
+        finally:
+            # If the caller stops early, drop the jobs that have not started yet
+            executor.shutdown(wait=True, cancel_futures=True)
+            for searcher in searchers:
+                searcher.close()
+            if events:
+                _relay_events(events)
+            if self.vpn:
+                vpn_session.disconnect()
@@ -0,0 +1,76 @@
+# Why a lookup produced no price
+NO_FLIGHT = 'no_flight'      # the site answered: no flight (or sold out) that day
+BLOCKED = 'blocked'          # block page, captcha, 403/429
+TIMEOUT = 'timeout'          # the page or API did not answer in time
+PARSE_ERROR = 'parse_error'  # the page loaded but the fares could not be read
+
+
+class LookupFailure:
+    """A classified failed lookup. Only NO_FLIGHT is a definitive answer."""
+
+    def __init__(self, kind, detail=''):
+        self.kind = kind
+        self.detail = detail
+
+    @property
+    def retryable(self):
+        return self.kind != NO_FLIGHT
+
+    def __eq__(self, other):
+        return isinstance(other, LookupFailure) and other.kind == self.kind
+
+    def __hash__(self):
+        return hash(self.kind)
+
+    def __repr__(self):
+        return f"LookupFailure({self.kind}{': ' + self.detail if self.detail else ''})"
+
+
+def with_no_flights(covered, prices):
+    """Add a LookupFailure(NO_FLIGHT) for every covered date that has no price."""
+    result = {date: LookupFailure(NO_FLIGHT) for date in covered}
+    result.update(prices)
+    return result
+
+
+class BackendBlocked(Exception):
+    """Raised by a backend when the site refused to serve it (block page, 403, 429...)."""
+
+
+class SearchBackend:
+    """
+    Interface of the engines FlightSearcher can fetch fares with.
+
+    get_prices returns a dict of 'YYYY-MM-DD' -> price info ({'currency',
+    'amount', 'date', ...}) for every date the response covered, with a
+    LookupFailure(NO_FLIGHT) for covered dates without flights, or a single
+    LookupFailure when the lookup failed as a whole. Backends may raise
+    BackendBlocked when they are blocked, so the searcher can fall back to
+    another engine.
+    """
+
+    name = 'base'
+    # Where traffic leaves from when it does not go through a proxy (set by FlightSearcher)
+    egress = 'direct'
+    # Governor every lookup passes, keyed by the egress it really leaves from, and the
+    # event that cancels the search while a lookup waits for it (None = ungoverned)
+    rate_limiter = None
+    cancelled = None
+
+    def get_prices(self, origin, destination, date):
+        raise NotImplementedError
+
+    def wait_turn(self, egress):
+        """Wait until the rate limiter allows a lookup on `egress`. False if the search was cancelled."""
+        if self.rate_limiter is None:
+            return True
+        return self.rate_limiter.acquire(egress, self.cancelled)
+
+    def record_outcome(self, egress, result):
+        """Feed a lookup's outcome (a dict, a LookupFailure or a BackendBlocked) to `egress`' breaker."""
+        if self.rate_limiter is not None:
+            blocked = isinstance(result, BackendBlocked) or (isinstance(result, LookupFailure) and result.kind == BLOCKED)
+            self.rate_limiter.record(egress, blocked)
+
+    def close(self):
+        pass
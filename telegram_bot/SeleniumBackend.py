@@ -0,0 +1,237 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from datetime import datetime
+import time
+from FlightURLBuilder import FlightURLBuilder
+from SearchBackend import SearchBackend, LookupFailure, with_no_flights, NO_FLIGHT, BLOCKED, TIMEOUT, PARSE_ERROR
+from utils.config import extraction_mode
+import AvailabilityCapture
+import CarouselExtractor
+import BrowserProfile
+from ConsentStore import consent_store
+from LatencyTracker import latency_tracker, PhaseTimer
+from DriverPool import get_shared_pool
+import ProxyPool
+
+COOKIE_BUTTON_CLASS = 'cookie-popup-with-overlay__button-settings'
+
+
+class SeleniumBackend(SearchBackend):
+    """Loads the Ryanair results page in a pooled Chrome and reads the fares from it."""
+
+    name = 'selenium'
+
+    def __init__(self, driver_pool=None, extraction=None, rate_limiter=None, cancelled=None):
+        self.extraction = extraction or extraction_mode
+        # Browsers come from a pool of warm drivers instead of a cold start per lookup
+        self.driver_pool = driver_pool or get_shared_pool()
+        # Where our traffic currently leaves from; timeouts are learned per egress
+        self.egress = 'direct'
+        self.rate_limiter = rate_limiter
+        self.cancelled = cancelled
+
+    def get_prices(self, origin, destination, date):
+        flightBuilder = FlightURLBuilder()
+        flightBuilder.set_origin(origin)
+        flightBuilder.set_destination(destination)
+        flightBuilder.set_date_out(date)
+
+        url = flightBuilder.build_url()
+        try:
+            return self.__lookup(url, date)
+        except WebDriverException as e:
+            # A hung page load, a lost network response or a crashed Chrome (the pool
+            # replaces it) fails this date only, as a retryable timeout
+            print(f"Browser lookup of {origin}-{destination} on {date} failed: {type(e).__name__}: {e.msg}")
+            return LookupFailure(TIMEOUT, f"{type(e).__name__}: {e.msg}")
+
+    def __lookup(self, url, date):
+        timer = PhaseTimer()
+        requested = time.monotonic()
+        with self.driver_pool.slot() as slot:
+            driver = slot.driver
+            timer.add('driver_start', time.monotonic() - requested)
+            # A browser bound to a proxy leaves from it rather than from the VPN/direct egress
+            egress = slot.proxy.name if slot.proxy else self.egress
+            # ...so it is also what the rate limiter and circuit breaker count it against
+            if not self.wait_turn(egress):
+                return LookupFailure(TIMEOUT, 'search cancelled')
+            if slot.proxy:
+                try:
+                    self.driver_pool.proxy_pool.acquire(proxy=slot.proxy)
+                except ProxyPool.NoProxyAvailable as e:
+                    # Cooling down or out of budget for a while: bind a new browser to another proxy
+                    slot.broken = True
+                    return LookupFailure(TIMEOUT, f"proxy {slot.proxy.name}: {e}")
+            profile = self.__prepare_profile(driver)
+            # Pooled drivers lose their cookies between lookups: put consent back
+            consent_seeded = consent_store.seed(driver)
+            seen_log = []
+            AvailabilityCapture.drain_performance_log(driver)
+            started = time.monotonic()
+            prices = LookupFailure(TIMEOUT, 'lookup raised')
+            try:
+                if self.extraction == 'network':
+                    prices = self.__get_price_from_network(driver, url, seen_log, timer, egress)
+                else:
+                    prices = self.__get_price_from_dom(driver, url, date, consent_seeded, timer, egress)
+            finally:
+                self.__report_page(driver, profile, started, seen_log)
+                self.record_outcome(egress, prices)
+                if slot.proxy:
+                    self.__report_proxy(slot, prices)
+
+        if isinstance(prices, dict) and prices:
+            latency_tracker.record(egress, timer.phases)
+        return prices
+
+    def __report_proxy(self, slot, prices):
+        """Tell the proxy pool how the lookup went; a blocked proxy's browser is replaced."""
+        if isinstance(prices, LookupFailure) and prices.kind == BLOCKED:
+            self.driver_pool.proxy_pool.release(slot.proxy, ProxyPool.BLOCKED)
+            slot.broken = True
+        elif isinstance(prices, LookupFailure) and prices.retryable:
+            self.driver_pool.proxy_pool.release(slot.proxy, ProxyPool.FAILED)
+        else:
+            self.driver_pool.proxy_pool.release(slot.proxy, ProxyPool.OK)
+
+    def __timeout(self, phase, egress, default=None):
+        return latency_tracker.timeout(egress, phase, default)
+
+    def __prepare_profile(self, driver):
+        """
+        Pick the profile for this page. Lean drivers occasionally load a page
+        unblocked ('full') so the savings report has a current baseline.
+        """
+        if not self.driver_pool.lean:
+            return 'full'
+        if BrowserProfile.page_stats.needs_calibration():
+            BrowserProfile.set_blocking(driver, False)
+            return 'full'
+        return 'lean'
+
+    def __report_page(self, driver, profile, started, seen_log):
+        """Log bytes and time this page cost (and saved, on the lean profile)."""
+        elapsed = time.monotonic() - started
+        try:
+            entries = seen_log + driver.get_log('performance')
+            if self.driver_pool.lean and profile == 'full':
+                BrowserProfile.set_blocking(driver, True)
+        except WebDriverException as e:
+            print(f"Could not read page stats: {e}")
+            return
+        transferred, _, blocked = BrowserProfile.page_traffic(entries)
+        print(BrowserProfile.page_stats.record(profile, transferred, elapsed, blocked))
+
+    def __accept_cookies(self, driver, egress):
+        """
+        Click through the cookie popup and remember the consent cookies it sets.
+        Returns False if the popup never showed up.
+        """
+        before = driver.get_cookies()
+        try:
+            #Wait for the cookie button to be clickable
+            cookie_button = WebDriverWait(driver, self.__timeout('consent', egress)).until(
+                EC.element_to_be_clickable((By.CLASS_NAME, COOKIE_BUTTON_CLASS))
+            )
+            cookie_button.click()
+        except TimeoutException:
+            print("Cookie button not found or not clickable.")
+            latency_tracker.record_timeout(egress, 'consent')
+            return False
+
+        try:
+            WebDriverWait(driver, 2).until(lambda d: d.get_cookies() != before)
+        except TimeoutException:
+            return True
+        consent_store.capture(before, driver.get_cookies())
+        return True
+
+    def __get_price_from_dom(self, driver, url, date, consent_seeded, timer, egress):
+        # A hung page load gives up after the learned navigation time (the adaptive
+        # maximum until there are samples) rather than Selenium's 300 s default
+        driver.set_page_load_timeout(self.__timeout('navigation', egress, default=latency_tracker.maximum))
+        try:
+            # With the eager/none load strategy get() returns early; the explicit waits below do the waiting
+            with timer.phase('navigation'):
+                driver.get(url)
+        except TimeoutException:
+            latency_tracker.record_timeout(egress, 'navigation')
+            return self.__classify_missing_page(driver)
+
+        # With stored consent the popup doesn't show, so there is nothing to wait for
+        if not consent_seeded:
+            with timer.phase('consent'):
+                clicked = self.__accept_cookies(driver, egress)
+            if not clicked:
+                # A wait that ran out is not a latency sample; learning from it would only grow the timeout
+                timer.phases.pop('consent')
+
+        try:
+            #Wait for the card of the price, a no-flight carousel or a block page
+            with timer.phase('fare_card'):
+                state = WebDriverWait(driver, self.__timeout('fare_card', egress)).until(
+                    CarouselExtractor.read_page_state
+                )
+        except TimeoutException:
+            latency_tracker.record_timeout(egress, 'fare_card')
+            return self.__classify_missing_page(driver)
+        if state == 'blocked':
+            return LookupFailure(BLOCKED, driver.title)
+
+        with timer.phase('extraction'):
+            # Read the whole carousel in one WebDriver round trip
+            flightDate = datetime.strptime(date, "%Y-%m-%d")
+            carousel = driver.execute_script(CarouselExtractor.CAROUSEL_SCRIPT)
+            covered = CarouselExtractor.covered_dates(carousel, flightDate)
+            if not covered:
+                return LookupFailure(PARSE_ERROR, 'no selected date in the fare carousel')
+            # Dates the carousel shows without a price have no flight
+            prices = with_no_flights(covered, CarouselExtractor.parse_carousel(carousel, flightDate))
+            if state == 'fares' and isinstance(prices.get(date), LookupFailure):
+                return LookupFailure(PARSE_ERROR, 'fare cards shown but no price for the selected date')
+
+        if consent_seeded and driver.find_elements(By.CLASS_NAME, COOKIE_BUTTON_CLASS):
+            # The site no longer accepts the stored consent: capture it again next time
+            print("Stored consent was not accepted, clearing it.")
+            consent_store.clear()
+        return prices
+
+    def __get_price_from_network(self, driver, url, seen_log, timer, egress):
+        """
+        Read every fare from the availability JSON the page fetches, returning
+        as soon as the response lands instead of waiting for the DOM.
+        """
+        # Navigate from script so we don't block until the page has finished loading
+        with timer.phase('navigation'):
+            driver.execute_script("window.location.href = arguments[0];", url)
+        with timer.phase('availability'):
+            payload = AvailabilityCapture.wait_for_availability(
+                driver, timeout=self.__timeout('availability', egress, default=10), seen=seen_log
+            )
+        if payload is None:
+            latency_tracker.record_timeout(egress, 'availability')
+            return self.__classify_missing_page(driver)
+        with timer.phase('extraction'):
+            try:
+                # Dates the payload covers without a flight are definitive no-flight answers
+                prices = with_no_flights(AvailabilityCapture.parse_availability(payload),
+                                         AvailabilityCapture.fares_by_date(payload))
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                return LookupFailure(PARSE_ERROR, str(e))
+        return prices or LookupFailure(NO_FLIGHT)
+
+    def __classify_missing_page(self, driver):
+        """A wait ran out: tell a block page from a page that is just slow."""
+        try:
+            if CarouselExtractor.read_page_state(driver) == 'blocked':
+                return LookupFailure(BLOCKED, driver.title)
+        except WebDriverException:
+            pass
+        return LookupFailure(TIMEOUT)
+
+    def close(self):
+        # Pooled drivers outlive the backend; only drop the ones sitting idle
+        self.driver_pool.drain()
@@ -0,0 +1,229 @@
+import random
+import subprocess
+import threading
+import time
+from collections import deque
+from utils.config import bash_script_connect, bash_script_disconnect, vpn_countries
+from utils.config import (
+    vpn_check_command, vpn_connect_timeout, vpn_ready_timeout, vpn_poll_interval,
+    vpn_health_interval, vpn_block_cooldown,
+)
+
+# How many recent timings are kept per exit
+HISTORY = 20
+
+
+class ExitStats:
+    """Connect and lookup history of one VPN exit (country)."""
+
+    def __init__(self):
+        self.connects = 0
+        self.connect_failures = 0
+        self.connect_seconds = deque(maxlen=HISTORY)
+        self.lookups = 0
+        self.lookup_failures = 0
+        self.lookup_seconds = deque(maxlen=HISTORY)
+        self.blocks = 0
+        self.blocked_at = None
+
+    @property
+    def tried(self):
+        return self.connects + self.connect_failures > 0
+
+    @property
+    def success_rate(self):
+        attempts = self.lookups + self.connect_failures
+        if not attempts:
+            return None
+        return (self.lookups - self.lookup_failures) / attempts
+
+    @property
+    def latency(self):
+        if not self.lookup_seconds:
+            return None
+        return sum(self.lookup_seconds) / len(self.lookup_seconds)
+
+    def cooling(self, now, cooldown):
+        return self.blocked_at is not None and now - self.blocked_at < cooldown
+
+
+class VpnSession:
+    """
+    One VPN connection shared by every search of a process.
+
+    The tunnel is connected on demand and kept across lookups and routes;
+    it only moves to another exit when a lookup got blocked (rotate) or the
+    health check fails. Readiness is polled with the check command instead
+    of sleeping a fixed time. Per-exit success rate and lookup latency pick
+    the next exit: untried exits first, then the most reliable, fastest one.
+    """
+
+    def __init__(self, countries=None, connect_script=bash_script_connect,
+                 disconnect_script=bash_script_disconnect, check_command=vpn_check_command,
+                 connect_timeout=vpn_connect_timeout, ready_timeout=vpn_ready_timeout,
+                 poll_interval=vpn_poll_interval, health_interval=vpn_health_interval,
+                 block_cooldown=vpn_block_cooldown):
+        self.countries = list(countries or vpn_countries)
+        self.connect_script = connect_script
+        self.disconnect_script = disconnect_script
+        self.check_command = check_command
+        self.connect_timeout = connect_timeout
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self.health_interval = health_interval
+        self.block_cooldown = block_cooldown
+
+        self.country = None
+        # Bumped on every new connection, so concurrent blocks rotate only once
+        self.generation = 0
+        self._last_check = 0
+        self._stats = {country: ExitStats() for country in self.countries}
+        self._lock = threading.RLock()
+
+    @property
+    def egress(self):
+        return self.country or 'direct'
+
+    def ensure_connected(self, stop=None):
+        """Connect if needed. Returns False if no exit could be reached (or `stop` was set)."""
+        with self._lock:
+            if self.country:
+                if time.monotonic() - self._last_check < self.health_interval:
+                    return True
+                if self.__run(self.check_command, self.poll_interval * 10):
+                    self._last_check = time.monotonic()
+                    return True
+                print(f"VPN tunnel via {self.country} is down, reconnecting.")
+                self._stats[self.country].connect_failures += 1
+            return self.__connect_best(exclude=(), stop=stop)
+
+    def rotate(self, generation, stop=None):
+        """
+        Move to another exit after a block seen on connection `generation`.
+        A no-op if another search already rotated away from it.
+        """
+        with self._lock:
+            if generation != self.generation and self.country:
+                return True
+            exclude = ()
+            if self.country:
+                stats = self._stats[self.country]
+                stats.blocks += 1
+                stats.blocked_at = time.monotonic()
+                exclude = (self.country,)
+                print(f"VPN exit {self.country} got blocked, rotating.")
+            return self.__connect_best(exclude=exclude, stop=stop)
+
+    def disconnect(self):
+        with self._lock:
+            if self.country:
+                self.__run(self.disconnect_script, self.connect_timeout)
+                self.country = None
+
+    def record_lookup(self, country, ok, seconds):
+        """Store the outcome of a lookup made through `country`."""
+        with self._lock:
+            stats = self._stats.get(country)
+            if not stats:
+                return
+            stats.lookups += 1
+            if ok:
+                stats.lookup_seconds.append(seconds)
+            else:
+                stats.lookup_failures += 1
+
+    def choose_exit(self, exclude=()):
+        """The exit to connect to next, or None if there is no candidate."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [c for c in self.countries if c not in exclude]
+            resting = [c for c in candidates if self._stats[c].cooling(now, self.block_cooldown)]
+            candidates = [c for c in candidates if c not in resting] or resting
+            if not candidates:
+                return None
+            untried = [c for c in candidates if not self._stats[c].tried]
+            if untried:
+                return random.choice(untried)
+
+            def preference(country):
+                stats = self._stats[country]
+                rate = stats.success_rate
+                latency = stats.latency
+                return (
+                    -round(rate if rate is not None else 0.5, 1),
+                    latency if latency is not None else float('inf'),
+                )
+            return min(candidates, key=preference)
+
+    def snapshot(self):
+        """Per-exit counters and timings, plus the current exit."""
+        now = time.monotonic()
+        with self._lock:
+            exits = {}
+            for country, stats in self._stats.items():
+                exits[country] = {
+                    'connects': stats.connects,
+                    'connect_failures': stats.connect_failures,
+                    'connect_seconds': round(sum(stats.connect_seconds) / len(stats.connect_seconds), 3)
+                    if stats.connect_seconds else None,
+                    'lookups': stats.lookups,
+                    'success_rate': round(stats.success_rate, 3) if stats.success_rate is not None else None,
+                    'latency': round(stats.latency, 3) if stats.latency is not None else None,
+                    'blocks': stats.blocks,
+                    'cooling': stats.cooling(now, self.block_cooldown),
+                }
+            return {'current': self.country, 'exits': exits}
+
+    def __connect_best(self, exclude, stop):
+        tried = set(exclude)
+        while True:
+            country = self.choose_exit(exclude=tried)
+            if country is None or (stop and stop.is_set()):
+                self.country = None
+                return False
+            tried.add(country)
+            if self.__connect(country, stop):
+                return True
+
+    def __connect(self, country, stop):
+        # Always start from a clean state: the previous tunnel may still be up
+        self.__run(self.disconnect_script, self.connect_timeout)
+        self.country = None
+        stats = self._stats[country]
+
+        started = time.monotonic()
+        if not self.__run(f"{self.connect_script} {country}", self.connect_timeout):
+            print(f"Failed to connect to VPN exit {country}.")
+            stats.connect_failures += 1
+            return False
+
+        # The script returns before the tunnel routes traffic: poll until it does
+        deadline = time.monotonic() + self.ready_timeout
+        while not self.__run(self.check_command, self.poll_interval * 10):
+            if time.monotonic() >= deadline:
+                print(f"VPN exit {country} did not come up in time.")
+                stats.connect_failures += 1
+                return False
+            if stop and stop.wait(self.poll_interval):
+                return False
+            if not stop:
+                time.sleep(self.poll_interval)
+
+        elapsed = time.monotonic() - started
+        stats.connects += 1
+        stats.connect_seconds.append(elapsed)
+        self.country = country
+        self.generation += 1
+        self._last_check = time.monotonic()
+        print(f"Connected to VPN exit {country} in {elapsed:.1f}s.")
+        return True
+
+    @staticmethod
+    def __run(command, timeout):
+        try:
+            return subprocess.run(command, shell=True, capture_output=True, timeout=timeout).returncode == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+
+vpn_session = VpnSession()
@@ -1,6 +1,7 @@
 import os
 import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
@@ -10,7 +11,8 @@ from PriceTracker import PriceTracker
 from MessageFormatter import MessageFormatter
 
 from pathlib import Path
-from FlightSearcher import FlightSearcher
+from FlightSearcher import FlightSearcher, SearchCancelled
+from DriverPool import get_shared_pool
 
 # Load environment variables
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +46,36 @@ search_job = None
 price_tracker = PriceTracker()
 formatter = MessageFormatter(FLIGHT_CONFIG)
 search_counter = 0
+# Selenium, VPN scripts and retry backoffs block, so cycles run on this
+# thread instead of the event loop; one at a time, in order
+search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='flight-search')
+search_cycle = None
+
+def run_search_cycle(searcher, flights, dates):
+    """Search every configured route (blocking: runs on search_executor)."""
+    all_flight_data = {}
+    try:
+        for flight in flights:
+            flight_data = searcher.search_flights_with_retry(
+                flight['Origin'],
+                flight['Destination'],
+                dates,
+                max_retries=3
+            )
+            for key, data in flight_data.items():
+                data['origin'] = flight['Origin']
+                data['destination'] = flight['Destination']
+            all_flight_data.update(flight_data)
+    finally:
+        # One VPN connection serves the whole cycle; drop it until the next one
+        searcher.end_cycle()
+    return all_flight_data
+
+async def close_searcher(searcher):
+    """Cancel a searcher and release its browsers and VPN once its cycle has wound down."""
+    searcher.cancel()
+    # search_executor runs one task at a time, so close() waits for the cycle in flight
+    await asyncio.get_running_loop().run_in_executor(search_executor, searcher.close)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
@@ -66,9 +98,13 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         price_tracker.reset()
         search_counter = 0
 
+        # Stop the previous searcher, if any, before starting a new one
+        if flight_searcher:
+            context.application.create_task(close_searcher(flight_searcher))
+
         # Initialize flight searcher
         use_vpn = os.getenv("USE_VPN", "False").lower() == "true"
-        flight_searcher = FlightSearcher(vpn=use_vpn)
+        flight_searcher = FlightSearcher(vpn=use_vpn, driver_pool=get_shared_pool())
 
         # Remove existing job if any
         if search_job:
@@ -99,7 +135,7 @@ async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 async def stop_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Stop the flight search scheduler."""
-    global search_job, flight_searcher, search_counter, price_tracker
+    global search_job, flight_searcher, search_counter, price_tracker, search_cycle
 
     if search_job:
         search_job.schedule_removal()
@@ -107,8 +143,10 @@ async def stop_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         logger.info("Flight search scheduler stopped")
 
     if flight_searcher:
-        flight_searcher.close()
+        # Abort the in-flight cycle; it is closed in the background so this handler returns at once
+        context.application.create_task(close_searcher(flight_searcher))
         flight_searcher = None
+        search_cycle = None
 
     # Reset tracking variables
     price_tracker.reset()
@@ -117,7 +155,15 @@ async def stop_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     await update.message.reply_text('Flight search stopped!')
 
 async def flight_search_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    global flight_searcher, search_counter, price_tracker
+    global flight_searcher, search_counter, price_tracker, search_cycle
+
+    if search_cycle and not search_cycle.done():
+        logger.info("Previous flight search still running, skipping this cycle")
+        return
+
+    searcher = flight_searcher
+    if not searcher:
+        return
 
     try:
         search_counter += 1
@@ -126,19 +172,13 @@ async def flight_search_job(context: ContextTypes.DEFAULT_TYPE) -> None:
         dates = FLIGHT_CONFIG['dates']
         flights = FLIGHT_CONFIG['flights']
 
-        all_flight_data = {}
-
-        for flight in flights:
-            flight_data = flight_searcher.search_flights_with_retry(
-                flight['Origin'],
-                flight['Destination'],
-                dates,
-                max_retries=3
-            )
-            for key, data in flight_data.items():
-                data['origin'] = flight['Origin']
-                data['destination'] = flight['Destination']
-            all_flight_data.update(flight_data)
+        # The blocking search runs off the event loop, so commands keep being answered
+        loop = asyncio.get_running_loop()
+        search_cycle = loop.run_in_executor(search_executor, run_search_cycle, searcher, flights, dates)
+        all_flight_data = await search_cycle
+        if searcher.cancelled.is_set():
+            # Stopped after the last lookup: the results are no longer wanted
+            raise SearchCancelled("Search cancelled")
 
         if all_flight_data and hasattr(context, 'job') and context.job:
             chat_id = context.job.chat_id
@@ -173,6 +213,9 @@ async def flight_search_job(context: ContextTypes.DEFAULT_TYPE) -> None:
 
         logger.info(f"Flight search completed successfully (Cycle {search_counter})")
 
+    except SearchCancelled:
+        logger.info(f"Flight search cancelled (Cycle {search_counter})")
+
     except Exception as e:
         logger.error(f"Error in flight search job: {e}")
         if hasattr(context, 'job') and context.job:
@@ -8,6 +8,80 @@ load_dotenv(BASE_DIR / 'config.env')
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 FLIGHT_SEARCH_INTERVAL = 60 * 60  # 90 minutes in seconds
 
-bash_script_disconnect = str(BASE_DIR / 'nordvpn_disconnect.sh')
-bash_script_connect = str(BASE_DIR / 'nordvpn_connect.sh')
-vpn_countries = ['Germany', 'Italy', 'Portugal', 'Spain', 'France']
\ No newline at end of file
+bash_script_disconnect = os.getenv("VPN_DISCONNECT_SCRIPT", str(BASE_DIR / 'nordvpn_disconnect.sh'))
+bash_script_connect = os.getenv("VPN_CONNECT_SCRIPT", str(BASE_DIR / 'nordvpn_connect.sh'))
+vpn_countries = ['Germany', 'Italy', 'Portugal', 'Spain', 'France']
+# VPN session: after connecting, the check command is polled until it succeeds
+# (instead of a fixed sleep); exits that served a block rest for a cooldown
+vpn_check_command = os.getenv("VPN_CHECK_COMMAND", 'nordvpn status | grep -q "Status: Connected"')
+vpn_connect_timeout = float(os.getenv("VPN_CONNECT_TIMEOUT", 60))
+vpn_ready_timeout = float(os.getenv("VPN_READY_TIMEOUT", 30))
+vpn_poll_interval = float(os.getenv("VPN_POLL_INTERVAL", 0.5))
+vpn_health_interval = float(os.getenv("VPN_HEALTH_INTERVAL", 60))
+vpn_block_cooldown = float(os.getenv("VPN_BLOCK_COOLDOWN", 900))
+# Proxy pool: comma-separated proxy URLs (http://[user:pass@]host:port). When
+# set, every browser and HTTP request leaves through one of them instead of
+# the machine's address, so parallel workers use different exits
+proxy_list = [p.strip() for p in os.getenv("PROXIES", "").split(",") if p.strip()]
+proxy_rate_per_minute = int(os.getenv("PROXY_RATE_PER_MINUTE", 20))
+proxy_block_cooldown = float(os.getenv("PROXY_BLOCK_COOLDOWN", 900))
+proxy_max_wait = float(os.getenv("PROXY_MAX_WAIT", 30))
+# Cookies stored after accepting the cookie popup, re-used by every browser
+consent_cookie_file = os.getenv("CONSENT_COOKIE_FILE", str(BASE_DIR / 'consent_cookies.json'))
+
+# Fare cache shared by the bot and the web app (SQLite): answers are reused
+# for FARE_CACHE_TTL seconds (0 = off); a lookup claimed by another process
+# is waited for at most FARE_CACHE_LEASE seconds
+fare_cache_file = os.getenv("FARE_CACHE_FILE", str(BASE_DIR / 'fare_cache.sqlite3'))
+fare_cache_ttl = float(os.getenv("FARE_CACHE_TTL", 600))
+fare_cache_lease = float(os.getenv("FARE_CACHE_LEASE", 120))
+
+# Browser pool: how many warm Chrome instances to keep and when to recycle them
+driver_pool_size = int(os.getenv("DRIVER_POOL_SIZE", 2))
+driver_max_pages = int(os.getenv("DRIVER_MAX_PAGES", 50))
+driver_max_rss_mb = int(os.getenv("DRIVER_MAX_RSS_MB", 1500))
+
+# Lean browser profile: block images, fonts, analytics and ads over CDP and
+# stop waiting for the full page load (explicit waits do the rest)
+lean_browser = os.getenv("LEAN_BROWSER", "False").lower() == "true"
+page_load_strategy = os.getenv("PAGE_LOAD_STRATEGY", "eager" if lean_browser else "normal").lower()
+# Every N lean pages one is loaded unblocked to measure what the profile saves (0 = never)
+lean_calibrate_every = int(os.getenv("LEAN_CALIBRATE_EVERY", 50))
+
+# How fares are read from the results page: 'dom' scrapes the rendered
+# carousel, 'network' reads the availability JSON from Chrome's network log
+extraction_mode = os.getenv("EXTRACTION_MODE", "dom").lower()
+
+# Engine used to fetch fares: 'selenium' drives a browser, 'http' calls the
+# availability API directly and falls back to Selenium when blocked
+search_backend = os.getenv("SEARCH_BACKEND", "selenium").lower()
+http_base_url = os.getenv("HTTP_BASE_URL", "https://www.ryanair.com")
+http_locale = os.getenv("HTTP_LOCALE", "it-it")
+http_timeout = float(os.getenv("HTTP_TIMEOUT", 10))
+http_pool_size = int(os.getenv("HTTP_POOL_SIZE", 10))
+http_flex_days = int(os.getenv("HTTP_FLEX_DAYS", 3))
+
+# Adaptive waits: each phase's timeout is the given percentile of recent
+# successful lookups (per egress) times a safety factor, within [min, max]
+adaptive_timeout_default = float(os.getenv("ADAPTIVE_TIMEOUT_DEFAULT", 5))
+adaptive_timeout_min = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", 2))
+adaptive_timeout_max = float(os.getenv("ADAPTIVE_TIMEOUT_MAX", 30))
+adaptive_timeout_percentile = float(os.getenv("ADAPTIVE_TIMEOUT_PERCENTILE", 95))
+adaptive_timeout_factor = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", 1.5))
+adaptive_timeout_window = int(os.getenv("ADAPTIVE_TIMEOUT_WINDOW", 100))
+
+# Governor of outbound lookups, per egress: a token bucket of
+# SCRAPE_RATE_PER_MINUTE (0 = unlimited) with bursts of SCRAPE_BURST, and a
+# circuit breaker pausing BREAKER_PAUSE seconds (doubling up to
+# BREAKER_MAX_PAUSE) after BREAKER_THRESHOLD block pages in a row. Its state
+# lives in a SQLite file so the bot, the web app and run_scraper share it
+rate_limit_file = os.getenv("RATE_LIMIT_FILE", str(BASE_DIR / 'rate_limit.sqlite3'))
+scrape_rate_per_minute = float(os.getenv("SCRAPE_RATE_PER_MINUTE", 30))
+scrape_burst = int(os.getenv("SCRAPE_BURST", 5))
+breaker_threshold = int(os.getenv("BREAKER_THRESHOLD", 3))
+breaker_pause = float(os.getenv("BREAKER_PAUSE", 300))
+breaker_max_pause = float(os.getenv("BREAKER_MAX_PAUSE", 3600))
+
+# Retries of failed lookups wait base * 2^attempt seconds (jittered, capped at max)
+retry_backoff_base = float(os.getenv("RETRY_BACKOFF_BASE", 2))
+retry_backoff_max = float(os.getenv("RETRY_BACKOFF_MAX", 60))
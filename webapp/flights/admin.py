@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Route, PriceRecord
+from .models import Route, PriceRecord, ScrapeJob
 
 
 @admin.register(Route)
@@ -11,6 +11,13 @@ class RouteAdmin(admin.ModelAdmin):
 
 @admin.register(PriceRecord)
 class PriceRecordAdmin(admin.ModelAdmin):
-    list_display = ('route', 'amount', 'currency', 'scraped_at')
+    list_display = ('route', 'amount', 'currency', 'first_seen', 'last_seen', 'observations')
     list_filter = ('route',)
-    readonly_fields = ('scraped_at',)
+    readonly_fields = ('first_seen', 'last_seen', 'observations')
+
+
+@admin.register(ScrapeJob)
+class ScrapeJobAdmin(admin.ModelAdmin):
+    list_display = ('route', 'priority', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
@@ -0,0 +1,136 @@
+"""
+Chart series for route_detail and api_prices, bounded in size however long
+a route's history is: optional SQL time buckets, then LTTB downsampling.
+"""
+
+RESOLUTIONS = ('hour', 'day', 'week', 'month')
+
+
+def chart_points(records) -> list[tuple]:
+    """(time, amount) points drawing each run from its first to its last sighting."""
+    points = []
+    for record in records:
+        points.append((record.first_seen, float(record.amount)))
+        if record.last_seen > record.first_seen:
+            points.append((record.last_seen, float(record.amount)))
+    return points
+
+
+def bucketed_points(records, resolution: str) -> list[tuple]:
+    """
+    One (bucket start, last, min, max) point per `resolution` bucket that
+    has records, aggregated in SQL. The final run is extended to its
+    last_seen so the line still reaches the latest sighting.
+    """
+    from django.db.models import Max, Min
+    from django.db.models.functions import Trunc
+
+    buckets = list(
+        records.order_by()
+        .annotate(bucket=Trunc('first_seen', resolution))
+        .values('bucket')
+        .annotate(low=Min('amount'), high=Max('amount'), newest=Max('first_seen'), seen=Max('last_seen'))
+        .order_by('bucket')
+    )
+    if not buckets:
+        return []
+    # The bucket's closing price is the one of its newest record
+    closing = dict(
+        records.filter(first_seen__in=[b['newest'] for b in buckets]).values_list('first_seen', 'amount')
+    )
+    points = [(b['bucket'], float(closing[b['newest']]), float(b['low']), float(b['high'])) for b in buckets]
+    last = buckets[-1]
+    if last['seen'] > last['bucket']:
+        price = points[-1][1]
+        points.append((last['seen'], price, price, price))
+    return points
+
+
+def lttb(points: list, threshold: int) -> list:
+    """
+    Largest-Triangle-Three-Buckets downsampling of (time, value, ...) points
+    to at most `threshold` points, keeping the first and the last (only
+    the first with a threshold of 1).
+    """
+    if threshold <= 0 or len(points) <= threshold:
+        return points
+    if threshold < 3:
+        # No room for a point between the two ends
+        return [points[0], points[-1]][:threshold]
+    x = [point[0].timestamp() for point in points]
+    y = [point[1] for point in points]
+
+    sampled = [points[0]]
+    size = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * size) + 1, int((i + 1) * size) + 1
+        next_start, next_end = end, min(int((i + 2) * size) + 1, len(points))
+        if next_start >= next_end:
+            next_start, next_end = len(points) - 1, len(points)
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def chart_series(records, resolution: str | None = None, max_points: int = 0, since=None) -> dict:
+    """
+    Timestamps, labels and prices of the chart of `records` (a route's
+    PriceRecord queryset, or an already fetched page of it), plus
+    per-bucket min/max with a resolution. With `since`, only the points
+    after it: a run that started before it contributes its new end only.
+    """
+    if resolution:
+        points = bucketed_points(records, resolution)
+    else:
+        points = chart_points(records)
+    if since:
+        points = [point for point in points if point[0] > since]
+    points = lttb(points, max_points)
+
+    series = {
+        'timestamps': [point[0].isoformat() for point in points],
+        'labels': [point[0].strftime('%d/%m %H:%M') for point in points],
+        'prices': [point[1] for point in points],
+    }
+    if resolution:
+        series['min'] = [point[2] for point in points]
+        series['max'] = [point[3] for point in points]
+    return series
+
+
+def parse_time(params, name: str):
+    """An ISO 8601 query parameter as an aware datetime, or None. Raises ValueError if malformed."""
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value.replace(' ', '+'))
+    if parsed is None:
+        raise ValueError(f"{name} must be an ISO 8601 datetime")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def parse_chart_params(params, default_max_points: int) -> tuple[str | None, int]:
+    """(resolution, max_points) from query parameters. Raises ValueError on bad input."""
+    resolution = params.get('resolution') or None
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    try:
+        max_points = int(params.get('max_points', default_max_points))
+    except ValueError:
+        raise ValueError("max_points must be an integer")
+    if max_points < 0:
+        raise ValueError("max_points must not be negative")
+    return resolution, max_points
@@ -0,0 +1,80 @@
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+
+def node_id() -> str:
+    """Name of this scraper node: SCRAPER_NODE_ID, or host and process id."""
+    from django.conf import settings
+    return settings.SCRAPER_NODE_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def acquire_leases(routes, node: str, ttl: int) -> list:
+    """
+    Lease routes to `node` for `ttl` seconds. A route is leased only if it has
+    no lease yet or its lease expired (its node stopped heartbeating).
+    Returns the routes that were leased.
+    """
+    from django.db import IntegrityError, transaction
+    from django.db.models import Q
+    from django.utils import timezone
+    from flights.models import RouteLease
+
+    leased = []
+    for route in routes:
+        now = timezone.now()
+        expires = now + timedelta(seconds=ttl)
+        try:
+            with transaction.atomic():
+                RouteLease.objects.create(route=route, node=node, acquired_at=now, expires_at=expires)
+        except IntegrityError:
+            # Someone holds it: take it over only if the lease ran out (or is already ours)
+            taken = RouteLease.objects.filter(route=route).filter(
+                Q(expires_at__lte=now) | Q(node=node)
+            ).update(node=node, acquired_at=now, expires_at=expires)
+            if not taken:
+                continue
+        leased.append(route)
+    return leased
+
+
+def renew_leases(node: str, ttl: int) -> int:
+    """Push back the expiry of every lease `node` holds. Returns how many were renewed."""
+    from django.utils import timezone
+    from flights.models import RouteLease
+
+    return RouteLease.objects.filter(node=node).update(expires_at=timezone.now() + timedelta(seconds=ttl))
+
+
+def release_leases(routes, node: str) -> None:
+    from flights.models import RouteLease
+    RouteLease.objects.filter(route__in=routes, node=node).delete()
+
+
+@contextmanager
+def heartbeat(node: str, ttl: int):
+    """Renew `node`'s leases every ttl/3 seconds while the block runs."""
+    from django.db import connection
+
+    stop = threading.Event()
+
+    def beat():
+        renewed = False
+        while not stop.wait(ttl / 3):
+            try:
+                renew_leases(node, ttl)
+                renewed = True
+            except Exception as e:
+                print(f"Lease heartbeat of {node} failed: {e}")
+        if renewed:
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,139 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+class Rollback(Exception):
+    """Raised to throw away the seeded data once the benchmark is done."""
+
+
+class Command(BaseCommand):
+    help = ('Seed routes and price records, then show the query plans and timings of the '
+            'dashboard and scraper queries without and with the flights indexes. '
+            'Everything runs in one transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--records',
+            type=int,
+            default=1_000_000,
+            help='Price records to seed (default: 1000000)'
+        )
+        parser.add_argument(
+            '--routes',
+            type=int,
+            default=1000,
+            help='Routes the records are spread over (default: 1000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Times each query is run for the timing (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['records'], options['routes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded data rolled back.')
+
+    def run(self, records, routes, repeat):
+        from flights.models import PriceRecord, Route
+
+        started = time.perf_counter()
+        route_ids = self.seed(records, routes)
+        self.stdout.write(f'Seeded {records} record(s) over {len(route_ids)} route(s) '
+                          f'in {time.perf_counter() - started:.1f}s.')
+
+        sample = random.Random(0).sample(route_ids, min(repeat, len(route_ids)))
+        today = date.today()
+        queries = {
+            'history (route, first_seen)': lambda pk: list(
+                PriceRecord.objects.filter(route_id=pk).order_by('first_seen').values_list('amount', flat=True)),
+            'latest (route, -first_seen)': lambda pk: list(
+                PriceRecord.objects.filter(route_id=pk).order_by('-first_seen').values('amount')[:1]),
+            'lowest (route, amount)': lambda pk: list(
+                PriceRecord.objects.filter(route_id=pk).order_by('amount').values('amount')[:1]),
+            'departed (is_active, date)': lambda pk: Route.objects.filter(
+                is_active=True, date__lt=today + timedelta(days=pk % 30)).count(),
+        }
+        explain = {
+            'history (route, first_seen)': PriceRecord.objects.filter(route_id=sample[0]).order_by('first_seen'),
+            'latest (route, -first_seen)': PriceRecord.objects.filter(route_id=sample[0]).order_by('-first_seen')[:1],
+            'lowest (route, amount)': PriceRecord.objects.filter(route_id=sample[0]).order_by('amount')[:1],
+            'departed (is_active, date)': Route.objects.filter(is_active=True, date__lt=today),
+        }
+
+        timings = {}
+        for phase in ('without', 'with'):
+            with connection.cursor() as cursor:
+                for sql in index_statements(drop=phase == 'without'):
+                    cursor.execute(sql)
+                if connection.vendor in ('sqlite', 'postgresql'):
+                    # Refresh planner statistics so the plans reflect the seeded data
+                    cursor.execute('ANALYZE')
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{phase.capitalize()} indexes'))
+            for name, query in queries.items():
+                self.stdout.write(f'  {name}')
+                for line in explain[name].explain().splitlines():
+                    self.stdout.write(f'      {line}')
+                started = time.perf_counter()
+                for pk in sample:
+                    query(pk)
+                timings[name, phase] = (time.perf_counter() - started) / len(sample) * 1000
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nAverage time per query (ms)'))
+        for name in queries:
+            before, after = timings[name, 'without'], timings[name, 'with']
+            self.stdout.write(f'  {name:<30} {before:9.3f} → {after:9.3f}  ({before / max(after, 1e-9):.0f}x)')
+
+    def seed(self, records, routes):
+        from flights.models import PriceRecord, Route
+
+        rng = random.Random(42)
+        first_day = date.today() - timedelta(days=routes // 2)
+        Route.objects.bulk_create(
+            [Route(origin='BMK', destination='BMX', date=first_day + timedelta(days=i),
+                   is_active=rng.random() < 0.8)
+             for i in range(routes)],
+            batch_size=1000,
+        )
+        route_ids = list(Route.objects.filter(origin='BMK', destination='BMX').values_list('pk', flat=True))
+
+        # Plain executemany: bulk_create spends most of a million-row seed building model instances
+        table = PriceRecord._meta.db_table
+        insert = (f'INSERT INTO {table} (route_id, amount, currency, first_seen, last_seen, observations) '
+                  f'VALUES (%s, %s, %s, %s, %s, 1)')
+        start = timezone.now() - timedelta(days=365)
+        with connection.cursor() as cursor:
+            for offset in range(0, records, 10_000):
+                rows = []
+                for n in range(offset, min(offset + 10_000, records)):
+                    seen = connection.ops.adapt_datetimefield_value(start + timedelta(minutes=n))
+                    rows.append((route_ids[n % len(route_ids)], str(Decimal(rng.randint(1000, 30000)) / 100),
+                                 '€', seen, seen))
+                cursor.executemany(insert, rows)
+        return route_ids
+
+
+def index_statements(drop):
+    """SQL dropping (or creating) the indexes declared in the Meta of Route and PriceRecord."""
+    from flights.models import PriceRecord, Route
+
+    qn = connection.ops.quote_name
+    for model in (Route, PriceRecord):
+        table = model._meta.db_table
+        for index in model._meta.indexes:
+            if drop:
+                yield f'DROP INDEX {qn(index.name)}' + (f' ON {qn(table)}' if connection.vendor == 'mysql' else '')
+            else:
+                columns = ', '.join(qn(model._meta.get_field(name).column) for name in index.fields)
+                yield f'CREATE INDEX {qn(index.name)} ON {qn(table)} ({columns})'
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Fold consecutive identical prices of each route into a single PriceRecord run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--route',
+            type=int,
+            action='append',
+            help='Only compact this route id (repeatable). Default: every route.'
+        )
+
+    def handle(self, *args, **options):
+        from flights.storage import compact_price_records
+
+        kept, deleted = compact_price_records(options['route'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Folded {deleted} record(s); {kept} run(s) left.'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the RouteStats summary of every route from its full price history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--route',
+            type=int,
+            action='append',
+            help='Only rebuild this route id (repeatable). Default: every route.'
+        )
+
+    def handle(self, *args, **options):
+        from flights.storage import rebuild_route_stats
+
+        count = rebuild_route_stats(options['route'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} route(s).'))
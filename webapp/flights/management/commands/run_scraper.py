@@ -1,8 +1,8 @@
 import sys
 import os
 from pathlib import Path
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django_apscheduler.jobstores import DjangoJobStore
 from apscheduler.schedulers.blocking import BlockingScheduler
 
 # Add telegram_bot folder to path so FlightSearcher is importable
@@ -10,79 +10,96 @@ SCRAPER_PATH = Path(__file__).resolve().parent.parent.parent.parent.parent / 'te
 sys.path.insert(0, str(SCRAPER_PATH))
 
 
-def scrape_active_routes():
-    """Fetch prices for all active routes and save to DB."""
+def scrape_due_routes(workers=1, mode='thread', node=None):
+    """Scrape the active routes whose next-due time has come and save to DB."""
     import django
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webapp.settings')
     django.setup()
 
-    from flights.models import Route, PriceRecord
-    from FlightSearcher import FlightSearcher
+    from flights.models import ScrapeJob
+    from flights.scheduling import deactivate_departed, due_routes
+    from flights.scraper_service import enqueue_routes, drain_queue
 
     use_vpn = os.getenv("USE_VPN", "False").lower() == "true"
-    searcher = FlightSearcher(vpn=use_vpn)
 
-    active_routes = Route.objects.filter(is_active=True)
-    if not active_routes.exists():
-        print("[scraper] No active routes to scrape.")
-        return
+    departed = deactivate_departed()
+    if departed:
+        print(f"[scraper] Deactivated {departed} route(s) that already departed.")
 
-    for route in active_routes:
-        date_str = route.date.strftime('%Y-%m-%d')
-        print(f"[scraper] Searching {route.origin}-{route.destination} on {date_str}...")
-        results = searcher.search_flights_with_retry(
-            route.origin, route.destination, [date_str], max_retries=3
-        )
-        for key, data in results.items():
-            if data and data.get('amount'):
-                record = PriceRecord.objects.create(
-                    route=route,
-                    amount=data['amount'],
-                    currency=data.get('currency', '?'),
-                )
-                print(f"[scraper] Saved: {record}")
+    routes = list(due_routes())
+    if not routes:
+        return
 
-                # Check alert
-                if route.target_price and data['amount'] <= float(route.target_price):
-                    print(f"[scraper] 🔔 PRICE DROP ALERT: {route} → {data['amount']} {data.get('currency','')}")
+    # Routes queued from the dashboard are scraped before the sweep
+    enqueue_routes(routes, ScrapeJob.PRIORITY_SWEEP)
+    print(f"[scraper] Scraping {len(routes)} due route(s) with {workers} {mode} worker(s)...")
+    drain_queue(vpn=use_vpn, workers=workers, mode=mode, node=node,
+                log=lambda msg: print(f"[scraper] {msg}"))
 
 
 class Command(BaseCommand):
-    help = 'Start the APScheduler to scrape flight prices on a schedule.'
+    help = 'Start the APScheduler to scrape each route when it is due.'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--interval',
             type=int,
-            default=5400,
-            help='Interval in seconds between scrapes (default: 5400 = 90 min)'
+            default=settings.SCRAPER_TICK,
+            help='Seconds between checks for due routes (default: SCRAPER_TICK). '
+                 'Each route is scraped on its own schedule.'
         )
         parser.add_argument(
             '--run-now',
             action='store_true',
-            help='Run a scrape immediately at startup, then follow the schedule.'
+            help='Scrape the due routes immediately at startup, then follow the schedule.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.SCRAPER_WORKERS,
+            help='Number of routes scraped concurrently, each with its own browser (default: SCRAPER_WORKERS)'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['thread', 'process'],
+            default=settings.SCRAPER_WORKER_MODE,
+            help='Run workers as threads or as separate processes (default: SCRAPER_WORKER_MODE)'
+        )
+        parser.add_argument(
+            '--node-id',
+            default=None,
+            help='Name of this node when several run_scraper instances share the database '
+                 '(default: SCRAPER_NODE_ID, or hostname-pid)'
         )
 
     def handle(self, *args, **options):
+        from flights.leases import node_id
+
         interval = options['interval']
+        workers = options['workers']
+        mode = options['mode']
+        node = options['node_id'] or node_id()
+        # The schedule of each route lives in the database (Route.next_due_at);
+        # the tick stays in memory so every node runs its own instead of
+        # sharing one stored job with the other nodes.
         scheduler = BlockingScheduler(timezone='Europe/Rome')
-        scheduler.add_jobstore(DjangoJobStore(), 'default')
 
         scheduler.add_job(
-            scrape_active_routes,
+            scrape_due_routes,
             trigger='interval',
             seconds=interval,
             id='scrape_flights',
-            replace_existing=True,
+            kwargs={'workers': workers, 'mode': mode, 'node': node},
         )
 
         self.stdout.write(self.style.SUCCESS(
-            f'Scraper scheduler started. Interval: {interval}s. Press Ctrl+C to stop.'
+            f'Scraper node {node} started. Checking for due routes every {interval}s, '
+            f'workers: {workers} ({mode}). Press Ctrl+C to stop.'
         ))
 
         if options['run_now']:
             self.stdout.write('Running initial scrape now...')
-            scrape_active_routes()
+            scrape_due_routes(workers=workers, mode=mode, node=node)
 
         try:
             scheduler.start()
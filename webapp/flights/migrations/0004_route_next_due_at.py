@@ -0,0 +1,18 @@
+# Generated by Django 6.0.4 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0003_scrapejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='next_due_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.4 on 2026-10-18 12:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0005_scrapejob_node_routelease'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pricerecord',
+            options={'ordering': ['-first_seen']},
+        ),
+        migrations.RenameField(
+            model_name='pricerecord',
+            old_name='scraped_at',
+            new_name='first_seen',
+        ),
+        migrations.AlterField(
+            model_name='pricerecord',
+            name='first_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='pricerecord',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='pricerecord',
+            name='observations',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.4 on 2026-10-18 12:40
+
+from django.db import migrations
+from django.db.models import F
+
+
+def fold_runs(apps, schema_editor):
+    """
+    Fold consecutive records of a route with the same price into one run.
+    A frozen copy of flights.storage.compact_price_records at this point of
+    the schema, so later edits to storage.py don't change what it does.
+    """
+    PriceRecord = apps.get_model('flights', 'PriceRecord')
+    # Every existing row is a single observation
+    PriceRecord.objects.update(last_seen=F('first_seen'), observations=1)
+
+    route_ids = PriceRecord.objects.order_by().values_list('route_id', flat=True).distinct()
+    for route_id in list(route_ids):
+        runs, doomed = [], []
+        rows = PriceRecord.objects.filter(route_id=route_id).order_by('first_seen', 'pk').values(
+            'pk', 'amount', 'currency', 'first_seen', 'last_seen', 'observations'
+        )
+        for row in rows.iterator():
+            run = runs[-1] if runs else None
+            if run and run['amount'] == row['amount'] and run['currency'] == row['currency']:
+                run['last_seen'] = max(run['last_seen'], row['last_seen'])
+                run['observations'] += row['observations']
+                run['changed'] = True
+                doomed.append(row['pk'])
+            else:
+                runs.append(dict(row, changed=False))
+
+        for run in runs:
+            if run['changed']:
+                PriceRecord.objects.filter(pk=run['pk']).update(
+                    last_seen=run['last_seen'], observations=run['observations']
+                )
+        for start in range(0, len(doomed), 500):
+            PriceRecord.objects.filter(pk__in=doomed[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0006_pricerecord_runs'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_runs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.4 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    """
+    Summarise every route's price history into RouteStats. A frozen copy of
+    flights.storage.rebuild_route_stats at this point of the schema.
+    """
+    PriceRecord = apps.get_model('flights', 'PriceRecord')
+    RouteStats = apps.get_model('flights', 'RouteStats')
+
+    stats = []
+    route_ids = PriceRecord.objects.order_by().values_list('route_id', flat=True).distinct()
+    for route_id in list(route_ids):
+        entry = None
+        rows = PriceRecord.objects.filter(route_id=route_id).order_by('first_seen', 'pk').values(
+            'amount', 'currency', 'first_seen', 'last_seen', 'observations'
+        )
+        for row in rows.iterator():
+            if entry is None:
+                entry = RouteStats(
+                    route_id=route_id, currency=row['currency'], latest_amount=row['amount'],
+                    min_amount=row['amount'], max_amount=row['amount'], record_count=0,
+                    last_change_at=row['first_seen'],
+                )
+            elif entry.latest_amount != row['amount'] or entry.currency != row['currency']:
+                entry.last_change_at = row['first_seen']
+            entry.latest_amount, entry.currency, entry.latest_seen = row['amount'], row['currency'], row['last_seen']
+            entry.min_amount = min(entry.min_amount, row['amount'])
+            entry.max_amount = max(entry.max_amount, row['amount'])
+            entry.record_count += row['observations']
+        if entry is not None:
+            stats.append(entry)
+    RouteStats.objects.bulk_create(stats, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0007_compact_pricerecords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteStats',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='flights.route')),
+                ('currency', models.CharField(max_length=3)),
+                ('latest_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('latest_seen', models.DateTimeField()),
+                ('min_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('last_change_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
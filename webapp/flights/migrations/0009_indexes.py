@@ -0,0 +1,25 @@
+# Generated by Django 6.0.4 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0008_routestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['is_active', 'date'], name='route_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricerecord',
+            index=models.Index(fields=['route', 'first_seen'], name='price_route_seen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricerecord',
+            index=models.Index(fields=['route', 'amount'], name='price_route_amount_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.4 on 2026-10-18 16:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0009_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routestats',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,13 +1,20 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 class Route(models.Model):
     origin = models.CharField(max_length=3)
     destination = models.CharField(max_length=3)
     date = models.DateField()
     is_active = models.BooleanField(default=True)
+    # Set after each scrape from departure proximity and price volatility
+    next_due_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta:
         unique_together = ('origin', 'destination', 'date')
+        indexes = [
+            # Active routes by date: scheduler sweeps and departed-route cleanup
+            models.Index(fields=['is_active', 'date'], name='route_active_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.origin}-{self.destination} on {self.date}"
@@ -28,10 +35,105 @@ class PriceRecord(models.Model):
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='price_records')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3)
-    scraped_at = models.DateTimeField(auto_now_add=True)
+    # A record is a run of identical prices: seen `observations` times from
+    # first_seen to last_seen (see flights.storage)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+    observations = models.PositiveIntegerField(default=1)
 
     class Meta:
-        ordering = ['-scraped_at']
+        ordering = ['-first_seen']
+        indexes = [
+            # A route's history in time order (charts, latest price) and by price (lowest)
+            models.Index(fields=['route', 'first_seen'], name='price_route_seen_idx'),
+            models.Index(fields=['route', 'amount'], name='price_route_amount_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.route}: {self.amount} {self.currency} at {self.scraped_at}"
+        return f"{self.route}: {self.amount} {self.currency} from {self.first_seen} to {self.last_seen}"
+
+    def save(self, *args, **kwargs):
+        # The RouteStats refresh (flights.signals) commits or rolls back with the record
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class ScrapeJob(models.Model):
+    """A route waiting to be scraped (or being scraped) by the scrape queue."""
+
+    # Lower runs first: a route the user just added beats the periodic sweep
+    PRIORITY_USER = 0
+    PRIORITY_SWEEP = 10
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='scrape_jobs')
+    priority = models.PositiveSmallIntegerField(default=PRIORITY_SWEEP)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    node = models.CharField(max_length=100, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['priority', 'created_at']
+        constraints = [
+            # One pending job per route, even when several nodes queue it at once
+            models.UniqueConstraint(
+                fields=['route'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='one_pending_job_per_route',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.route} ({self.status}, priority {self.priority})"
+
+
+class RouteLease(models.Model):
+    """
+    A route being scraped by one scraper node. The node renews expires_at
+    while it works; once it lapses, another node may take the route over.
+    """
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='lease')
+    node = models.CharField(max_length=100, db_index=True)
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.route} leased to {self.node} until {self.expires_at}"
+
+
+class RouteStats(models.Model):
+    """
+    Price summary of a route, updated in the same transaction as every
+    scraped price write (see flights.storage.update_route_stats) and
+    rebuilt in the transaction of every record saved or deleted through
+    the ORM (see flights.signals), so that reads never scan PriceRecord.
+    `manage.py rebuild_route_stats` recomputes it after writes that send
+    no signals (update(), raw SQL).
+    """
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    currency = models.CharField(max_length=3)
+    latest_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    latest_seen = models.DateTimeField()
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Scrapes that found a price, not PriceRecord rows
+    record_count = models.PositiveIntegerField(default=0)
+    last_change_at = models.DateTimeField()
+    # Bumped by every write to the route's prices: the version of its price history (ETag)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.route}: {self.currency} {self.latest_amount} (min {self.min_amount}, max {self.max_amount})"
@@ -0,0 +1,38 @@
+"""
+Keyset (cursor) pagination over PriceRecord in (first_seen, pk) order, for
+clients that page through a long history or poll for what is new.
+"""
+import base64
+from datetime import datetime
+
+
+def encode_cursor(record) -> str:
+    raw = f"{record.first_seen.isoformat()}|{record.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """(first_seen, pk) of the last record of the previous page. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        seen, pk = raw.split('|')
+        return datetime.fromisoformat(seen), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def cursor_page(records, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    """
+    Up to `limit` records after `cursor`, and the cursor of the next page
+    (None on the last page).
+    """
+    from django.db.models import Q
+
+    records = records.order_by('first_seen', 'pk')
+    if cursor:
+        seen, pk = decode_cursor(cursor)
+        records = records.filter(Q(first_seen__gt=seen) | Q(first_seen=seen, pk__gt=pk))
+    page = list(records[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_cursor(page[limit - 1])
+    return page, None
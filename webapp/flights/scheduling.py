@@ -0,0 +1,87 @@
+from datetime import timedelta
+from statistics import mean, pstdev
+
+# Base scrape interval by days to departure: fares move fastest close to the flight
+PROXIMITY_TIERS = [
+    (3, timedelta(minutes=30)),
+    (14, timedelta(hours=1)),
+    (30, timedelta(hours=3)),
+    (90, timedelta(hours=6)),
+]
+FAR_INTERVAL = timedelta(hours=12)
+
+# Recent records looked at to judge how much a route's price moves
+VOLATILITY_WINDOW = 10
+# Relative standard deviation above which a route is scraped twice as often,
+# and below which (with a full window) half as often
+VOLATILE = 0.05
+STABLE = 0.01
+
+
+def base_interval(days_to_departure: int) -> timedelta:
+    for days, interval in PROXIMITY_TIERS:
+        if days_to_departure <= days:
+            return interval
+    return FAR_INTERVAL
+
+
+def price_volatility(amounts) -> float | None:
+    """Relative standard deviation of recent prices, or None with fewer than two."""
+    amounts = [float(amount) for amount in amounts]
+    if len(amounts) < 2 or not mean(amounts):
+        return None
+    return pstdev(amounts) / mean(amounts)
+
+
+def scrape_interval(route, now) -> timedelta:
+    """How long to wait before scraping `route` again."""
+    from django.conf import settings
+
+    interval = base_interval((route.date - now.date()).days)
+    # A record stands for `observations` scrapes of the same price
+    amounts = []
+    for amount, observations in route.price_records.values_list('amount', 'observations')[:VOLATILITY_WINDOW]:
+        amounts.extend([amount] * min(observations, VOLATILITY_WINDOW - len(amounts)))
+        if len(amounts) >= VOLATILITY_WINDOW:
+            break
+    volatility = price_volatility(amounts)
+    if volatility is not None:
+        if volatility >= VOLATILE:
+            interval /= 2
+        elif volatility <= STABLE and len(amounts) >= VOLATILITY_WINDOW:
+            interval *= 2
+
+    low = timedelta(seconds=settings.SCRAPER_MIN_INTERVAL)
+    high = timedelta(seconds=settings.SCRAPER_MAX_INTERVAL)
+    return min(max(interval, low), high)
+
+
+def schedule_next(route, now=None, save: bool = True) -> None:
+    """Set when `route` is due next, after it has just been scraped."""
+    from django.utils import timezone
+
+    now = now or timezone.now()
+    route.next_due_at = now + scrape_interval(route, now)
+    if save:
+        route.save(update_fields=['next_due_at'])
+
+
+def deactivate_departed(today=None) -> int:
+    """Deactivate routes whose date has passed. Returns how many were deactivated."""
+    from django.utils import timezone
+    from flights.models import Route
+
+    today = today or timezone.localdate()
+    return Route.objects.filter(is_active=True, date__lt=today).update(is_active=False)
+
+
+def due_routes(now=None):
+    """Active routes that were never scraped or whose next-due time has come."""
+    from django.db.models import Q
+    from django.utils import timezone
+    from flights.models import Route
+
+    now = now or timezone.now()
+    return Route.objects.filter(is_active=True).filter(
+        Q(next_due_at__isnull=True) | Q(next_due_at__lte=now)
+    ).order_by('next_due_at')
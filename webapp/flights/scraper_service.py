@@ -19,7 +19,8 @@ _log_lock  = threading.Lock()
 _sse_events: list = []           # one threading.Event per connected SSE client
 _sse_lock   = threading.Lock()
 _scraper_thread: threading.Thread | None = None
-_scraper_running = threading.Event()
+_scraper_running = threading.Event()   # set while the queue dispatcher runs
+_dispatch_lock = threading.Lock()
 _use_vpn: bool = False           # off by default
 
 
@@ -51,6 +52,25 @@ def set_vpn(enabled: bool) -> None:
     _use_vpn = enabled
 
 
+def get_metrics() -> dict:
+    """Scraper timings and page costs collected in this process."""
+    from LatencyTracker import latency_tracker
+    from BrowserProfile import page_stats
+    from DriverPool import get_shared_pool
+    from VpnSession import vpn_session
+    from ProxyPool import get_shared_proxy_pool
+    from RateLimiter import rate_limiter
+    proxy_pool = get_shared_proxy_pool()
+    return {
+        'latency': latency_tracker.snapshot(),
+        'pages': page_stats.summary(),
+        'driver_pool': get_shared_pool().stats(),
+        'vpn': vpn_session.snapshot(),
+        'proxies': proxy_pool.stats() if proxy_pool else {},
+        'rate_limiter': rate_limiter.snapshot(),
+    }
+
+
 def register_sse_client() -> threading.Event:
     ev = threading.Event()
     with _sse_lock:
@@ -68,79 +88,425 @@ def unregister_sse_client(ev: threading.Event) -> None:
 
 # ------- scraper logic -------
 
-def _run_scrape(route_pks: list[int] | None = None) -> None:
+def group_routes(routes, window_days: int) -> list[list]:
     """
-    Run a scrape cycle. If route_pks is given, only scrape those routes.
-    This function is meant to be called from a thread.
+    Group routes with the same origin and destination whose dates fall within
+    `window_days` of the first date in the group, so that a single results
+    page (and its fare carousel) can price all of them.
     """
-    import django
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webapp.settings')
-    django.setup()
+    by_leg: dict[tuple[str, str], list] = {}
+    for route in routes:
+        by_leg.setdefault((route.origin, route.destination), []).append(route)
+
+    groups = []
+    for leg_routes in by_leg.values():
+        leg_routes.sort(key=lambda r: r.date)
+        group = [leg_routes[0]]
+        for route in leg_routes[1:]:
+            if (route.date - group[0].date).days <= window_days:
+                group.append(route)
+            else:
+                groups.append(group)
+                group = [route]
+        groups.append(group)
+    return groups
 
-    from flights.models import Route, PriceRecord
-    from FlightSearcher import FlightSearcher
 
-    clear_logs()
-    _push_log(f"🚀 Scraper started {'(VPN ON)' if _use_vpn else '(VPN OFF)'}")
+# Longest time, in seconds, between two checks of the buffer's age while workers are busy
+FLUSH_TICK = 1.0
 
-    try:
-        searcher = FlightSearcher(vpn=_use_vpn)
 
-        if route_pks:
-            routes = Route.objects.filter(pk__in=route_pks, is_active=True)
-        else:
-            routes = Route.objects.filter(is_active=True)
+class ResultBuffer:
+    """
+    Collects scrape results and writes them in one short transaction per
+    batch: the price records with bulk_create, the routes' next due times
+    with bulk_update, then the `on_route_done` callbacks (job and lease
+    bookkeeping). With PRICE_STORAGE = 'changes' an unchanged price only
+    extends its route's latest record (see flights.storage). RouteStats is
+    updated in the same transaction. A batch is flushed once it holds `size` routes or its
+    oldest result is `interval` seconds old, and when the scrape ends. The age is
+    checked on add() and by flush_if_due(), which scrape_routes calls every
+    FLUSH_TICK seconds at most while the workers are busy.
+    """
 
-        if not routes.exists():
-            _push_log("⚠️  No active routes to scrape.")
+    def __init__(self, size: int, interval: float, log=_push_log, on_route_done=None):
+        self.size = max(1, size)
+        self.interval = interval
+        self.log = log
+        self.on_route_done = on_route_done
+        self.saved = 0
+        self._records = []
+        self._done = []   # (route, error)
+        self._since = None
+
+    def add(self, route, data=None, error: str = '') -> None:
+        """Buffer the outcome of one route: its price info, or an error, or neither (no flight)."""
+        from flights.models import PriceRecord
+        from flights.storage import to_amount
+
+        if data and data.get('amount'):
+            self._records.append(PriceRecord(
+                route=route,
+                amount=to_amount(data['amount']),
+                currency=data.get('currency', '?'),
+            ))
+        self._done.append((route, error))
+        if self._since is None:
+            self._since = time.monotonic()
+        if len(self._done) >= self.size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Flush if the oldest buffered result is `interval` seconds old."""
+        if self._since is not None and time.monotonic() - self._since >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        from django.conf import settings
+        from django.db import transaction
+        from django.utils import timezone
+        from flights.models import Route, PriceRecord
+        from flights.scheduling import schedule_next
+        from flights.storage import merge_observations, update_route_stats
+
+        if not self._done:
             return
+        records, done = self._records, self._done
+        self._records, self._done, self._since = [], [], None
 
-        for route in routes:
-            date_str = route.date.strftime('%Y-%m-%d')
-            _push_log(f"🔍 Searching {route.origin} → {route.destination} ({date_str})...")
-
-            results = searcher.search_flights_with_retry(
-                route.origin, route.destination, [date_str], max_retries=3
-            )
-
-            if results:
-                for key, data in results.items():
-                    if data and data.get('amount'):
-                        record = PriceRecord.objects.create(
-                            route=route,
-                            amount=data['amount'],
-                            currency=data.get('currency', '?'),
-                        )
-                        _push_log(f"✅ Saved: {route} → {record.currency} {record.amount}")
+        now = timezone.now()
+        with transaction.atomic():
+            if settings.PRICE_STORAGE == 'changes':
+                created, extended = merge_observations(records, now)
             else:
-                _push_log(f"❌ No flights found for {route}")
+                for record in records:
+                    record.first_seen = record.last_seen = now
+                created, extended = records, []
+            PriceRecord.objects.bulk_create(created)
+            PriceRecord.objects.bulk_update(extended, ['last_seen', 'observations'])
+            update_route_stats([(record.route, record.amount, record.currency) for record in records], now)
+            routes = [route for route, _ in done]
+            for route in routes:
+                schedule_next(route, now, save=False)
+            Route.objects.bulk_update(routes, ['next_due_at'])
+            if self.on_route_done:
+                for route, error in done:
+                    self.on_route_done(route, error)
+
+        self.saved += len(records)
+        for record in records:
+            self.log(f"✅ Saved: {record.route} → {record.currency} {record.amount}")
+
+
+def scrape_routes(routes, vpn: bool, workers: int = 1, mode: str = 'thread', log=_push_log,
+                  on_route_done=None) -> int:
+    """
+    Search every route on `workers` concurrent workers and store the prices
+    in batches as workers finish (see ResultBuffer). Routes that share a
+    results page are searched together. Each route handled is given its
+    next due time, and `on_route_done(route, error)` is called for it.
+    Returns the number of records saved.
+    """
+    from django.conf import settings
+    from ScrapeEngine import ScrapeEngine
+    from RateLimiter import rate_limiter
+
+    groups = group_routes(routes, settings.SCRAPER_GROUP_DAYS)
+    jobs = []
+    for index, group in enumerate(groups):
+        first = group[0]
+        dates = [route.date.strftime('%Y-%m-%d') for route in group]
+        shown = dates[0] if len(dates) == 1 else f"{dates[0]} … {dates[-1]}, {len(dates)} dates"
+        log(f"🔍 Searching {first.origin} → {first.destination} ({shown})...")
+        jobs.append((index, first.origin, first.destination, dates))
+
+    buffer = ResultBuffer(settings.SCRAPER_FLUSH_SIZE, settings.SCRAPER_FLUSH_SECONDS, log, on_route_done)
+    engine = ScrapeEngine(vpn=vpn, workers=workers, mode=mode)
+    # Circuit breaker pauses and resumes show up in the log
+    rate_limiter.add_listener(log)
+    try:
+        # A stalled worker must not hold back the results already in the buffer
+        tick = min(FLUSH_TICK, max(0.1, buffer.interval))
+        for index, results in engine.run(jobs, tick=tick, on_tick=buffer.flush_if_due):
+            group = groups[index]
+            if isinstance(results, Exception):
+                log(f"💥 Error searching {group[0].origin} → {group[0].destination}: {results}")
+                for route in group:
+                    buffer.add(route, error=str(results))
+                continue
+
+            by_date = {data['date']: data for data in results.values() if data}
+            for route in group:
+                data = by_date.get(route.date.strftime('%Y-%m-%d'))
+                if not (data and data.get('amount')):
+                    log(f"❌ No flights found for {route}")
+                buffer.add(route, data)
+    finally:
+        rate_limiter.remove_listener(log)
+        # Results gathered before a failure are still worth keeping
+        buffer.flush()
+    return buffer.saved
+
+
+# ------- scrape queue -------
+
+def enqueue_routes(routes, priority: int) -> list:
+    """
+    Queue routes for scraping. A route that is already queued or running is
+    not queued twice; a queued one is only moved up to the higher priority.
+    Returns the routes' jobs.
+    """
+    from django.db import IntegrityError, transaction
+    from flights.models import ScrapeJob
+
+    pending = [ScrapeJob.QUEUED, ScrapeJob.RUNNING]
+    jobs = []
+    for route in routes:
+        try:
+            with transaction.atomic():
+                job = ScrapeJob.objects.create(route=route, priority=priority)
+        except IntegrityError:
+            # Already pending (possibly queued by another node a moment ago)
+            job = ScrapeJob.objects.filter(route=route, status__in=pending).first()
+            if job is None:
+                continue
+            if job.status == ScrapeJob.QUEUED and priority < job.priority:
+                ScrapeJob.objects.filter(pk=job.pk, priority__gt=priority).update(priority=priority)
+                job.priority = priority
+        jobs.append(job)
+    return jobs
+
+
+def claim_jobs(limit: int, node: str = '') -> list:
+    """Mark up to `limit` queued jobs as running on `node`, highest priority first, and return them."""
+    from django.utils import timezone
+    from flights.models import ScrapeJob
+
+    claimed = []
+    candidates = ScrapeJob.objects.filter(status=ScrapeJob.QUEUED).select_related('route')[:limit * 2]
+    for job in candidates:
+        if len(claimed) >= limit:
+            break
+        now = timezone.now()
+        # The conditional update makes the claim atomic between workers and nodes
+        if ScrapeJob.objects.filter(pk=job.pk, status=ScrapeJob.QUEUED).update(
+            status=ScrapeJob.RUNNING, started_at=now, node=node
+        ):
+            job.status, job.started_at, job.node = ScrapeJob.RUNNING, now, node
+            claimed.append(job)
+    return claimed
+
+
+def finish_job(job, error: str = '') -> None:
+    from django.utils import timezone
+    from flights.models import ScrapeJob
+
+    job.status = ScrapeJob.FAILED if error else ScrapeJob.DONE
+    job.finished_at = timezone.now()
+    job.error = error
+    job.save(update_fields=['status', 'finished_at', 'error'])
+
+
+def requeue_stale_jobs(lease_ttl: int) -> int:
+    """
+    Put back running jobs whose route has no live lease: the node that
+    claimed them crashed or stopped heartbeating.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from flights.models import ScrapeJob
+
+    now = timezone.now()
+    return ScrapeJob.objects.filter(
+        status=ScrapeJob.RUNNING, started_at__lt=now - timedelta(seconds=lease_ttl)
+    ).exclude(route__lease__expires_at__gt=now).update(status=ScrapeJob.QUEUED, started_at=None, node='')
+
 
+def drain_queue(vpn: bool, workers: int = 1, mode: str = 'thread', log=_push_log, node: str | None = None) -> int:
+    """
+    Scrape queued jobs until the queue is empty. Jobs are claimed in batches
+    of SCRAPER_QUEUE_BATCH, so a high-priority job waits at most one batch.
+
+    Several nodes (web servers, run_scraper on other machines) may drain the
+    same queue: each claimed route is also leased to `node`, and the lease is
+    kept alive by a heartbeat while the batch runs, so no route is scraped
+    twice and routes of a crashed node are queued again once their lease
+    expires. Returns the number of records saved.
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+    from flights.leases import acquire_leases, heartbeat, node_id, release_leases
+    from flights.models import ScrapeJob
+
+    node = node or node_id()
+    ttl = settings.SCRAPER_LEASE_TTL
+    saved = 0
+    while True:
+        requeue_stale_jobs(ttl)
+        jobs = claim_jobs(max(settings.SCRAPER_QUEUE_BATCH, workers), node)
+        if not jobs:
+            break
+
+        by_route = {}
+        for job in jobs:
+            if job.route.is_active:
+                by_route[job.route_id] = job
+            else:
+                finish_job(job, 'Route is inactive')
+        leased = acquire_leases([job.route for job in by_route.values()], node, ttl)
+        for route_id in set(by_route) - {route.pk for route in leased}:
+            finish_job(by_route.pop(route_id), 'Route is being scraped by another node')
+        if not by_route:
+            continue
+
+        def route_done(route, error):
+            finish_job(by_route[route.pk], error)
+            release_leases([route], node)
+
+        try:
+            with heartbeat(node, ttl):
+                saved += scrape_routes(
+                    leased, vpn=vpn, workers=workers, mode=mode, log=log, on_route_done=route_done,
+                )
+        finally:
+            # Jobs the scrape never reported back on (it raised) are failed, not left running
+            for job in by_route.values():
+                if job.status == ScrapeJob.RUNNING:
+                    finish_job(job, 'Scrape aborted')
+            release_leases(leased, node)
+
+    # Keep a day of history for the ETA estimate
+    ScrapeJob.objects.filter(
+        status__in=[ScrapeJob.DONE, ScrapeJob.FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=1),
+    ).delete()
+    return saved
+
+
+def queue_status(limit: int = 50) -> dict:
+    """Queued and running jobs with their position and ETA, for api_status."""
+    from django.conf import settings
+    from django.utils import timezone
+    from flights.models import ScrapeJob
+
+    recent = ScrapeJob.objects.filter(
+        status__in=[ScrapeJob.DONE, ScrapeJob.FAILED], started_at__isnull=False
+    ).order_by('-finished_at')[:50]
+    durations = [(job.finished_at - job.started_at).total_seconds() for job in recent]
+    avg = sum(durations) / len(durations) if durations else None
+    parallel = max(1, settings.SCRAPER_WORKERS)
+
+    now = timezone.now()
+    running = list(ScrapeJob.objects.filter(status=ScrapeJob.RUNNING).select_related('route'))
+    queued = ScrapeJob.objects.filter(status=ScrapeJob.QUEUED).select_related('route')
+    queued_count = queued.count()
+
+    jobs = []
+    for job in running:
+        elapsed = (now - job.started_at).total_seconds() if job.started_at else 0
+        jobs.append({
+            'id': job.pk,
+            'route': str(job.route),
+            'priority': job.priority,
+            'status': job.status,
+            'node': job.node,
+            'position': 0,
+            'progress': round(min(elapsed / avg, 0.99), 2) if avg else None,
+            'eta_seconds': round(max(avg - elapsed, 0)) if avg else None,
+        })
+    for position, job in enumerate(queued[:limit], start=1):
+        # Jobs ahead of this one are worked off `parallel` at a time
+        ahead = len(running) + position - 1
+        jobs.append({
+            'id': job.pk,
+            'route': str(job.route),
+            'priority': job.priority,
+            'status': job.status,
+            'node': '',
+            'position': position,
+            'progress': 0,
+            'eta_seconds': round((ahead // parallel + 1) * avg) if avg else None,
+        })
+
+    total_ahead = len(running) + queued_count
+    return {
+        'queued': queued_count,
+        'running': len(running),
+        'avg_job_seconds': round(avg, 1) if avg else None,
+        'eta_seconds': round(-(-total_ahead // parallel) * avg) if avg else None,
+        'jobs': jobs,
+    }
+
+
+def _run_queue() -> None:
+    """
+    Drain the scrape queue, then stop; jobs queued meanwhile are picked up
+    before the dispatcher exits. This function is meant to be called from a thread.
+    """
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webapp.settings')
+    django.setup()
+
+    from django.conf import settings
+    from flights.models import ScrapeJob
+
+    clear_logs()
+    workers = settings.SCRAPER_WORKERS
+    _push_log(f"🚀 Scraper started {'(VPN ON)' if _use_vpn else '(VPN OFF)'} with {workers} worker(s)")
+
+    try:
+        while True:
+            drain_queue(vpn=_use_vpn, workers=workers, mode=settings.SCRAPER_WORKER_MODE)
+            with _dispatch_lock:
+                if not ScrapeJob.objects.filter(status=ScrapeJob.QUEUED).exists():
+                    _scraper_running.clear()
+                    break
     except Exception as e:
         _push_log(f"💥 Scraper error: {e}")
+        _scraper_running.clear()
     finally:
         _push_log("✔️  Scrape completed.")
-        _scraper_running.clear()
+
+
+def _start_dispatcher() -> None:
+    global _scraper_thread
+    with _dispatch_lock:
+        if _scraper_running.is_set():
+            return
+        # Set the flag early to prevent race conditions before thread wakes up
+        _scraper_running.set()
+        _scraper_thread = threading.Thread(target=_run_queue, daemon=True)
+        _scraper_thread.start()
 
 
 def trigger_scrape(route_pks: list[int] | None = None) -> bool:
     """
-    Fire a one-shot scrape in a daemon thread.
-    Returns False if a scrape is already in progress.
+    Queue a scrape and make sure the dispatcher is draining the queue.
+    Specific routes (e.g. one just added) are queued ahead of a full sweep
+    of the active routes. Returns False if there was nothing to queue.
     """
-    global _scraper_thread
-    if _scraper_running.is_set():
-        _push_log("⏳ Scrape already in progress, request ignored.")
+    from flights.models import Route, ScrapeJob
+    from flights.scheduling import deactivate_departed
+
+    deactivate_departed()
+    if route_pks:
+        routes = Route.objects.filter(pk__in=route_pks, is_active=True)
+        priority = ScrapeJob.PRIORITY_USER
+    else:
+        routes = Route.objects.filter(is_active=True)
+        priority = ScrapeJob.PRIORITY_SWEEP
+
+    if not routes.exists():
+        _push_log("⚠️  No active routes to scrape.")
         return False
 
-    # Set the flag early to prevent race conditions before thread wakes up
-    _scraper_running.set()
-
-    _scraper_thread = threading.Thread(
-        target=_run_scrape,
-        args=(route_pks,),
-        daemon=True,
-    )
-    _scraper_thread.start()
+    jobs = enqueue_routes(routes, priority)
+    if _scraper_running.is_set():
+        _push_log(f"📋 Queued {len(jobs)} route(s) behind the running scrape.")
+    _start_dispatcher()
     return True
 
 
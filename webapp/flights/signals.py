@@ -0,0 +1,54 @@
+"""
+Keep RouteStats in step with PriceRecord writes that bypass ResultBuffer
+(admin, shell, scripts, compact_prices), in the transaction of the write:
+PriceRecord.save runs in an atomic block, and deletes always do.
+bulk_create and update() send no signals: ResultBuffer updates the stats of
+its writes itself (see flights.storage.update_route_stats), and
+`manage.py rebuild_route_stats` repairs stats after raw SQL or update().
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from flights.models import PriceRecord, Route
+
+_local = threading.local()
+
+
+@contextmanager
+def stats_rebuilt_by_caller():
+    """Within the block, PriceRecord writes of this thread leave RouteStats to the caller."""
+    depth = getattr(_local, 'deferred', 0)
+    _local.deferred = depth + 1
+    try:
+        yield
+    finally:
+        _local.deferred = depth
+
+
+def _rebuild(route_id):
+    from flights.storage import rebuild_route_stats
+
+    if not getattr(_local, 'deferred', 0):
+        rebuild_route_stats([route_id])
+
+
+@receiver(post_save, sender=PriceRecord)
+def price_record_saved(sender, instance, **kwargs):
+    _rebuild(instance.route_id)
+
+
+@receiver(post_delete, sender=PriceRecord)
+def price_record_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the route takes its stats along
+    if isinstance(origin, Route) or getattr(origin, 'model', None) is Route:
+        return
+    # A delete removes all its rows before signalling them: rebuild each route once
+    done = getattr(_local, 'deleting', None)
+    if done is None or done[0] is not origin:
+        done = _local.deleting = (origin, set())
+    if instance.route_id not in done[1]:
+        done[1].add(instance.route_id)
+        _rebuild(instance.route_id)
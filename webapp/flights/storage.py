@@ -0,0 +1,168 @@
+"""
+Change-only price storage: a PriceRecord stands for a run of identical
+observations of a route's price, from first_seen to last_seen.
+"""
+from decimal import Decimal
+
+CENT = Decimal('0.01')
+
+
+def to_amount(value) -> Decimal:
+    """A scraped price as stored in PriceRecord.amount."""
+    return Decimal(str(value)).quantize(CENT)
+
+
+def latest_records(route_ids) -> dict:
+    """The most recent PriceRecord of each route, by route id."""
+    from django.db.models import OuterRef, Subquery
+    from flights.models import PriceRecord, Route
+
+    newest = PriceRecord.objects.filter(route=OuterRef('pk')).order_by('-first_seen', '-pk').values('pk')[:1]
+    ids = Route.objects.filter(pk__in=route_ids).annotate(latest=Subquery(newest)).values_list('latest', flat=True)
+    return {
+        record.route_id: record
+        for record in PriceRecord.objects.filter(pk__in=[pk for pk in ids if pk])
+    }
+
+
+def merge_observations(records, now) -> tuple[list, list]:
+    """
+    Fold new, unsaved records into their route's latest run when the price
+    did not change. Returns (records to insert, existing records to update).
+    """
+    created, extended = [], []
+    latest = latest_records({record.route_id for record in records})
+    for record in records:
+        record.first_seen = record.last_seen = now
+        previous = latest.get(record.route_id)
+        if previous and previous.amount == record.amount and previous.currency == record.currency:
+            previous.last_seen = now
+            previous.observations += 1
+            if previous.pk and previous not in extended:
+                extended.append(previous)
+        else:
+            created.append(record)
+            latest[record.route_id] = record
+    return created, extended
+
+
+def compact_price_records(route_ids=None) -> tuple[int, int]:
+    """
+    Fold consecutive records of the same route with the same price into one
+    run. Returns (runs kept, rows deleted).
+    """
+    from django.db import transaction
+    from flights.models import PriceRecord
+    from flights.signals import stats_rebuilt_by_caller
+
+    if route_ids is None:
+        route_ids = PriceRecord.objects.order_by().values_list('route_id', flat=True).distinct()
+
+    kept = deleted = 0
+    for route_id in list(route_ids):
+        runs, doomed = [], []
+        rows = PriceRecord.objects.filter(route_id=route_id).order_by('first_seen', 'pk').values(
+            'pk', 'amount', 'currency', 'first_seen', 'last_seen', 'observations'
+        )
+        for row in rows.iterator():
+            run = runs[-1] if runs else None
+            if run and run['amount'] == row['amount'] and run['currency'] == row['currency']:
+                run['last_seen'] = max(run['last_seen'], row['last_seen'])
+                run['observations'] += row['observations']
+                run['changed'] = True
+                doomed.append(row['pk'])
+            else:
+                runs.append(dict(row, changed=False))
+
+        with transaction.atomic(), stats_rebuilt_by_caller():
+            for run in runs:
+                if run['changed']:
+                    PriceRecord.objects.filter(pk=run['pk']).update(
+                        last_seen=run['last_seen'], observations=run['observations']
+                    )
+            for start in range(0, len(doomed), 500):
+                PriceRecord.objects.filter(pk__in=doomed[start:start + 500]).delete()
+            if doomed:
+                # The chart changed: bump the route's version once, with the records
+                rebuild_route_stats([route_id])
+        kept += len(runs)
+        deleted += len(doomed)
+    return kept, deleted
+
+
+def update_route_stats(samples, now) -> None:
+    """
+    Fold freshly scraped (route, amount, currency) samples into RouteStats.
+    Call it inside the transaction that writes their records.
+    """
+    from flights.models import RouteStats
+
+    stats = {s.route_id: s for s in RouteStats.objects.filter(route_id__in={route.pk for route, _, _ in samples})}
+    created, updated = [], []
+    for route, amount, currency in samples:
+        entry = stats.get(route.pk)
+        if entry is None:
+            entry = stats[route.pk] = RouteStats(
+                route=route, currency=currency, latest_amount=amount, latest_seen=now,
+                min_amount=amount, max_amount=amount, record_count=0, last_change_at=now,
+            )
+            created.append(entry)
+        elif entry not in updated and entry not in created:
+            updated.append(entry)
+        if entry.latest_amount != amount or entry.currency != currency:
+            entry.last_change_at = now
+        entry.latest_amount, entry.currency, entry.latest_seen = amount, currency, now
+        entry.min_amount = min(entry.min_amount, amount)
+        entry.max_amount = max(entry.max_amount, amount)
+        entry.record_count += 1
+        entry.updated_at = now
+    RouteStats.objects.bulk_create(created)
+    RouteStats.objects.bulk_update(updated, [
+        'currency', 'latest_amount', 'latest_seen', 'min_amount', 'max_amount', 'record_count', 'last_change_at',
+        'updated_at',
+    ])
+
+
+def rebuild_route_stats(route_ids=None) -> int:
+    """
+    Recompute RouteStats from the full price history. Returns the number
+    of routes with stats.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from flights.models import PriceRecord, RouteStats
+
+    now = timezone.now()
+    if route_ids is None:
+        route_ids = PriceRecord.objects.order_by().values_list('route_id', flat=True).distinct()
+        stale = RouteStats.objects.all()
+    else:
+        stale = RouteStats.objects.filter(route_id__in=route_ids)
+
+    rebuilt = []
+    for route_id in list(route_ids):
+        entry = None
+        rows = PriceRecord.objects.filter(route_id=route_id).order_by('first_seen', 'pk').values(
+            'amount', 'currency', 'first_seen', 'last_seen', 'observations'
+        )
+        for row in rows.iterator():
+            if entry is None:
+                entry = RouteStats(
+                    route_id=route_id, currency=row['currency'], latest_amount=row['amount'],
+                    min_amount=row['amount'], max_amount=row['amount'], record_count=0,
+                    last_change_at=row['first_seen'], updated_at=now,
+                )
+            elif entry.latest_amount != row['amount'] or entry.currency != row['currency']:
+                entry.last_change_at = row['first_seen']
+            entry.latest_amount, entry.currency, entry.latest_seen = row['amount'], row['currency'], row['last_seen']
+            entry.min_amount = min(entry.min_amount, row['amount'])
+            entry.max_amount = max(entry.max_amount, row['amount'])
+            entry.record_count += row['observations']
+        if entry is not None:
+            rebuilt.append(entry)
+
+    with transaction.atomic():
+        stale.delete()
+        RouteStats.objects.bulk_create(rebuilt, batch_size=500)
+    return len(rebuilt)
+
@@ -1,3 +1,2221 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from io import StringIO
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib import request as urllib_request
+from urllib.parse import urlparse, parse_qs
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from flights import scraper_service  # noqa: F401 - puts telegram_bot on sys.path
+import AvailabilityCapture
+import BrowserProfile
+import CarouselExtractor
+from ConsentStore import ConsentStore
+from LatencyTracker import LatencyTracker, latency_tracker
+from FlightSearcher import FlightSearcher, SearchCancelled, backoff_delay
+from HttpBackend import HttpBackend
+from VpnSession import VpnSession
+from DriverPool import DriverPool, PooledDriver
+from SeleniumBackend import SeleniumBackend
+from ProxyPool import ProxyPool, NoProxyAvailable, BLOCKED as PROXY_BLOCKED
+from RateLimiter import RateLimiter
+from FareCache import FareCache
+from SearchBackend import BackendBlocked, SearchBackend, LookupFailure, with_no_flights, NO_FLIGHT, BLOCKED, TIMEOUT
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+TESTDATA = Path(__file__).resolve().parent / 'testdata'
+# Rate limiter state of the test searchers, kept out of the real rate_limit.sqlite3
+SCRATCH = tempfile.TemporaryDirectory()
+
+
+def load_testdata(name):
+    with open(TESTDATA / name, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def scratch_limiter(**kwargs):
+    """A RateLimiter on a state file of its own."""
+    path = tempfile.NamedTemporaryFile(dir=SCRATCH.name, suffix='.sqlite3', delete=False).name
+    return RateLimiter(path, **kwargs)
+
+
+def make_searcher(vpn=False, **kwargs):
+    """A FlightSearcher without rate limit or fare cache, so tests don't share state."""
+    kwargs.setdefault('rate_limiter', scratch_limiter(rate_per_minute=0))
+    kwargs.setdefault('fare_cache', FareCache(ttl=0))
+    return FlightSearcher(vpn=vpn, **kwargs)
+
+
+class FakeNetworkDriver:
+    """Replays a recorded performance log and response body like a Chrome driver would."""
+
+    def __init__(self, log_entries, bodies):
+        self.log_entries = list(log_entries)
+        self.bodies = bodies
+
+    def get_log(self, log_type):
+        # Hand the log out in two halves to mimic entries arriving over time
+        half = max(1, len(self.log_entries) // 2)
+        chunk, self.log_entries = self.log_entries[:half], self.log_entries[half:]
+        return chunk
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {'body': json.dumps(self.bodies[params['requestId']]), 'base64Encoded': False}
+
+
+class FakeChrome:
+    """Stands in for a pooled Chrome driver. Results pages raise `fail_with` when it is set."""
+
+    def __init__(self, fail_with=None):
+        self.fail_with = fail_with
+        self.visited = []
+        self.alive = True
+        self.quit_called = False
+        self.page_load_timeout = 300
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise WebDriverException('chrome not reachable')
+        return self.visited[-1] if self.visited else 'about:blank'
+
+    @property
+    def pages(self):
+        return [url for url in self.visited if url != 'about:blank']
+
+    def get(self, url):
+        self.current_url
+        self.visited.append(url)
+        if self.fail_with and url != 'about:blank':
+            raise self.fail_with
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def execute_script(self, script, *args):
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def delete_all_cookies(self):
+        pass
+
+    def get_log(self, log_type):
+        return []
+
+    def quit(self):
+        self.quit_called = True
+
+
+def fake_driver_pool(drivers, **kwargs):
+    """A DriverPool that starts the given FakeChrome drivers, in order, instead of Chrome."""
+    drivers = list(drivers)
+    pool = DriverPool(lean=False, max_rss_mb=0, **kwargs)
+    pool._create = lambda: PooledDriver(drivers.pop(0), 0, pool.proxy_pool.assign() if pool.proxy_pool else None)
+    return pool
+
+
+class AvailabilityCaptureTests(SimpleTestCase):
+    def test_parse_availability_returns_every_flight_per_date(self):
+        fares = AvailabilityCapture.parse_availability(load_testdata('availability_BGY_KRK.json'))
+
+        self.assertEqual(sorted(fares), ['2026-04-29', '2026-04-30', '2026-05-01', '2026-05-02'])
+        self.assertEqual(fares['2026-04-29'], [])
+        self.assertEqual(fares['2026-04-30'], [], 'sold-out flights are dropped')
+        self.assertEqual([f['flight_number'] for f in fares['2026-05-01']], ['FR 1234', 'FR 5678'])
+        self.assertEqual(fares['2026-05-01'][0]['departure'], '2026-05-01T06:30:00.000')
+        self.assertEqual(fares['2026-05-01'][0]['currency'], 'EUR')
+
+    def test_fares_by_date_keeps_cheapest_flight(self):
+        prices = AvailabilityCapture.fares_by_date(load_testdata('availability_BGY_KRK.json'))
+
+        self.assertEqual(sorted(prices), ['2026-05-01', '2026-05-02'])
+        self.assertEqual(prices['2026-05-01']['amount'], 19.5)
+        self.assertEqual(prices['2026-05-01']['currency'], 'EUR')
+        self.assertEqual(len(prices['2026-05-01']['flights']), 2)
+
+    def test_only_finished_availability_requests_are_reported(self):
+        entries = load_testdata('performance_log_availability.json')
+        pending = set()
+
+        self.assertEqual(AvailabilityCapture.finished_availability_requests(entries[:5], pending), [])
+        self.assertEqual(pending, {'1000.12'})
+        self.assertEqual(AvailabilityCapture.finished_availability_requests(entries[5:], pending), ['1000.12'])
+        self.assertEqual(pending, set())
+
+    def test_wait_for_availability_replays_recorded_response(self):
+        payload = load_testdata('availability_BGY_KRK.json')
+        driver = FakeNetworkDriver(load_testdata('performance_log_availability.json'), {'1000.12': payload})
+
+        self.assertEqual(AvailabilityCapture.wait_for_availability(driver, timeout=1, poll_interval=0), payload)
+
+    def test_wait_for_availability_times_out_without_response(self):
+        driver = FakeNetworkDriver([], {})
+
+        self.assertIsNone(AvailabilityCapture.wait_for_availability(driver, timeout=0.05, poll_interval=0.01))
+
+
+class BrowserProfileTests(SimpleTestCase):
+    def test_page_traffic_counts_bytes_and_blocked_requests(self):
+        entries = load_testdata('performance_log_availability.json') + [
+            {'message': json.dumps({'message': {
+                'method': 'Network.loadingFailed',
+                'params': {'requestId': '1000.20', 'blockedReason': 'inspector'},
+            }})},
+        ]
+        self.assertEqual(BrowserProfile.page_traffic(entries), (482311 + 3890, 2, 1))
+
+    def test_lean_pages_report_savings_against_calibrated_baseline(self):
+        stats = BrowserProfile.PageStats(calibrate_every=2)
+        self.assertTrue(stats.needs_calibration())
+
+        stats.record('full', 2048 * 1024, 3.0, 0)
+        line = stats.record('lean', 512 * 1024, 1.0, 40)
+
+        self.assertIn('saved ~1536 KB, 2.00s', line)
+        self.assertFalse(stats.needs_calibration())
+        stats.record('lean', 512 * 1024, 1.0, 40)
+        self.assertTrue(stats.needs_calibration())
+
+
+class CookieRecordingDriver:
+    def __init__(self):
+        self.cdp_calls = []
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.cdp_calls.append((cmd, params))
+        return {}
+
+
+class ConsentStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'consent.json'
+
+    def test_captures_only_cookies_set_by_the_consent_click(self):
+        store = ConsentStore(self.path)
+        before = [{'name': 'session', 'value': 'abc', 'domain': '.ryanair.com'}]
+        after = before + [{
+            'name': 'RY_COOKIE_CONSENT', 'value': 'true', 'domain': '.ryanair.com',
+            'path': '/', 'secure': True, 'expiry': int(time.time()) + 3600,
+        }]
+
+        store.capture(before, after)
+
+        self.assertEqual([c['name'] for c in ConsentStore(self.path).load()], ['RY_COOKIE_CONSENT'])
+
+    def test_seed_sets_stored_cookies_over_cdp(self):
+        store = ConsentStore(self.path)
+        driver = CookieRecordingDriver()
+        self.assertFalse(store.seed(driver))
+
+        expiry = int(time.time()) + 3600
+        store.save([{'name': 'RY_COOKIE_CONSENT', 'value': 'true', 'domain': '.ryanair.com', 'expiry': expiry}])
+
+        self.assertTrue(store.seed(driver))
+        cmd, params = driver.cdp_calls[0]
+        self.assertEqual(cmd, 'Network.setCookies')
+        self.assertEqual(params['cookies'][0]['name'], 'RY_COOKIE_CONSENT')
+        self.assertEqual(params['cookies'][0]['expires'], expiry)
+
+    def test_expired_consent_is_not_seeded(self):
+        store = ConsentStore(self.path)
+        store.save([{'name': 'RY_COOKIE_CONSENT', 'value': 'true', 'expiry': int(time.time()) - 1}])
+
+        self.assertFalse(store.seed(CookieRecordingDriver()))
+
+
+class LatencyTrackerTests(SimpleTestCase):
+    def test_default_timeout_until_enough_samples(self):
+        tracker = LatencyTracker(default=5, minimum=1, maximum=30, pct=95, factor=2)
+        tracker.record('Italy', {'fare_card': 0.5})
+
+        self.assertEqual(tracker.timeout('Italy', 'fare_card'), 5)
+
+    def test_timeout_follows_percentile_of_each_egress(self):
+        tracker = LatencyTracker(default=5, minimum=1, maximum=30, pct=95, factor=2)
+        for seconds in range(1, 21):
+            tracker.record('Italy', {'fare_card': seconds / 10})
+            tracker.record('Spain', {'fare_card': seconds})
+
+        self.assertAlmostEqual(tracker.timeout('Italy', 'fare_card'), 1.9 * 2)
+        self.assertEqual(tracker.timeout('Spain', 'fare_card'), 30, 'clamped to the maximum')
+        self.assertEqual(tracker.timeout('Germany', 'fare_card'), 5)
+
+    def test_snapshot_exposes_percentiles_and_timeouts(self):
+        tracker = LatencyTracker(default=5, minimum=1, maximum=30, pct=95, factor=2)
+        tracker.record('direct', {'navigation': 1.0, 'fare_card': 2.0})
+        tracker.record_timeout('direct', 'fare_card')
+
+        snapshot = tracker.snapshot()
+        self.assertEqual(snapshot['direct']['navigation']['p50'], 1.0)
+        self.assertEqual(snapshot['direct']['fare_card']['timeouts'], 1)
+
+    def test_metrics_endpoint(self):
+        latency_tracker.record('direct', {'navigation': 1.0})
+
+        data = self.client.get(reverse('api_metrics')).json()
+        self.assertIn('navigation', data['latency']['direct'])
+        self.assertIn('driver_pool', data)
+
+
+class MockFareServer:
+    """
+    Local stand-in for the Ryanair availability API.
+
+    Serves the recorded availability response, or a block answer when
+    `blocked` is set to an HTTP status (or 'html' for a challenge page).
+    Every request is recorded with the client port, to check keep-alive.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.blocked = None
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                server.requests.append({
+                    'path': url.path,
+                    'query': {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()},
+                    'client_port': self.client_address[1],
+                })
+                if server.blocked == 'html':
+                    self._reply(200, b'<html><body>Access denied</body></html>', 'text/html')
+                elif server.blocked:
+                    self._reply(server.blocked, b'{}', 'application/json')
+                else:
+                    self._reply(200, json.dumps(server.payload).encode(), 'application/json')
+
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ProxyStandIn(MockFareServer):
+    """
+    Local stand-in for a forward proxy: relays absolute-URI GETs to their
+    target, or answers 403 itself when `blocked` is set.
+    """
+
+    def __init__(self):
+        super().__init__(payload=None)
+        server = self
+        direct = urllib_request.build_opener(urllib_request.ProxyHandler({}))
+
+        def do_GET(handler):
+            server.requests.append({'path': handler.path})
+            if server.blocked:
+                handler._reply(403, b'Forbidden', 'text/plain')
+                return
+            with direct.open(handler.path) as upstream:
+                handler._reply(upstream.status, upstream.read(), upstream.headers['Content-Type'])
+
+        self.httpd.RequestHandlerClass.do_GET = do_GET
+
+
+class StubBackend(SearchBackend):
+    name = 'stub'
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def get_prices(self, origin, destination, date):
+        self.calls.append((origin, destination, date))
+        return self.prices
+
+
+class HttpBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.server = MockFareServer(load_testdata('availability_BGY_KRK.json')).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.backend = HttpBackend(base_url=self.server.url, locale='it-it', timeout=5, pool_size=2, flex_days=2)
+        self.addCleanup(self.backend.close)
+
+    def test_http_blocks_pause_only_http_lookups(self):
+        limiter = scratch_limiter(rate_per_minute=0, threshold=2, pause=60)
+        backend = HttpBackend(base_url=self.server.url, timeout=5, rate_limiter=limiter)
+        self.addCleanup(backend.close)
+        self.server.blocked = 403
+
+        for _ in range(2):
+            with self.assertRaises(BackendBlocked):
+                backend.get_prices('BGY', 'KRK', '2026-05-01')
+        self.assertEqual(limiter.paused(), {'http:direct'})
+
+        # While paused, HTTP gives way to the browser without a request or a wait
+        started = time.monotonic()
+        with self.assertRaises(BackendBlocked):
+            backend.get_prices('BGY', 'KRK', '2026-05-01')
+        self.assertEqual(len(self.server.requests), 2)
+        # Browser lookups on the same exit are not paused
+        self.assertTrue(limiter.acquire('direct'))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_fetches_structured_fares_from_availability_endpoint(self):
+        prices = self.backend.get_prices('BGY', 'KRK', '2026-05-01')
+
+        self.assertEqual(prices['2026-05-01']['amount'], 19.5)
+        self.assertEqual(prices['2026-05-02']['amount'], 34.0)
+        request = self.server.requests[0]
+        self.assertEqual(request['path'], '/api/booking/v4/it-it/availability')
+        self.assertEqual(request['query']['Origin'], 'BGY')
+        self.assertEqual(request['query']['DateOut'], '2026-05-01')
+        self.assertEqual(request['query']['FlexDaysOut'], '2')
+
+    def test_reuses_the_connection_between_lookups(self):
+        self.backend.get_prices('BGY', 'KRK', '2026-05-01')
+        self.backend.get_prices('BGY', 'KRK', '2026-05-02')
+
+        ports = {r['client_port'] for r in self.server.requests}
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(len(ports), 1)
+
+    def test_block_answers_raise_backend_blocked(self):
+        for blocked in (403, 429, 'html'):
+            self.server.blocked = blocked
+            with self.assertRaises(BackendBlocked):
+                self.backend.get_prices('BGY', 'KRK', '2026-05-01')
+
+    def test_unknown_route_is_a_definitive_no_flight(self):
+        self.server.blocked = 404
+        self.assertEqual(self.backend.get_prices('BGY', 'XXX', '2026-05-01'), LookupFailure(NO_FLIGHT))
+
+    def test_searcher_falls_back_to_selenium_only_when_blocked(self):
+        searcher = make_searcher(backend='http')
+        searcher.http_backend = self.backend
+        searcher.selenium_backend = StubBackend({'2026-05-01': {'currency': '€', 'amount': 21.0, 'date': '2026-05-01'}})
+
+        flights = searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=1)
+        self.assertEqual(flights['BGY-KRK on 2026-05-01']['amount'], 19.5)
+        self.assertEqual(searcher.selenium_backend.calls, [])
+
+        self.server.blocked = 403
+        flights = searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=1)
+        self.assertEqual(flights['BGY-KRK on 2026-05-01']['amount'], 21.0)
+        self.assertEqual(searcher.selenium_backend.calls, [('BGY', 'KRK', '2026-05-01')])
+
+
+class DriverPoolTests(SimpleTestCase):
+    def test_drivers_are_reused_between_lookups(self):
+        first, second = FakeChrome(), FakeChrome()
+        pool = fake_driver_pool([first, second], size=2, max_pages=0)
+
+        for _ in range(3):
+            with pool.driver() as driver:
+                self.assertIs(driver, first)
+        self.assertEqual(pool.stats(), {'size': 2, 'idle': 1, 'in_use': 0})
+        # Reset between lookups: back on a blank page
+        self.assertEqual(first.current_url, 'about:blank')
+
+    def test_driver_is_recycled_after_max_pages(self):
+        first, second = FakeChrome(), FakeChrome()
+        pool = fake_driver_pool([first, second], size=1, max_pages=2)
+
+        used = []
+        for _ in range(3):
+            with pool.driver() as driver:
+                used.append(driver)
+        self.assertEqual(used, [first, first, second])
+        self.assertTrue(first.quit_called)
+
+    def test_driver_failing_its_health_check_is_replaced(self):
+        first, second = FakeChrome(), FakeChrome()
+        pool = fake_driver_pool([first, second], size=1)
+        with pool.driver():
+            pass
+        first.alive = False
+
+        with pool.driver() as driver:
+            self.assertIs(driver, second)
+        self.assertTrue(first.quit_called)
+
+    def test_acquire_gives_up_after_its_timeout(self):
+        pool = fake_driver_pool([FakeChrome()], size=1)
+        with pool.driver():
+            started = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                pool.acquire(timeout=0.1)
+            self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_browser_that_raised_is_discarded_but_a_slow_page_is_not(self):
+        first, second = FakeChrome(), FakeChrome()
+        pool = fake_driver_pool([first, second], size=1)
+
+        with self.assertRaises(TimeoutException), pool.driver():
+            raise TimeoutException('page load timed out')
+        with self.assertRaises(WebDriverException), pool.driver() as driver:
+            self.assertIs(driver, first)
+            raise WebDriverException('chrome not reachable')
+
+        self.assertTrue(first.quit_called)
+        with pool.driver() as driver:
+            self.assertIs(driver, second)
+
+
+class ProxyPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.fares = MockFareServer(load_testdata('availability_BGY_KRK.json')).__enter__()
+        self.addCleanup(self.fares.__exit__)
+        self.proxies = []
+        for _ in range(2):
+            proxy = ProxyStandIn().__enter__()
+            self.addCleanup(proxy.__exit__)
+            self.proxies.append(proxy)
+        self.pool = ProxyPool([p.url for p in self.proxies], rate_per_minute=10, block_cooldown=60)
+        self.backend = HttpBackend(base_url=self.fares.url, timeout=5, proxy_pool=self.pool)
+        self.addCleanup(self.backend.close)
+
+    def test_requests_rotate_over_the_proxies(self):
+        self.backend.get_prices('BGY', 'KRK', '2026-05-01')
+        self.backend.get_prices('BGY', 'KRK', '2026-05-02')
+
+        self.assertEqual([len(p.requests) for p in self.proxies], [1, 1])
+        self.assertEqual(len(self.fares.requests), 2)
+
+    def test_blocked_proxy_is_swapped_and_cools_down(self):
+        self.proxies[0].blocked = True
+
+        for date in ('2026-05-01', '2026-05-02'):
+            prices = self.backend.get_prices('BGY', 'KRK', date)
+            self.assertEqual(prices['2026-05-01']['amount'], 19.5)
+
+        self.assertEqual([len(p.requests) for p in self.proxies], [1, 2])
+        stats = self.pool.stats()
+        self.assertTrue(stats[self.pool.proxies[0].name]['cooling'])
+        self.assertEqual(stats[self.pool.proxies[0].name]['blocks'], 1)
+
+    def test_rate_limit_and_breaker_are_kept_per_proxy(self):
+        limiter = scratch_limiter(rate_per_minute=0, threshold=1, pause=60)
+        pool = ProxyPool([p.url for p in self.proxies], rate_per_minute=10, block_cooldown=0)
+        backend = HttpBackend(base_url=self.fares.url, timeout=5, proxy_pool=pool, rate_limiter=limiter)
+        self.addCleanup(backend.close)
+        self.proxies[0].blocked = True
+
+        for date in ('2026-05-01', '2026-05-02'):
+            self.assertEqual(backend.get_prices('BGY', 'KRK', date)['2026-05-01']['amount'], 19.5)
+
+        # The block paused only the proxy that served it; the other one kept scraping
+        first, second = (f"http:{proxy.name}" for proxy in pool.proxies)
+        self.assertEqual(limiter.paused(), {first})
+        self.assertEqual(limiter.snapshot()[second]['paused_for'], 0)
+        self.assertEqual([len(p.requests) for p in self.proxies], [1, 2])
+
+    def test_every_proxy_blocked_raises_backend_blocked(self):
+        for proxy in self.proxies:
+            proxy.blocked = True
+        with self.assertRaises(BackendBlocked):
+            self.backend.get_prices('BGY', 'KRK', '2026-05-01')
+
+    def test_rate_limit_waits_then_gives_up(self):
+        pool = ProxyPool(['127.0.0.1:3128'], rate_per_minute=2, max_wait=0.1)
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(NoProxyAvailable):
+            pool.acquire()
+
+    def test_browsers_are_bound_to_different_proxies(self):
+        drivers = DriverPool(proxy_pool=self.pool)
+        first, second = self.pool.assign(), self.pool.assign()
+
+        self.assertNotEqual(first, second)
+        options = drivers._build_options(9222, first)
+        self.assertIn(f"--proxy-server={first.name}", options.arguments)
+
+
+class ScriptedBackend(SearchBackend):
+    """Answers each date with the next of its scripted get_prices results."""
+
+    name = 'scripted'
+
+    def __init__(self, answers):
+        self.answers = {date: list(results) for date, results in answers.items()}
+        self.calls = []
+
+    def get_prices(self, origin, destination, date):
+        self.calls.append(date)
+        return self.answers[date].pop(0)
+
+
+@mock.patch('FlightSearcher.backoff_delay', return_value=0)
+class RetryPolicyTests(SimpleTestCase):
+    def price(self, date, amount):
+        return {date: {'currency': '€', 'amount': amount, 'date': date}}
+
+    def test_only_retryable_failures_are_retried(self, backoff):
+        searcher = make_searcher()
+        searcher.selenium_backend = ScriptedBackend({
+            '2026-05-01': [self.price('2026-05-01', 19.5)],
+            '2026-05-02': [LookupFailure(TIMEOUT), LookupFailure(BLOCKED), self.price('2026-05-02', 25.0)],
+            '2026-05-03': [{'2026-05-03': LookupFailure(NO_FLIGHT)}],
+        })
+
+        flights = searcher.search_flights_with_retry(
+            'BGY', 'KRK', ['2026-05-01', '2026-05-02', '2026-05-03'], max_retries=3
+        )
+
+        self.assertEqual(sorted(flights), ['BGY-KRK on 2026-05-01', 'BGY-KRK on 2026-05-02'])
+        self.assertEqual(
+            searcher.selenium_backend.calls,
+            ['2026-05-01', '2026-05-02', '2026-05-03', '2026-05-02', '2026-05-02'],
+        )
+        self.assertEqual(searcher.last_failures, {'BGY-KRK on 2026-05-03': LookupFailure(NO_FLIGHT)})
+        self.assertEqual(backoff.call_count, 2)
+
+    def test_no_flight_answers_are_never_retried(self, backoff):
+        searcher = make_searcher()
+        searcher.selenium_backend = ScriptedBackend({'2026-05-01': [LookupFailure(NO_FLIGHT)]})
+
+        self.assertEqual(searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=3), {})
+        self.assertEqual(searcher.selenium_backend.calls, ['2026-05-01'])
+        backoff.assert_not_called()
+
+    def test_cancel_aborts_the_search_during_backoff(self, backoff):
+        backoff.return_value = 30
+        searcher = make_searcher()
+        searcher.selenium_backend = ScriptedBackend({'2026-05-01': [LookupFailure(TIMEOUT)] * 3})
+        threading.Timer(0.1, searcher.cancel).start()
+
+        started = time.monotonic()
+        with self.assertRaises(SearchCancelled):
+            searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=3)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(searcher.selenium_backend.calls, ['2026-05-01'])
+
+    def test_backoff_grows_exponentially_within_jitter_and_cap(self, backoff):
+        for attempt in range(8):
+            delay = backoff_delay(attempt, base=2, cap=60)
+            self.assertGreaterEqual(delay, min(60, 2 * 2 ** attempt * 0.5))
+            self.assertLessEqual(delay, min(60, 2 * 2 ** attempt * 1.5))
+
+
+class FareCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'fares.sqlite3'
+
+    def price(self, date, amount=19.5):
+        return {'currency': '€', 'amount': amount, 'date': date}
+
+    def test_harvested_dates_are_served_from_the_cache(self):
+        backend = StubBackend({
+            '2026-05-01': self.price('2026-05-01'),
+            '2026-05-02': LookupFailure(NO_FLIGHT),
+            '2026-05-03': LookupFailure(TIMEOUT),
+        })
+        searcher = make_searcher(fare_cache=FareCache(self.path, ttl=60))
+        searcher.selenium_backend = backend
+
+        searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=1)
+        other = make_searcher(fare_cache=FareCache(self.path, ttl=60))
+        other.selenium_backend = backend
+        flights = other.search_flights_with_retry('BGY', 'KRK', ['2026-05-01', '2026-05-02'], max_retries=1)
+
+        self.assertEqual(flights, {'BGY-KRK on 2026-05-01': self.price('2026-05-01')})
+        self.assertEqual(backend.calls, [('BGY', 'KRK', '2026-05-01')])
+        self.assertIsNone(FareCache(self.path, ttl=60).get('BGY', 'KRK', '2026-05-03'))
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = FareCache(self.path, ttl=0.1)
+        cache.put('BGY', 'KRK', {'2026-05-01': self.price('2026-05-01')})
+        self.assertEqual(cache.get('BGY', 'KRK', '2026-05-01'), self.price('2026-05-01'))
+        self.assertIsNone(cache.get('BGY', 'KRK', '2026-05-01', pax=2))
+        time.sleep(0.15)
+        self.assertIsNone(cache.get('BGY', 'KRK', '2026-05-01'))
+
+    def test_concurrent_lookups_of_a_key_run_once(self):
+        cache = FareCache(self.path, ttl=60)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'2026-05-01': self.price('2026-05-01')}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.fetch('BGY', 'KRK', '2026-05-01', loader)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'2026-05-01': self.price('2026-05-01')}] * 5)
+
+    def test_lookup_claimed_by_another_process_is_waited_for(self):
+        this, other = FareCache(self.path, ttl=60), FareCache(self.path, ttl=60)
+        other.owner = 'other-process'
+
+        def slow_loader():
+            time.sleep(0.4)
+            return {'2026-05-01': self.price('2026-05-01', 25.0)}
+
+        thread = threading.Thread(target=other.fetch, args=('BGY', 'KRK', '2026-05-01', slow_loader))
+        thread.start()
+        time.sleep(0.1)
+        result = this.fetch('BGY', 'KRK', '2026-05-01', lambda: self.fail('looked up twice'))
+        thread.join()
+
+        self.assertEqual(result['2026-05-01']['amount'], 25.0)
+
+
+    def test_cancel_ends_the_wait_for_another_lookup(self):
+        this, other = FareCache(self.path, ttl=60), FareCache(self.path, ttl=60)
+        other.owner = 'other-process'
+        release = threading.Event()
+
+        def hung_loader():
+            release.wait(5)
+            return {}
+
+        # The key is looked up by another process, then by another thread of this one
+        for date, waiter in (('2026-05-01', other), ('2026-05-02', this)):
+            with self.subTest(date=date):
+                thread = threading.Thread(target=this.fetch, args=('BGY', 'KRK', date, hung_loader))
+                thread.start()
+                # Cleanups run last-in first-out: let the loader finish, then join
+                self.addCleanup(thread.join)
+                self.addCleanup(release.set)
+                time.sleep(0.1)
+                cancelled = threading.Event()
+                threading.Timer(0.1, cancelled.set).start()
+
+                started = time.monotonic()
+                result = waiter.fetch('BGY', 'KRK', date, lambda: self.fail('looked up twice'), cancelled=cancelled)
+
+                self.assertLess(time.monotonic() - started, 1)
+                self.assertEqual(result, {date: LookupFailure(TIMEOUT)})
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_bucket_allows_a_burst_then_paces_lookups(self):
+        limiter = scratch_limiter(rate_per_minute=600, burst=2)
+
+        started = time.monotonic()
+        for _ in range(3):
+            self.assertTrue(limiter.acquire('direct'))
+        self.assertGreaterEqual(time.monotonic() - started, 0.08)
+        # Egresses have buckets of their own
+        started = time.monotonic()
+        limiter.acquire('Italy')
+        self.assertLess(time.monotonic() - started, 0.05)
+
+    def test_breaker_pauses_after_consecutive_blocks_and_reports_to_the_log(self):
+        scraper_service.clear_logs()
+        limiter = scratch_limiter(rate_per_minute=0, threshold=2, pause=0.2)
+        limiter.add_listener(scraper_service._push_log)
+
+        limiter.record('direct', blocked=True)
+        limiter.record('direct', blocked=False)
+        limiter.record('direct', blocked=True)
+        self.assertEqual(scraper_service.get_log_snapshot(), [])
+        limiter.record('direct', blocked=True)
+
+        started = time.monotonic()
+        self.assertTrue(limiter.acquire('direct'))
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        log = scraper_service.get_log_snapshot()
+        self.assertEqual(len(log), 2)
+        self.assertIn('paused on direct', log[0])
+        self.assertIn('resumed on direct', log[1])
+
+    def test_block_right_after_a_pause_trips_again_for_longer(self):
+        limiter = scratch_limiter(rate_per_minute=0, threshold=3, pause=0.1)
+        for _ in range(3):
+            limiter.record('direct', blocked=True)
+        limiter.acquire('direct')
+        limiter.record('direct', blocked=True)
+
+        self.assertGreater(limiter.snapshot()['direct']['paused_for'], 0.1)
+        stop = threading.Event()
+        stop.set()
+        self.assertFalse(limiter.acquire('direct', stop))
+
+    def test_processes_share_one_bucket_and_breaker(self):
+        limiter = scratch_limiter(rate_per_minute=60, burst=2, threshold=2, pause=60)
+        # Another process opens the same state file
+        other = RateLimiter(limiter.path, rate_per_minute=60, burst=2, threshold=2, pause=60)
+
+        self.assertTrue(limiter.acquire('direct'))
+        self.assertTrue(other.acquire('direct'))
+        self.assertLess(other.snapshot()['direct']['tokens'], 1)
+
+        limiter.record('Italy', blocked=True)
+        other.record('Italy', blocked=True)
+        self.assertGreater(limiter.snapshot()['Italy']['paused_for'], 50)
+        stop = threading.Event()
+        threading.Timer(0.1, stop.set).start()
+        self.assertFalse(limiter.acquire('Italy', stop))
+
+
+@mock.patch('FlightSearcher.backoff_delay', return_value=0)
+class BrowserFailureTests(SimpleTestCase):
+    def test_hung_page_load_fails_that_date_only_and_is_retried(self, backoff):
+        chrome = FakeChrome(fail_with=TimeoutException('timeout: Timed out receiving message from renderer'))
+        searcher = make_searcher(driver_pool=fake_driver_pool([chrome]), extraction='dom')
+
+        flights = searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=2)
+
+        self.assertEqual(flights, {})
+        self.assertEqual(searcher.last_failures, {'BGY-KRK on 2026-05-01': LookupFailure(TIMEOUT)})
+        # Retried on the same browser: a slow page is not a broken one
+        self.assertEqual(len(chrome.pages), 2)
+
+    def test_crashed_browser_is_a_timeout_and_gets_replaced(self, backoff):
+        crashed = FakeChrome(fail_with=WebDriverException('chrome not reachable'))
+        fresh = FakeChrome(fail_with=TimeoutException('page load timed out'))
+        backend = SeleniumBackend(driver_pool=fake_driver_pool([crashed, fresh]), extraction='dom')
+
+        self.assertEqual(backend.get_prices('BGY', 'KRK', '2026-05-01'), LookupFailure(TIMEOUT))
+        self.assertTrue(crashed.quit_called)
+        backend.get_prices('BGY', 'KRK', '2026-05-02')
+        self.assertEqual(len(fresh.pages), 1)
+
+    def test_page_load_gives_up_after_the_learned_navigation_time(self, backoff):
+        chrome = FakeChrome(fail_with=TimeoutException('page load timed out'))
+        backend = SeleniumBackend(driver_pool=fake_driver_pool([chrome]), extraction='dom')
+        backend.egress = 'navigation-test'
+
+        backend.get_prices('BGY', 'KRK', '2026-05-01')
+        self.assertEqual(chrome.page_load_timeout, latency_tracker.maximum)
+
+        for _ in range(10):
+            latency_tracker.record('navigation-test', {'navigation': 4.0})
+        self.assertEqual(backend.get_prices('BGY', 'KRK', '2026-05-01'), LookupFailure(TIMEOUT))
+        self.assertEqual(chrome.page_load_timeout, latency_tracker.timeout('navigation-test', 'navigation'))
+        self.assertLess(chrome.page_load_timeout, latency_tracker.maximum)
+        self.assertEqual(latency_tracker.snapshot()['navigation-test']['navigation']['timeouts'], 2)
+
+    def test_browser_on_a_cooling_proxy_is_rebound_to_another(self, backoff):
+        proxies = ProxyPool(['10.0.0.1:3128', '10.0.0.2:3128'], rate_per_minute=0, block_cooldown=60, max_wait=0)
+        first, second = proxies.proxies
+        stuck, fresh = FakeChrome(), FakeChrome(fail_with=TimeoutException('page load timed out'))
+        drivers = fake_driver_pool([stuck, fresh], proxy_pool=proxies)
+        drivers.release(drivers.acquire())
+        # The HTTP path or another browser got the proxy blocked
+        proxies.release(first, PROXY_BLOCKED)
+        backend = SeleniumBackend(driver_pool=drivers, extraction='dom')
+
+        self.assertEqual(backend.get_prices('BGY', 'KRK', '2026-05-01'), LookupFailure(TIMEOUT))
+        self.assertTrue(stuck.quit_called)
+        self.assertEqual(first.drivers, 0)
+
+        backend.get_prices('BGY', 'KRK', '2026-05-01')
+        self.assertEqual(len(fresh.pages), 1)
+        self.assertEqual((second.drivers, second.lookups), (1, 1))
+
+    def test_lost_network_response_is_a_timeout(self, backoff):
+        backend = SeleniumBackend(driver_pool=fake_driver_pool([FakeChrome()]), extraction='network')
+        lost = WebDriverException('No resource with given identifier found')
+        with mock.patch('AvailabilityCapture.wait_for_availability', side_effect=lost):
+            self.assertEqual(backend.get_prices('BGY', 'KRK', '2026-05-01'), LookupFailure(TIMEOUT))
+
+
+STUB_CONNECT = """#!/bin/sh
+echo "connect $1" >> "{dir}/log"
+[ "$1" = "Down" ] && exit 1
+# The tunnel comes up a moment after the script returns
+(sleep 0.2; echo "$1" > "{dir}/state") >/dev/null 2>&1 &
+exit 0
+"""
+
+STUB_DISCONNECT = """#!/bin/sh
+echo "disconnect" >> "{dir}/log"
+rm -f "{dir}/state"
+"""
+
+
+class VpnSessionTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        for name, script in (('connect.sh', STUB_CONNECT), ('disconnect.sh', STUB_DISCONNECT)):
+            path = Path(self.dir) / name
+            path.write_text(script.format(dir=self.dir))
+            path.chmod(0o755)
+
+    def session(self, countries):
+        return VpnSession(
+            countries=countries,
+            connect_script=f"{self.dir}/connect.sh",
+            disconnect_script=f"{self.dir}/disconnect.sh",
+            check_command=f"test -f {self.dir}/state",
+            ready_timeout=5, poll_interval=0.05,
+        )
+
+    def log(self):
+        log = Path(self.dir) / 'log'
+        return log.read_text().split('\n')[:-1] if log.exists() else []
+
+    def test_connects_once_and_polls_until_the_tunnel_is_up(self):
+        session = self.session(['Italy'])
+
+        started = time.monotonic()
+        self.assertTrue(session.ensure_connected())
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(session.ensure_connected())
+
+        self.assertEqual(session.country, 'Italy')
+        self.assertEqual(self.log(), ['disconnect', 'connect Italy'])
+
+    def test_rotates_away_from_a_blocked_exit_only_once(self):
+        session = self.session(['Italy', 'Spain'])
+        session.ensure_connected()
+        first, generation = session.country, session.generation
+
+        self.assertTrue(session.rotate(generation))
+        self.assertTrue(session.rotate(generation))
+
+        self.assertNotEqual(session.country, first)
+        self.assertEqual(len([line for line in self.log() if line.startswith('connect')]), 2)
+        self.assertTrue(session.snapshot()['exits'][first]['cooling'])
+
+    def test_unreachable_exit_is_skipped(self):
+        session = self.session(['Down', 'Spain'])
+        self.assertTrue(session.ensure_connected())
+        self.assertEqual(session.country, 'Spain')
+
+    def test_prefers_the_fastest_working_exit(self):
+        session = self.session(['Italy', 'Spain', 'France'])
+        for country, ok, seconds in (('Italy', True, 1.0), ('Spain', True, 0.4), ('France', False, 0.1)):
+            session._stats[country].connects = 1
+            for _ in range(5):
+                session.record_lookup(country, ok, seconds)
+
+        self.assertEqual(session.choose_exit(), 'Spain')
+        self.assertEqual(session.choose_exit(exclude=('Spain',)), 'Italy')
+
+    @mock.patch('FlightSearcher.backoff_delay', return_value=0)
+    def test_searcher_rotates_only_after_a_block(self, backoff):
+        session = self.session(['Italy', 'Spain'])
+        searcher = make_searcher(vpn=True, vpn_session=session)
+        searcher.selenium_backend = ScriptedBackend({'2026-05-01': [
+            LookupFailure(BLOCKED), LookupFailure(TIMEOUT),
+            {'2026-05-01': {'currency': '€', 'amount': 19.5, 'date': '2026-05-01'}},
+        ]})
+
+        flights = searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01'], max_retries=3)
+        searcher.end_cycle()
+
+        self.assertEqual(flights['BGY-KRK on 2026-05-01']['amount'], 19.5)
+        self.assertEqual(len([line for line in self.log() if line.startswith('connect')]), 2)
+        self.assertIsNone(session.country)
+
+
+def chrome_available():
+    return any(shutil.which(name) for name in ('google-chrome', 'chromium', 'chromium-browser', 'chrome'))
+
+
+class CarouselExtractorTests(SimpleTestCase):
+    def test_parse_price_text_handles_rendered_formats(self):
+        self.assertEqual(CarouselExtractor.parse_price_text('€ 19,99'), ('€', 19.99))
+        self.assertEqual(CarouselExtractor.parse_price_text('€19,50'), ('€', 19.5))
+        self.assertEqual(CarouselExtractor.parse_price_text('€ 1.024 ,50'), ('€', 1024.5))
+        self.assertEqual(CarouselExtractor.parse_price_text('1,024.50 £'), ('£', 1024.5))
+        self.assertEqual(CarouselExtractor.parse_price_text('PLN 2.100'), ('PLN', 2100.0))
+        self.assertIsNone(CarouselExtractor.parse_price_text('Nessun volo'))
+        self.assertIsNone(CarouselExtractor.parse_price_text(None))
+
+    def test_parse_carousel_dates_boxes_around_the_selected_one(self):
+        items = [
+            {'index': 0, 'selected': False, 'price': None},
+            {'index': 1, 'selected': False, 'price': '€ 45,99'},
+            {'index': 2, 'selected': True, 'price': '€ 19,50'},
+            {'index': 3, 'selected': False, 'price': '€ 34,00'},
+        ]
+        prices = CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1))
+
+        self.assertEqual(sorted(prices), ['2026-04-30', '2026-05-01', '2026-05-02'])
+        self.assertEqual(prices['2026-05-01'], {'currency': '€', 'amount': 19.5, 'date': '2026-05-01'})
+
+    def test_covered_dates_include_unpriced_boxes(self):
+        items = [
+            {'index': 0, 'selected': False, 'price': None},
+            {'index': 1, 'selected': True, 'price': '€ 19,50'},
+        ]
+        self.assertEqual(CarouselExtractor.covered_dates(items, datetime(2026, 5, 1)), ['2026-04-30', '2026-05-01'])
+        self.assertEqual(CarouselExtractor.covered_dates(items[:1], datetime(2026, 5, 1)), [])
+
+    def test_parse_carousel_without_selection_is_empty(self):
+        items = [{'index': 0, 'selected': False, 'price': '€ 45,99'}]
+        self.assertEqual(CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1)), {})
+
+    def test_page_state_tells_no_flight_from_a_loading_page(self):
+        page = {'title': 'Ryanair', 'captcha': False, 'fares': False, 'any_price': False}
+        state = CarouselExtractor.page_state
+
+        self.assertIsNone(state(None))
+        self.assertIsNone(state(dict(page, selected=None)))
+        # An unpriced box is only a no-flight answer once the carousel says so
+        self.assertIsNone(state(dict(page, selected={'price': False, 'no_flights': False})))
+        self.assertEqual(state(dict(page, selected={'price': False, 'no_flights': True})), 'no_flight')
+        self.assertEqual(
+            state(dict(page, any_price=True, selected={'price': False, 'no_flights': False})), 'no_flight'
+        )
+        self.assertEqual(state(dict(page, fares=True, selected={'price': True, 'no_flights': False})), 'fares')
+        self.assertEqual(state(dict(page, title='Just a moment...', selected=None)), 'blocked')
+        self.assertEqual(state(dict(page, captcha=True, selected=None)), 'blocked')
+
+
+class SavedPage(HTMLParser):
+    """
+    A saved results page read in Python, answering what CAROUSEL_SCRIPT and
+    PAGE_FACTS_SCRIPT answer in the browser, with the same selectors.
+    """
+
+    VOID_TAGS = {'meta', 'link', 'br', 'img', 'input'}
+
+    def __init__(self, fixture):
+        super().__init__()
+        self.root = {'tag': None, 'attrs': {}, 'children': []}
+        self.open = [self.root]
+        self.feed((TESTDATA / fixture).read_text())
+
+    def handle_starttag(self, tag, attrs):
+        node = {'tag': tag, 'attrs': dict(attrs), 'children': []}
+        self.open[-1]['children'].append(node)
+        if tag not in self.VOID_TAGS:
+            self.open.append(node)
+
+    def handle_endtag(self, tag):
+        while len(self.open) > 1 and self.open.pop()['tag'] != tag:
+            pass
+
+    def handle_data(self, data):
+        self.open[-1]['children'].append(data)
+
+    @staticmethod
+    def classes(node):
+        return node['attrs'].get('class', '').split()
+
+    @classmethod
+    def descendants(cls, node):
+        for child in node['children']:
+            if isinstance(child, dict):
+                yield child
+                yield from cls.descendants(child)
+
+    @classmethod
+    def text(cls, node):
+        return ''.join(child if isinstance(child, str) else cls.text(child) for child in node['children'])
+
+    def carousel_items(self):
+        return [
+            item for container in self.descendants(self.root) if container['tag'] == 'carousel-container'
+            for item in self.descendants(container) if item['tag'] == 'carousel-item'
+        ]
+
+    def carousel(self):
+        items = []
+        for index, item in enumerate(self.carousel_items()):
+            price = next((n for n in self.descendants(item) if n['tag'] == 'ry-price'), None)
+            items.append({
+                'index': index,
+                'selected': any('date-item--selected' in self.classes(child)
+                                for child in item['children'] if isinstance(child, dict)),
+                'price': ' '.join(self.text(price).split()) if price else None,
+            })
+        return items
+
+    def facts(self):
+        nodes = list(self.descendants(self.root))
+        in_carousel = [n for item in self.carousel_items() for n in self.descendants(item)]
+        selected = next((n for n in in_carousel if 'date-item--selected' in self.classes(n)), None)
+        return {
+            'title': next((self.text(n) for n in nodes if n['tag'] == 'title'), ''),
+            'captcha': any(
+                (n['tag'] == 'iframe' and 'captcha' in n['attrs'].get('src', ''))
+                or n['attrs'].get('id') == 'px-captcha' or 'g-recaptcha' in self.classes(n)
+                for n in nodes
+            ),
+            'fares': any(n['tag'] == 'flight-card-new' for n in nodes),
+            'selected': {
+                'price': any(n['tag'] == 'ry-price' for n in self.descendants(selected)),
+                'no_flights': any('date-item__price--no-flights' in self.classes(n) for n in self.descendants(selected)),
+            } if selected else None,
+            'any_price': any(n['tag'] == 'ry-price' for n in in_carousel),
+        }
+
+
+class SavedPageTests(SimpleTestCase):
+    """CarouselExtractor over the saved results pages, without a browser (see SavedPage)."""
+
+    def test_fares_page_prices_every_carousel_day(self):
+        page = SavedPage('results_page_carousel.html')
+        self.assertEqual(CarouselExtractor.page_state(page.facts()), 'fares')
+        items = page.carousel()
+        self.assertEqual([item['selected'] for item in items], [False, False, False, True, False])
+        prices = CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1))
+        self.assertEqual(
+            {date: info['amount'] for date, info in prices.items()},
+            {'2026-04-29': 45.99, '2026-04-30': 1024.5, '2026-05-01': 19.5, '2026-05-02': 34.0},
+        )
+
+    def test_carousel_without_any_flight_is_a_no_flight_page(self):
+        page = SavedPage('results_page_no_flights.html')
+        self.assertEqual(CarouselExtractor.page_state(page.facts()), 'no_flight')
+        items, day = page.carousel(), datetime(2026, 5, 1)
+        prices = with_no_flights(CarouselExtractor.covered_dates(items, day), CarouselExtractor.parse_carousel(items, day))
+        self.assertEqual(len(prices), 5)
+        self.assertTrue(all(value == LookupFailure(NO_FLIGHT) for value in prices.values()))
+
+    def test_loading_page_has_no_state_yet(self):
+        page = SavedPage('results_page_loading.html')
+        self.assertIsNone(CarouselExtractor.page_state(page.facts()))
+        self.assertEqual(CarouselExtractor.parse_carousel(page.carousel(), datetime(2026, 5, 1)), {})
+
+    def test_page_without_selected_box_yields_no_prices(self):
+        items = SavedPage('results_page_no_selection.html').carousel()
+        self.assertEqual(CarouselExtractor.covered_dates(items, datetime(2026, 5, 1)), [])
+        self.assertEqual(CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1)), {})
+
+
+@unittest.skipUnless(chrome_available(), 'Chrome is not installed')
+class CarouselScriptTests(SimpleTestCase):
+    """
+    Runs CAROUSEL_SCRIPT and PAGE_FACTS_SCRIPT in headless Chrome against the
+    saved results pages. SavedPageTests cover the same pages without Chrome.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from selenium import webdriver
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless=new')
+        options.add_argument('--no-sandbox')
+        cls.driver = webdriver.Chrome(options=options)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.driver.quit()
+        super().tearDownClass()
+
+    def extract(self, fixture):
+        self.driver.get((TESTDATA / fixture).as_uri())
+        return self.driver.execute_script(CarouselExtractor.CAROUSEL_SCRIPT)
+
+    def test_script_returns_every_box_in_one_call(self):
+        items = self.extract('results_page_carousel.html')
+
+        self.assertEqual([item['selected'] for item in items], [False, False, False, True, False])
+        self.assertIsNone(items[0]['price'])
+        prices = CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1))
+        self.assertEqual(
+            {date: info['amount'] for date, info in prices.items()},
+            {'2026-04-29': 45.99, '2026-04-30': 1024.5, '2026-05-01': 19.5, '2026-05-02': 34.0},
+        )
+
+    def test_page_without_selected_box_yields_no_prices(self):
+        items = self.extract('results_page_no_selection.html')
+        self.assertEqual(CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1)), {})
+
+    def test_page_with_fare_cards_is_a_fares_page(self):
+        self.driver.get((TESTDATA / 'results_page_carousel.html').as_uri())
+        self.assertEqual(CarouselExtractor.read_page_state(self.driver), 'fares')
+
+    def test_scripts_answer_like_the_python_reading(self):
+        for fixture in ('results_page_carousel.html', 'results_page_no_flights.html',
+                        'results_page_loading.html', 'results_page_no_selection.html'):
+            with self.subTest(fixture):
+                page = SavedPage(fixture)
+                self.assertEqual(self.extract(fixture), page.carousel())
+                self.assertEqual(self.driver.execute_script(CarouselExtractor.PAGE_FACTS_SCRIPT), page.facts())
+
+    def test_carousel_without_any_flight_is_a_no_flight_page(self):
+        self.driver.get((TESTDATA / 'results_page_no_flights.html').as_uri())
+        self.assertEqual(CarouselExtractor.read_page_state(self.driver), 'no_flight')
+        items = self.driver.execute_script(CarouselExtractor.CAROUSEL_SCRIPT)
+        self.assertEqual(len(CarouselExtractor.covered_dates(items, datetime(2026, 5, 1))), 5)
+        self.assertEqual(CarouselExtractor.parse_carousel(items, datetime(2026, 5, 1)), {})
+
+
+class ScrapeEngineTests(SimpleTestCase):
+    """Thread workers with a FlightSearcher stand-in taking `delays[destination]` seconds per job."""
+
+    delays = {'KRK': 0.05, 'CIA': 0.15, 'STN': 0.3}
+
+    def run_engine(self, jobs, workers=3, **run_kwargs):
+        delays = self.delays
+        self.searchers = searchers = []
+
+        class TimedSearcher:
+            def __init__(self, vpn, driver_pool=None):
+                self.threads = set()
+                self.closed = False
+                searchers.append(self)
+
+            def close(self):
+                self.closed = True
+
+            def search_flights_with_retry(self, origin, destination, dates, max_retries):
+                self.threads.add(threading.get_ident())
+                time.sleep(delays.get(destination, 0))
+                if destination == 'ERR':
+                    raise RuntimeError('worker crashed')
+                return {f"{origin}-{destination} on {dates[0]}": {'currency': '€', 'amount': 10.0, 'date': dates[0]}}
+
+        from ScrapeEngine import ScrapeEngine
+        arrivals = []
+        with mock.patch('ScrapeEngine.FlightSearcher', TimedSearcher), \
+                mock.patch('ScrapeEngine.get_shared_pool', return_value=fake_driver_pool([])):
+            started = time.monotonic()
+            for key, result in ScrapeEngine(vpn=False, workers=workers).run(jobs, **run_kwargs):
+                arrivals.append((key, result, time.monotonic() - started))
+        return arrivals
+
+    def test_results_arrive_as_each_worker_finishes(self):
+        arrivals = self.run_engine([
+            ('slow', 'BGY', 'STN', ['2026-05-01']),
+            ('fast', 'BGY', 'KRK', ['2026-05-01']),
+            ('mid', 'BGY', 'CIA', ['2026-05-01']),
+        ])
+
+        self.assertEqual([key for key, _, _ in arrivals], ['fast', 'mid', 'slow'])
+        # The first result is handed over without waiting for the slow worker
+        self.assertLess(arrivals[0][2], self.delays['STN'])
+        self.assertEqual(arrivals[0][1]['BGY-KRK on 2026-05-01']['amount'], 10.0)
+
+    def test_failing_worker_does_not_stop_the_run(self):
+        arrivals = self.run_engine([
+            ('broken', 'BGY', 'ERR', ['2026-05-01']),
+            ('fast', 'BGY', 'KRK', ['2026-05-01']),
+            ('slow', 'BGY', 'STN', ['2026-05-01']),
+        ], workers=2)
+
+        results = {key: result for key, result, _ in arrivals}
+        self.assertEqual(set(results), {'broken', 'fast', 'slow'})
+        self.assertIsInstance(results['broken'], RuntimeError)
+        self.assertEqual(results['slow']['BGY-STN on 2026-05-01']['amount'], 10.0)
+
+    def test_each_worker_thread_searches_with_its_own_searcher(self):
+        self.run_engine([(n, 'BGY', 'CIA', ['2026-05-01']) for n in range(6)], workers=3)
+
+        self.assertEqual(len(self.searchers), 3)
+        self.assertTrue(all(len(searcher.threads) == 1 for searcher in self.searchers))
+        self.assertEqual(len(set.union(*(searcher.threads for searcher in self.searchers))), 3)
+        # ...and closes them when the run ends
+        self.assertTrue(all(searcher.closed for searcher in self.searchers))
+
+    def test_process_workers_use_the_parents_exit_and_relay_its_events(self):
+        from ScrapeEngine import ScrapeEngine
+        from RateLimiter import rate_limiter
+        from VpnSession import vpn_session
+
+        class ExitSearcher:
+            def __init__(self, vpn, driver_pool=None, egress=None):
+                self.egress = egress
+
+            def search_flights_with_retry(self, origin, destination, dates, max_retries):
+                rate_limiter.notify(f"⏸️ Scraping paused on {self.egress}")
+                return {'egress': self.egress}
+
+        messages = []
+        rate_limiter.add_listener(messages.append)
+        self.addCleanup(rate_limiter.remove_listener, messages.append)
+        # Forked workers inherit the patches
+        with mock.patch('ScrapeEngine.FlightSearcher', ExitSearcher), \
+                mock.patch('ScrapeEngine.get_shared_pool', return_value=fake_driver_pool([])), \
+                mock.patch.object(vpn_session, 'country', 'Italy'):
+            results = dict(ScrapeEngine(vpn=False, workers=2, mode='process').run([
+                ('a', 'BGY', 'KRK', ['2026-05-01']),
+                ('b', 'BGY', 'STN', ['2026-05-01']),
+            ]))
+
+        self.assertEqual(results, {'a': {'egress': 'Italy'}, 'b': {'egress': 'Italy'}})
+        self.assertEqual(messages, ['⏸️ Scraping paused on Italy'] * 2)
+
+    def test_on_tick_runs_while_no_worker_finishes(self):
+        ticks = []
+        started = time.monotonic()
+        arrivals = self.run_engine(
+            [('slow', 'BGY', 'STN', ['2026-05-01'])],
+            tick=0.05, on_tick=lambda: ticks.append(time.monotonic() - started),
+        )
+
+        self.assertGreaterEqual(len([at for at in ticks if at < arrivals[0][2]]), 3)
+
+
+class CancellableSearcher:
+    """FlightSearcher stand-in whose lookups hold until `go` is set or the searcher is cancelled."""
+
+    def __init__(self, vpn=False, driver_pool=None):
+        self.cancelled = threading.Event()
+        self.searching = threading.Event()
+        self.go = threading.Event()
+        self.searches = 0
+        self.cycles_ended = 0
+        self.closed_after = None
+
+    def search_flights_with_retry(self, origin, destination, dates, max_retries):
+        self.searches += 1
+        self.searching.set()
+        self.go.wait(5)
+        if self.cancelled.is_set():
+            raise SearchCancelled("Search cancelled")
+        return {f"{origin}-{destination} on {dates[0]}": {'currency': '€', 'amount': 10.0, 'date': dates[0]}}
+
+    def cancel(self):
+        self.cancelled.set()
+        self.go.set()
+
+    def end_cycle(self):
+        self.cycles_ended += 1
+
+    def close(self):
+        # Cycles ended by the time the searcher was closed
+        self.closed_after = self.cycles_ended
+
+
+class BotCycleTests(SimpleTestCase):
+    """/start_search, /stop_search and the repeating job against a CancellableSearcher."""
+
+    def setUp(self):
+        import bot
+        self.bot = bot
+        patches = [
+            mock.patch.multiple(bot, flight_searcher=None, search_job=None, search_cycle=None,
+                                search_counter=0, price_tracker=bot.PriceTracker()),
+            mock.patch.dict(bot.FLIGHT_CONFIG, {
+                'flights': [{'Origin': 'BGY', 'Destination': 'KRK'}],
+                'dates': ['2026-05-01'],
+            }),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        # Tasks the handlers hand to the application, awaited by each scenario
+        self.tasks = []
+        self.context = mock.Mock()
+        self.context.job.chat_id = 42
+        self.context.bot.send_message = mock.AsyncMock()
+        self.context.application.create_task.side_effect = lambda coro: self.tasks.append(asyncio.ensure_future(coro))
+        self.update = mock.Mock()
+        self.update.effective_chat.id = 42
+        self.update.message.reply_text = mock.AsyncMock()
+
+    async def start_cycle(self, searcher):
+        cycle = asyncio.ensure_future(self.bot.flight_search_job(self.context))
+        self.assertTrue(await asyncio.to_thread(searcher.searching.wait, 5))
+        return cycle
+
+    async def settle(self, cycle):
+        await asyncio.wait_for(cycle, 5)
+        await asyncio.wait_for(asyncio.gather(*self.tasks), 5)
+
+    def test_stop_cancels_the_cycle_and_closes_the_searcher(self):
+        searcher = self.bot.flight_searcher = CancellableSearcher()
+
+        async def scenario():
+            cycle = await self.start_cycle(searcher)
+            await self.bot.stop_search(self.update, self.context)
+            await self.settle(cycle)
+
+        asyncio.run(scenario())
+
+        self.assertTrue(searcher.cancelled.is_set())
+        self.assertEqual(searcher.searches, 1)
+        # close() ran once the cancelled cycle had wound down
+        self.assertEqual(searcher.closed_after, 1)
+        self.context.bot.send_message.assert_not_called()
+        self.assertIsNone(self.bot.flight_searcher)
+        self.update.message.reply_text.assert_awaited_once_with('Flight search stopped!')
+
+    def test_cycle_due_while_one_runs_is_skipped(self):
+        searcher = self.bot.flight_searcher = CancellableSearcher()
+
+        async def scenario():
+            cycle = await self.start_cycle(searcher)
+            await self.bot.flight_search_job(self.context)
+            self.assertFalse(cycle.done())
+            searcher.go.set()
+            await self.settle(cycle)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(searcher.searches, 1)
+        self.assertEqual(searcher.cycles_ended, 1)
+        # Only the running cycle reports
+        self.context.bot.send_message.assert_awaited_once()
+        self.assertIn('KRK', self.context.bot.send_message.await_args.kwargs['text'])
+
+    def test_new_search_closes_the_running_searcher_first(self):
+        old = self.bot.flight_searcher = CancellableSearcher()
+
+        async def scenario():
+            cycle = await self.start_cycle(old)
+            await self.bot.start_search(self.update, self.context)
+            await self.settle(cycle)
+            new = self.bot.flight_searcher
+            new.go.set()
+            await self.bot.flight_search_job(self.context)
+            return new
+
+        with mock.patch.object(self.bot, 'FlightSearcher', CancellableSearcher), \
+                mock.patch.object(self.bot, 'get_shared_pool', return_value=fake_driver_pool([])):
+            new = asyncio.run(scenario())
+
+        self.assertIsNot(new, old)
+        self.assertTrue(old.cancelled.is_set())
+        self.assertEqual(old.closed_after, 1)
+        self.assertFalse(new.cancelled.is_set())
+        self.assertIsNone(new.closed_after)
+        self.assertEqual(new.searches, 1)
+        self.context.job_queue.run_repeating.assert_called_once()
+        # The cancelled cycle sent nothing; the new one sent its first results
+        self.context.bot.send_message.assert_awaited_once()
+
+
+class FakeEngine:
+    """ScrapeEngine stand-in that prices every date of every job at 10.0."""
+
+    def __init__(self, *args, **kwargs):
+        self.batches = FakeEngine.batches
+
+    def run(self, jobs, tick=None, on_tick=None):
+        self.batches.append(jobs)
+        for index, origin, destination, dates in jobs:
+            yield index, {
+                f"{origin}-{destination} on {day}": {'currency': '€', 'amount': 10.0, 'date': day}
+                for day in dates
+            }
+
+
+class RouteGroupingTests(TestCase):
+
+    def route(self, destination, day):
+        from flights.models import Route
+        return Route.objects.create(origin='BGY', destination=destination, date=datetime(2026, 5, day).date())
+
+    def test_routes_of_a_leg_within_the_carousel_window_share_a_group(self):
+        from datetime import date
+        from flights.models import Route
+        routes = [self.route('KRK', day) for day in (6, 1, 4, 2)] + [self.route('STN', 2)]
+
+        groups = scraper_service.group_routes(Route.objects.order_by('?'), window_days=3)
+
+        self.assertEqual(
+            sorted([(route.destination, route.date) for route in group] for group in groups),
+            [[('KRK', date(2026, 5, 1)), ('KRK', date(2026, 5, 2)), ('KRK', date(2026, 5, 4))],
+             [('KRK', date(2026, 5, 6))],
+             [('STN', date(2026, 5, 2))]],
+        )
+        self.assertEqual(len(scraper_service.group_routes(routes, window_days=0)), 5)
+
+    def test_one_lookup_fills_every_date_of_a_group(self):
+        prices = {day: {'currency': '€', 'amount': 19.5 + n, 'date': day}
+                  for n, day in enumerate(['2026-05-01', '2026-05-02', '2026-05-03', '2026-05-04'])}
+        searcher = make_searcher()
+        searcher.selenium_backend = StubBackend(prices)
+
+        flights = searcher.search_flights_with_retry('BGY', 'KRK', ['2026-05-01', '2026-05-02', '2026-05-04'],
+                                                     max_retries=1)
+
+        self.assertEqual(searcher.selenium_backend.calls, [('BGY', 'KRK', '2026-05-01')])
+        self.assertEqual(sorted(flights), ['BGY-KRK on 2026-05-01', 'BGY-KRK on 2026-05-02', 'BGY-KRK on 2026-05-04'])
+
+    def test_scrape_searches_a_group_once_and_saves_every_route(self):
+        from flights.models import PriceRecord
+        routes = [self.route('KRK', day) for day in (1, 3)] + [self.route('STN', 1)]
+        FakeEngine.batches = []
+
+        with self.settings(SCRAPER_GROUP_DAYS=3), mock.patch('ScrapeEngine.ScrapeEngine', FakeEngine):
+            saved = scraper_service.scrape_routes(routes, vpn=False, log=lambda msg: None)
+
+        jobs = FakeEngine.batches[0]
+        self.assertEqual(sorted(job[3] for job in jobs), [['2026-05-01'], ['2026-05-01', '2026-05-03']])
+        self.assertEqual(saved, 3)
+        self.assertEqual(PriceRecord.objects.count(), 3)
+
+
+class ScrapeQueueTests(TestCase):
+
+    def setUp(self):
+        from flights.models import Route
+        self.routes = [
+            Route.objects.create(origin='BGY', destination=dest, date='2026-12-01')
+            for dest in ('STN', 'BCN', 'MAD')
+        ]
+        FakeEngine.batches = []
+
+    def test_enqueue_skips_pending_routes_and_raises_priority(self):
+        from flights.models import ScrapeJob
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_SWEEP)
+        scraper_service.enqueue_routes(self.routes[2:], ScrapeJob.PRIORITY_USER)
+
+        self.assertEqual(ScrapeJob.objects.count(), 3)
+        first = ScrapeJob.objects.filter(status=ScrapeJob.QUEUED).first()
+        self.assertEqual(first.route, self.routes[2])
+        self.assertEqual(first.priority, ScrapeJob.PRIORITY_USER)
+
+    def test_claim_takes_each_job_once(self):
+        from flights.models import ScrapeJob
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_SWEEP)
+
+        first = scraper_service.claim_jobs(2)
+        second = scraper_service.claim_jobs(2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual([job.route for job in second], [self.routes[2]])
+        self.assertEqual(scraper_service.claim_jobs(2), [])
+
+    def test_drain_scrapes_queue_in_priority_batches(self):
+        from flights.models import PriceRecord, ScrapeJob
+        self.routes[1].is_active = False
+        self.routes[1].save()
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_SWEEP)
+        scraper_service.enqueue_routes(self.routes[2:], ScrapeJob.PRIORITY_USER)
+
+        with self.settings(SCRAPER_QUEUE_BATCH=1), \
+                mock.patch('ScrapeEngine.ScrapeEngine', FakeEngine):
+            saved = scraper_service.drain_queue(vpn=False, log=lambda msg: None)
+
+        self.assertEqual(saved, 2)
+        self.assertEqual(PriceRecord.objects.count(), 2)
+        # The user job went first, the inactive route never reached the engine
+        self.assertEqual([batch[0][2] for batch in FakeEngine.batches], ['MAD', 'STN'])
+        failed = ScrapeJob.objects.get(status=ScrapeJob.FAILED)
+        self.assertEqual((failed.route, failed.error), (self.routes[1], 'Route is inactive'))
+        self.assertEqual(ScrapeJob.objects.filter(status=ScrapeJob.DONE).count(), 2)
+
+    def test_stale_running_jobs_are_requeued(self):
+        from django.utils import timezone
+        from flights.models import ScrapeJob
+        scraper_service.enqueue_routes(self.routes[:1], ScrapeJob.PRIORITY_SWEEP)
+        ScrapeJob.objects.update(status=ScrapeJob.RUNNING, started_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(scraper_service.requeue_stale_jobs(1800), 1)
+        self.assertEqual(ScrapeJob.objects.get().status, ScrapeJob.QUEUED)
+
+    def test_status_reports_positions_and_eta(self):
+        from django.utils import timezone
+        from flights.models import ScrapeJob
+        now = timezone.now()
+        ScrapeJob.objects.create(
+            route=self.routes[0], status=ScrapeJob.DONE,
+            started_at=now - timedelta(seconds=30), finished_at=now,
+        )
+        scraper_service.enqueue_routes(self.routes[1:], ScrapeJob.PRIORITY_SWEEP)
+
+        with self.settings(SCRAPER_WORKERS=1):
+            status = self.client.get(reverse('api_status')).json()['queue']
+
+        self.assertEqual((status['queued'], status['running']), (2, 0))
+        self.assertEqual(status['avg_job_seconds'], 30)
+        self.assertEqual([job['position'] for job in status['jobs']], [1, 2])
+        self.assertEqual([job['eta_seconds'] for job in status['jobs']], [30, 60])
+        self.assertEqual(status['eta_seconds'], 60)
+
+    def test_trigger_while_running_queues_instead_of_dropping(self):
+        from flights.models import ScrapeJob
+        with mock.patch.object(scraper_service, '_scraper_running') as running, \
+                mock.patch.object(scraper_service, '_start_dispatcher') as start:
+            running.is_set.return_value = True
+            self.assertTrue(scraper_service.trigger_scrape(route_pks=[self.routes[0].pk]))
+
+        start.assert_called_once()
+        job = ScrapeJob.objects.get()
+        self.assertEqual((job.route, job.priority), (self.routes[0], ScrapeJob.PRIORITY_USER))
+
+
+class SchedulingTests(TestCase):
+
+    def setUp(self):
+        from django.utils import timezone
+        self.now = timezone.now()
+
+    def make_route(self, days_ahead, prices=(), **kwargs):
+        from flights.models import PriceRecord, Route
+        route = Route.objects.create(
+            origin='BGY', destination='STN', date=self.now.date() + timedelta(days=days_ahead), **kwargs
+        )
+        for amount in prices:
+            PriceRecord.objects.create(route=route, amount=amount, currency='€')
+        return route
+
+    def test_interval_shrinks_close_to_departure(self):
+        from flights import scheduling
+        near = scheduling.scrape_interval(self.make_route(2), self.now)
+        far = scheduling.scrape_interval(self.make_route(200), self.now)
+        self.assertEqual(near, timedelta(minutes=30))
+        self.assertEqual(far, timedelta(hours=12))
+
+    def test_volatile_prices_are_checked_more_often(self):
+        from flights import scheduling
+        volatile = self.make_route(20, prices=[40, 60, 45, 70])
+        self.assertEqual(scheduling.scrape_interval(volatile, self.now), timedelta(hours=1, minutes=30))
+
+    def test_flat_prices_are_checked_less_often(self):
+        from flights import scheduling
+        flat = self.make_route(20, prices=[50] * scheduling.VOLATILITY_WINDOW)
+        self.assertEqual(scheduling.scrape_interval(flat, self.now), timedelta(hours=6))
+        # A few equal prices are not enough to call a route stable
+        few = self.make_route(21, prices=[50, 50])
+        self.assertEqual(scheduling.scrape_interval(few, self.now), timedelta(hours=3))
+
+    def test_interval_is_clamped_to_settings(self):
+        from flights import scheduling
+        with self.settings(SCRAPER_MIN_INTERVAL=3600, SCRAPER_MAX_INTERVAL=7200):
+            self.assertEqual(scheduling.scrape_interval(self.make_route(1), self.now), timedelta(hours=1))
+            self.assertEqual(scheduling.scrape_interval(self.make_route(200), self.now), timedelta(hours=2))
+
+    def test_due_routes_and_departed_routes(self):
+        from flights import scheduling
+        new = self.make_route(10)
+        due = self.make_route(11, next_due_at=self.now - timedelta(minutes=1))
+        self.make_route(12, next_due_at=self.now + timedelta(hours=1))
+        departed = self.make_route(-1)
+
+        self.assertEqual(scheduling.deactivate_departed(self.now.date()), 1)
+        departed.refresh_from_db()
+        self.assertFalse(departed.is_active)
+        self.assertEqual(set(scheduling.due_routes(self.now)), {new, due})
+
+    def test_scraped_routes_get_their_next_due_time(self):
+        route = self.make_route(2)
+        FakeEngine.batches = []
+        with mock.patch('ScrapeEngine.ScrapeEngine', FakeEngine):
+            scraper_service.scrape_routes([route], vpn=False, log=lambda msg: None)
+
+        route.refresh_from_db()
+        self.assertAlmostEqual(
+            (route.next_due_at - self.now).total_seconds(), timedelta(minutes=30).total_seconds(), delta=60
+        )
+
+
+class RouteLeaseTests(TestCase):
+    """Two scraper nodes sharing one database."""
+
+    def setUp(self):
+        from flights.models import Route
+        self.routes = [
+            Route.objects.create(origin='BGY', destination=dest, date='2026-12-01')
+            for dest in ('STN', 'BCN')
+        ]
+        FakeEngine.batches = []
+
+    def expire_leases(self):
+        from django.utils import timezone
+        from flights.models import RouteLease
+        RouteLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_leased_route_is_not_handed_to_another_node(self):
+        from flights import leases
+        self.assertEqual(leases.acquire_leases(self.routes[:1], 'node-a', 60), self.routes[:1])
+        self.assertEqual(leases.acquire_leases(self.routes, 'node-b', 60), self.routes[1:])
+        # Re-leasing its own route just extends the lease
+        self.assertEqual(leases.acquire_leases(self.routes[:1], 'node-a', 60), self.routes[:1])
+
+    def test_expired_lease_is_taken_over(self):
+        from flights import leases
+        from flights.models import RouteLease
+        leases.acquire_leases(self.routes, 'node-a', 60)
+        self.expire_leases()
+
+        self.assertEqual(leases.acquire_leases(self.routes[:1], 'node-b', 60), self.routes[:1])
+        self.assertEqual(RouteLease.objects.get(route=self.routes[0]).node, 'node-b')
+        # node-a's heartbeat only renews what it still holds
+        self.assertEqual(leases.renew_leases('node-a', 60), 1)
+
+    def test_crashed_node_jobs_are_requeued_after_lease_expiry(self):
+        from django.utils import timezone
+        from flights import leases
+        from flights.models import ScrapeJob
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_SWEEP)
+        jobs = scraper_service.claim_jobs(2, 'node-a')
+        leases.acquire_leases([job.route for job in jobs], 'node-a', 60)
+        ScrapeJob.objects.update(started_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(scraper_service.requeue_stale_jobs(60), 0)
+        self.expire_leases()
+        self.assertEqual(scraper_service.requeue_stale_jobs(60), 2)
+
+        with mock.patch('ScrapeEngine.ScrapeEngine', FakeEngine):
+            scraper_service.drain_queue(vpn=False, log=lambda msg: None, node='node-b')
+        self.assertEqual(set(ScrapeJob.objects.values_list('status', 'node')), {(ScrapeJob.DONE, 'node-b')})
+
+    def test_drain_skips_routes_leased_elsewhere(self):
+        from flights import leases
+        from flights.models import PriceRecord, RouteLease, ScrapeJob
+        leases.acquire_leases(self.routes[:1], 'node-a', 60)
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_SWEEP)
+
+        with mock.patch('ScrapeEngine.ScrapeEngine', FakeEngine):
+            scraper_service.drain_queue(vpn=False, log=lambda msg: None, node='node-b')
+
+        self.assertEqual(list(PriceRecord.objects.values_list('route', flat=True)), [self.routes[1].pk])
+        skipped = ScrapeJob.objects.get(route=self.routes[0])
+        self.assertEqual(skipped.error, 'Route is being scraped by another node')
+        # node-b released its lease, node-a still holds its own
+        self.assertEqual(list(RouteLease.objects.values_list('node', flat=True)), ['node-a'])
+
+    def test_route_is_queued_once_across_nodes(self):
+        from flights.models import ScrapeJob
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_SWEEP)
+        scraper_service.claim_jobs(1, 'node-a')
+        scraper_service.enqueue_routes(self.routes, ScrapeJob.PRIORITY_USER)
+
+        self.assertEqual(ScrapeJob.objects.count(), 2)
+        self.assertEqual(
+            ScrapeJob.objects.get(status=ScrapeJob.QUEUED).priority, ScrapeJob.PRIORITY_USER
+        )
+
+
+class RouteLeaseRaceTests(TransactionTestCase):
+    """
+    Scraper nodes running at the same time, one thread each. Like production
+    they share a file-backed SQLite database, each on its own connection.
+    """
+
+    def setUp(self):
+        import sqlite3
+        from django.db import connection
+        from flights.models import Route
+        self.routes = [
+            Route.objects.create(origin='BGY', destination='STN', date=datetime(2026, 12, 1).date() + timedelta(days=day))
+            for day in range(20)
+        ]
+        # The in-memory test database locks whole tables between connections: copy it
+        # to a file and send the connections other threads open there
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = str(Path(tmp.name) / 'nodes.sqlite3')
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.close()
+        self.addCleanup(connection.settings_dict.__setitem__, 'NAME', connection.settings_dict['NAME'])
+        connection.settings_dict['NAME'] = path
+
+    def run_nodes(self, target, nodes):
+        """Run target(node) on one thread per node, all starting together. Returns their results."""
+        from django.db import connection
+        start = threading.Barrier(len(nodes))
+        results, errors = {}, []
+
+        def run(node):
+            try:
+                start.wait()
+                results[node] = target(node)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(node,)) for node in nodes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def holders(self):
+        from flights.models import RouteLease
+        return self.run_nodes(lambda node: dict(RouteLease.objects.values_list('route', 'node')), ['reader'])['reader']
+
+    def test_each_route_is_leased_to_exactly_one_of_the_racing_nodes(self):
+        from flights import leases
+        nodes = [f"node-{n}" for n in range(4)]
+
+        leased = self.run_nodes(lambda node: leases.acquire_leases(self.routes, node, 60), nodes)
+
+        winners = [route.pk for node in nodes for route in leased[node]]
+        self.assertEqual(sorted(winners), sorted(route.pk for route in self.routes))
+        self.assertEqual(self.holders(), {route.pk: node for node in nodes for route in leased[node]})
+
+    def test_live_lease_is_taken_over_only_after_its_heartbeat_stops(self):
+        from flights import leases
+        ttl = 0.6
+        leased = self.run_nodes(lambda node: leases.acquire_leases(self.routes, node, ttl), ['node-a'])
+        self.assertEqual(leased['node-a'], self.routes)
+
+        claimed = set()
+
+        def poll(node, until):
+            # Until every route is claimed by someone; a node that stops polling lets go of nothing
+            taken = []
+            while len(claimed) < len(self.routes) and time.monotonic() < until:
+                won = leases.acquire_leases(self.routes, node, ttl)
+                claimed.update(route.pk for route in won)
+                # Re-leasing its own route only extends the lease
+                taken += [route for route in won if route not in taken]
+                time.sleep(0.05)
+            return taken, time.monotonic()
+
+        with leases.heartbeat('node-a', ttl):
+            # Two nodes poll for longer than the lease lasts without renewal
+            deadline = time.monotonic() + 3 * ttl
+            polled = self.run_nodes(lambda node: poll(node, deadline), ['node-b', 'node-c'])
+        stopped = time.monotonic()
+        self.assertEqual([taken for taken, _ in polled.values()], [[], []])
+        self.assertEqual(set(self.holders().values()), {'node-a'})
+
+        # node-a went silent: its leases are handed over once they expire, each to one node
+        polled = self.run_nodes(lambda node: poll(node, stopped + 5 * ttl), ['node-b', 'node-c'])
+        taken = [route.pk for routes, _ in polled.values() for route in routes]
+        self.assertEqual(sorted(taken), sorted(route.pk for route in self.routes))
+        self.assertLessEqual(max(at for _, at in polled.values()) - stopped, 2 * ttl)
+        self.assertNotIn('node-a', self.holders().values())
+
+
+class ResultBufferTests(TestCase):
+
+    def setUp(self):
+        from flights.models import Route
+        self.routes = [
+            Route.objects.create(origin='BGY', destination=dest, date=datetime(2026, 12, 1).date())
+            for dest in ('STN', 'BCN', 'MAD')
+        ]
+
+    def test_results_are_written_in_batches(self):
+        from flights.models import PriceRecord, Route
+        done = []
+        buffer = scraper_service.ResultBuffer(
+            size=2, interval=60, log=lambda msg: None,
+            on_route_done=lambda route, error: done.append((route, PriceRecord.objects.count())),
+        )
+        price = {'currency': '€', 'amount': 10.0, 'date': '2026-12-01'}
+
+        buffer.add(self.routes[0], price)
+        self.assertEqual(PriceRecord.objects.count(), 0)
+        with self.assertNumQueries(11):
+            # savepoint, latest-run lookup, bulk insert, stats lookup and insert,
+            # two interval lookups, bulk update, the two callbacks' counts, release
+            buffer.add(self.routes[1], None)
+        buffer.add(self.routes[2], error='boom')
+        buffer.flush()
+
+        self.assertEqual(buffer.saved, 1)
+        # Callbacks run once the batch's records are in the database
+        self.assertEqual(done, [(self.routes[0], 1), (self.routes[1], 1), (self.routes[2], 1)])
+        self.assertFalse(Route.objects.filter(next_due_at__isnull=True).exists())
+
+    def test_old_results_are_flushed_after_the_interval(self):
+        from flights.models import PriceRecord
+        buffer = scraper_service.ResultBuffer(size=100, interval=0, log=lambda msg: None)
+        buffer.add(self.routes[0], {'currency': '€', 'amount': 10.0, 'date': '2026-12-01'})
+        self.assertEqual(PriceRecord.objects.count(), 1)
+
+    def test_due_results_are_flushed_without_a_new_result(self):
+        from flights.models import PriceRecord
+        buffer = scraper_service.ResultBuffer(size=100, interval=0.05, log=lambda msg: None)
+        buffer.add(self.routes[0], {'currency': '€', 'amount': 10.0, 'date': '2026-12-01'})
+        buffer.flush_if_due()
+        self.assertEqual(PriceRecord.objects.count(), 0)
+
+        time.sleep(0.06)
+        buffer.flush_if_due()
+        self.assertEqual(PriceRecord.objects.count(), 1)
+
+
+class PriceRunTests(TestCase):
+    """Change-only storage: a PriceRecord is a run of identical prices."""
+
+    def setUp(self):
+        from flights.models import Route
+        self.route = Route.objects.create(origin='BGY', destination='STN', date=datetime(2026, 12, 1).date())
+
+    def scrape(self, *amounts):
+        buffer = scraper_service.ResultBuffer(size=1, interval=60, log=lambda msg: None)
+        for amount in amounts:
+            buffer.add(self.route, {'currency': '€', 'amount': amount, 'date': '2026-12-01'})
+        return buffer.saved
+
+    def runs(self):
+        return list(self.route.price_records.order_by('first_seen').values_list('amount', 'observations'))
+
+    def test_unchanged_price_extends_the_latest_run(self):
+        from decimal import Decimal
+        self.assertEqual(self.scrape(19.5, 19.5, 24.0, 19.5, 19.5), 5)
+        self.assertEqual(self.runs(), [(Decimal('19.50'), 2), (Decimal('24.00'), 1), (Decimal('19.50'), 2)])
+        first = self.route.price_records.order_by('first_seen').first()
+        self.assertGreater(first.last_seen, first.first_seen)
+
+    def test_all_mode_keeps_one_row_per_scrape(self):
+        with self.settings(PRICE_STORAGE='all'):
+            self.scrape(19.5, 19.5)
+        self.assertEqual(len(self.runs()), 2)
+
+    def test_compaction_folds_existing_runs(self):
+        from decimal import Decimal
+        from django.utils import timezone
+        from flights.models import PriceRecord
+        start = timezone.now()
+        for minutes, amount in enumerate([10, 10, 12, 12, 12, 10]):
+            seen = start + timedelta(minutes=minutes)
+            PriceRecord.objects.create(route=self.route, amount=amount, currency='€', first_seen=seen, last_seen=seen)
+
+        call_command('compact_prices', stdout=StringIO())
+
+        self.assertEqual(self.runs(), [(Decimal('10.00'), 2), (Decimal('12.00'), 3), (Decimal('10.00'), 1)])
+        middle = self.route.price_records.get(observations=3)
+        self.assertEqual(middle.last_seen - middle.first_seen, timedelta(minutes=2))
+
+    def test_migration_folds_rows_on_its_own(self):
+        import importlib
+        from decimal import Decimal
+        from django.apps import apps
+        from django.utils import timezone
+        from flights.models import PriceRecord
+        migration = importlib.import_module('flights.migrations.0007_compact_pricerecords')
+        start = timezone.now()
+        for minutes, amount in enumerate([10, 10, 12, 10]):
+            PriceRecord.objects.create(route=self.route, amount=amount, currency='€',
+                                       first_seen=start + timedelta(minutes=minutes), last_seen=start)
+
+        with mock.patch('flights.storage.compact_price_records', side_effect=AssertionError('uses live code')):
+            migration.fold_runs(apps, None)
+
+        self.assertEqual(self.runs(), [(Decimal('10.00'), 2), (Decimal('12.00'), 1), (Decimal('10.00'), 1)])
+
+    def test_chart_draws_both_ends_of_each_run(self):
+        self.scrape(19.5, 19.5, 24.0)
+        data = self.client.get(reverse('api_prices', args=[self.route.pk])).json()
+        self.assertEqual(data['prices'], [19.5, 19.5, 24.0])
+        self.assertEqual(data['currency'], '€')
+
+    def test_flat_run_counts_as_a_stable_price(self):
+        from django.utils import timezone
+        from flights import scheduling
+        from flights.models import PriceRecord
+        now = timezone.now()
+        self.route.date = (now + timedelta(days=20)).date()
+        PriceRecord.objects.create(route=self.route, amount=50, currency='€', observations=scheduling.VOLATILITY_WINDOW)
+        self.assertEqual(scheduling.scrape_interval(self.route, now), timedelta(hours=6))
+
+
+class DashboardQueryTests(TestCase):
+
+    def add_routes(self, count, records_each):
+        from flights.models import PriceRecord, Route
+        for index in range(count):
+            day = datetime(2026, 12, 1).date() + timedelta(days=Route.objects.count())
+            route = Route.objects.create(origin='BGY', destination='STN', date=day)
+            for amount in range(records_each):
+                PriceRecord.objects.create(route=route, amount=50 - amount, currency='€')
+        call_command('rebuild_route_stats', stdout=StringIO())
+
+    def test_query_count_does_not_grow_with_routes_or_history(self):
+        self.add_routes(2, 2)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('dashboard'))
+        self.add_routes(10, 8)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['route_data']), 12)
+
+    def test_summary_matches_the_records(self):
+        from decimal import Decimal
+        from django.utils import timezone
+        from flights.models import PriceRecord, Route
+        route = Route.objects.create(origin='BGY', destination='STN', date=datetime(2026, 12, 1).date())
+        Route.objects.create(origin='BGY', destination='BCN', date=datetime(2026, 12, 1).date())
+        start = timezone.now()
+        for minutes, (amount, observations) in enumerate([(40, 3), (25, 1), (30, 2)]):
+            seen = start + timedelta(minutes=minutes)
+            PriceRecord.objects.create(
+                route=route, amount=amount, currency='€', first_seen=seen, last_seen=seen, observations=observations
+            )
+        call_command('rebuild_route_stats', stdout=StringIO())
+
+        items = {item['route'].destination: item for item in self.client.get(reverse('dashboard')).context['route_data']}
+
+        self.assertEqual(items['STN']['latest']['amount'], Decimal('30.00'))
+        self.assertEqual(items['STN']['lowest']['amount'], Decimal('25.00'))
+        self.assertEqual(items['STN']['record_count'], 6)
+        self.assertEqual((items['BCN']['latest'], items['BCN']['record_count']), (None, 0))
+
+
+class RouteStatsTests(TestCase):
+
+    def setUp(self):
+        from flights.models import Route
+        self.route = Route.objects.create(origin='BGY', destination='STN', date=datetime(2026, 12, 1).date())
+
+    def scrape(self, *amounts):
+        buffer = scraper_service.ResultBuffer(size=2, interval=60, log=lambda msg: None)
+        for amount in amounts:
+            buffer.add(self.route, {'currency': '€', 'amount': amount, 'date': '2026-12-01'})
+        buffer.flush()
+
+    def stats(self):
+        from flights.models import RouteStats
+        stats = RouteStats.objects.get(route=self.route)
+        return (stats.latest_amount, stats.min_amount, stats.max_amount, stats.record_count,
+                stats.latest_seen, stats.last_change_at)
+
+    def test_stats_follow_every_write(self):
+        from decimal import Decimal
+        self.scrape(30, 25, 25, 40, 40)
+        latest, low, high, count, seen, changed = self.stats()
+        self.assertEqual((latest, low, high, count), (Decimal('40.00'), Decimal('25.00'), Decimal('40.00'), 5))
+        run = self.route.price_records.order_by('first_seen').last()
+        self.assertEqual((seen, changed), (run.last_seen, run.first_seen))
+
+    def test_rebuild_matches_the_incremental_stats(self):
+        from flights.models import RouteStats
+        for storage in ('changes', 'all'):
+            with self.subTest(storage=storage), self.settings(PRICE_STORAGE=storage):
+                self.route.price_records.all().delete()
+                RouteStats.objects.filter(route=self.route).delete()
+                self.scrape(30, 25, 25, 40, 40, 40)
+                incremental = self.stats()
+                call_command('rebuild_route_stats', stdout=StringIO())
+                self.assertEqual(self.stats(), incremental)
+
+    def test_writes_outside_the_buffer_keep_stats_and_etag_current(self):
+        from decimal import Decimal
+        from flights.models import PriceRecord, RouteStats
+        self.scrape(30, 25)
+        url = reverse('api_prices', args=[self.route.pk])
+        etag = self.client.get(url)['ETag']
+
+        # An old record edited by hand (admin, shell) changes neither the latest sighting nor the count
+        oldest = self.route.price_records.order_by('first_seen', 'pk').first()
+        oldest.amount = 10
+        oldest.save()
+        self.assertEqual(self.stats()[1], Decimal('10.00'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        PriceRecord.objects.create(route=self.route, amount=50, currency='€')
+        latest, low, high, count, seen, changed = self.stats()
+        self.assertEqual((latest, high, count), (Decimal('50.00'), Decimal('50.00'), 3))
+
+        self.route.price_records.filter(amount=50).delete()
+        self.assertEqual(self.stats()[:4], (Decimal('25.00'), Decimal('10.00'), Decimal('25.00'), 2))
+
+        # Deleting the route drops its stats without rebuilding them per record
+        with self.assertNumQueries(6):
+            self.route.delete()
+        self.assertFalse(RouteStats.objects.exists())
+
+    def test_stats_refresh_shares_the_transaction_of_the_write(self):
+        from django.db import DatabaseError, transaction
+        self.scrape(30, 25)
+        record = self.route.price_records.order_by('first_seen', 'pk').first()
+        before = self.stats()
+
+        with mock.patch('flights.storage.rebuild_route_stats', side_effect=DatabaseError('disk full')):
+            record.amount = 10
+            with self.assertRaises(DatabaseError):
+                record.save()
+            # A savepoint stands for the transaction a delete opens under autocommit
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                self.route.price_records.filter(pk=record.pk).delete()
+
+        # Neither write outlived the failed refresh
+        record.refresh_from_db()
+        self.assertEqual(record.amount, 30)
+        self.assertEqual(self.stats(), before)
+
+    def test_migration_builds_stats_on_its_own(self):
+        import importlib
+        from django.apps import apps
+        from flights.models import RouteStats
+        migration = importlib.import_module('flights.migrations.0008_routestats')
+        self.scrape(30, 25, 40)
+        incremental = self.stats()
+        RouteStats.objects.all().delete()
+
+        with mock.patch('flights.storage.rebuild_route_stats', side_effect=AssertionError('uses live code')):
+            migration.build_stats(apps, None)
+
+        self.assertEqual(self.stats(), incremental)
+
+
+class IndexBenchmarkTests(TestCase):
+
+    def test_benchmark_reports_plans_and_rolls_back(self):
+        from flights.models import PriceRecord, Route
+        out = StringIO()
+        call_command('benchmark_indexes', records=2000, routes=20, repeat=5, stdout=out)
+        output = out.getvalue()
+
+        without, with_indexes = output.split('With indexes')
+        # (A 20-row route table is scanned either way)
+        for name in ('price_route_seen_idx', 'price_route_amount_idx'):
+            self.assertNotIn(name, without)
+            self.assertIn(name, with_indexes)
+        self.assertIn('Seeded data rolled back.', output)
+        self.assertFalse(Route.objects.exists() or PriceRecord.objects.exists())
+
+
+class ChartSeriesTests(TestCase):
+
+    def setUp(self):
+        from django.utils import timezone
+        from flights.models import PriceRecord, Route
+        self.route = Route.objects.create(origin='BGY', destination='STN', date=datetime(2026, 12, 1).date())
+        day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+        # Three days with four price changes each, the last run seen until two hours later
+        for d, prices in enumerate([(40, 35, 45, 42), (30, 32, 31, 33), (50, 20, 25, 24)]):
+            for h, amount in enumerate(prices):
+                seen = day + timedelta(days=d, hours=h * 5)
+                PriceRecord.objects.create(route=self.route, amount=amount, currency='€', first_seen=seen, last_seen=seen)
+        last = self.route.price_records.order_by('first_seen').last()
+        last.last_seen += timedelta(hours=2)
+        last.save()
+
+    def get(self, **params):
+        return self.client.get(reverse('api_prices', args=[self.route.pk]), params)
+
+    def test_daily_buckets_keep_last_min_and_max(self):
+        with self.assertNumQueries(5):
+            # ETag version, route, buckets, closing prices, currency
+            data = self.get(resolution='day').json()
+        self.assertEqual(data['prices'], [42.0, 33.0, 24.0, 24.0])
+        self.assertEqual(data['min'][:3], [35.0, 30.0, 20.0])
+        self.assertEqual(data['max'][:3], [45.0, 33.0, 50.0])
+        self.assertEqual(data['currency'], '€')
+
+    def test_max_points_caps_the_series_and_keeps_both_ends(self):
+        full = self.get(max_points=0).json()
+        capped = self.get(max_points=5).json()
+        self.assertEqual(len(full['prices']), 13)
+        self.assertEqual(len(capped['prices']), 5)
+        self.assertEqual(capped['labels'][0], full['labels'][0])
+        self.assertEqual(capped['labels'][-1], full['labels'][-1])
+        # Downsampling picks existing points, in order
+        picked = iter(zip(full['labels'], full['prices']))
+        self.assertTrue(all(point in picked for point in zip(capped['labels'], capped['prices'])))
+
+    def test_max_points_below_three_keeps_the_ends(self):
+        full = self.get(max_points=0).json()
+        self.assertEqual(self.get(max_points=1).json()['prices'], full['prices'][:1])
+        self.assertEqual(self.get(max_points=2).json()['prices'], [full['prices'][0], full['prices'][-1]])
+        self.assertEqual(len(self.get(max_points=2, resolution='day').json()['prices']), 2)
+
+    def test_bad_parameters_are_rejected(self):
+        self.assertEqual(self.get(resolution='minute').status_code, 400)
+        self.assertEqual(self.get(max_points='lots').status_code, 400)
+        response = self.client.get(reverse('route_detail', args=[self.route.pk]), {'max_points': -1})
+        self.assertEqual(response.status_code, 400)
+
+
+class PriceApiPagingTests(TestCase):
+
+    def setUp(self):
+        from flights.models import Route
+        self.route = Route.objects.create(origin='BGY', destination='STN', date=datetime(2026, 12, 1).date())
+        self.scrape(40, 35, 45, 42, 30)
+
+    def scrape(self, *amounts):
+        buffer = scraper_service.ResultBuffer(size=1, interval=60, log=lambda msg: None)
+        for amount in amounts:
+            buffer.add(self.route, {'currency': '€', 'amount': amount, 'date': '2026-12-01'})
+
+    def get(self, **params):
+        headers = {key: params.pop(key) for key in list(params) if key.startswith('HTTP_')}
+        return self.client.get(reverse('api_prices', args=[self.route.pk]), params, **headers)
+
+    def test_cursor_pages_through_every_record_once(self):
+        prices, cursor = [], None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.get(**params).json()
+            prices += data['prices']
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(prices, [40.0, 35.0, 45.0, 42.0, 30.0])
+
+    def test_since_returns_only_new_points(self):
+        last = self.get().json()['timestamps'][-1]
+        self.assertEqual(self.get(since=last).json()['prices'], [])
+        self.scrape(30, 28)
+        # The extended run comes back with its new end only, then the new price
+        data = self.get(since=last).json()
+        self.assertEqual(data['prices'], [30.0, 28.0])
+        since = datetime.fromisoformat(last)
+        self.assertTrue(all(datetime.fromisoformat(at) > since for at in data['timestamps']))
+        paged = self.get(since=last, limit=10).json()
+        self.assertEqual(paged['timestamps'], data['timestamps'])
+
+    def test_until_and_bad_parameters(self):
+        timestamps = self.get().json()['timestamps']
+        self.assertEqual(self.get(until=timestamps[1]).json()['prices'], [40.0, 35.0])
+        self.assertEqual(self.get(since='yesterday').status_code, 400)
+        self.assertEqual(self.get(cursor='nope').status_code, 400)
+        self.assertEqual(self.get(limit=0).status_code, 400)
+        self.assertEqual(self.get(limit=10, resolution='day').status_code, 400)
+
+    def test_unchanged_history_answers_304(self):
+        response = self.get()
+        etag, modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+        # Another query string is another representation
+        self.assertEqual(self.get(resolution='day', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.scrape(30)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_route_detail_pages_the_records_table(self):
+        from flights.models import PriceRecord
+        with self.settings(ROUTE_RECORDS_PER_PAGE=2):
+            response = self.client.get(reverse('route_detail', args=[self.route.pk]), {'page': 2})
+        page = response.context['page_obj']
+        self.assertEqual((page.number, page.paginator.num_pages), (2, 3))
+        self.assertEqual([record.amount for record in page], [45, 35])
+        self.assertEqual(response.context['lowest'].amount, 30)
+        self.assertEqual(response.context['latest'], PriceRecord.objects.order_by('-first_seen').first())
+
+    def test_route_detail_page_links_keep_the_chart_settings(self):
+        with self.settings(ROUTE_RECORDS_PER_PAGE=2):
+            response = self.client.get(
+                reverse('route_detail', args=[self.route.pk]), {'resolution': 'day', 'max_points': 10, 'page': 2}
+            )
+        self.assertContains(response, 'href="?resolution=day&amp;max_points=10&amp;page=1"')
+        self.assertContains(response, 'href="?resolution=day&amp;max_points=10&amp;page=3"')
+
+        with self.settings(ROUTE_RECORDS_PER_PAGE=2):
+            response = self.client.get(reverse('route_detail', args=[self.route.pk]))
+        self.assertContains(response, 'href="?page=2"')
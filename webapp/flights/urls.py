@@ -12,4 +12,5 @@ urlpatterns = [
     path('api/logs/', views.log_stream, name='log_stream'),
     path('api/vpn/', views.vpn_toggle, name='vpn_toggle'),
     path('api/status/', views.api_status, name='api_status'),
+    path('api/metrics/', views.api_metrics, name='api_metrics'),
 ]
@@ -1,24 +1,32 @@
+import hashlib
 import json
 import time
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, StreamingHttpResponse
-from .models import Route, PriceRecord
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from .models import Route, PriceRecord, RouteStats
+from .charts import chart_series, parse_chart_params, parse_time
+from .pagination import cursor_page
 from . import scraper_service
 
 
 def dashboard(request):
     from .utils import get_airport_list
-    routes = Route.objects.prefetch_related('price_records').all()
+    # One query for every route and its RouteStats, however long the history
     route_data = []
-    for route in routes:
-        records = route.price_records.order_by('scraped_at')
-        latest = records.last()
-        lowest = records.order_by('amount').first()
+    for route in Route.objects.select_related('stats'):
+        stats = getattr(route, 'stats', None)
+        latest = lowest = None
+        if stats:
+            latest = {'amount': stats.latest_amount, 'currency': stats.currency, 'last_seen': stats.latest_seen}
+            lowest = {'amount': stats.min_amount, 'currency': stats.currency}
         route_data.append({
             'route': route,
             'latest': latest,
             'lowest': lowest,
-            'record_count': records.count(),
+            'record_count': stats.record_count if stats else 0,
         })
     return render(request, 'flights/dashboard.html', {
         'route_data': route_data,
@@ -30,14 +38,24 @@ def dashboard(request):
 
 def route_detail(request, pk):
     route = get_object_or_404(Route, pk=pk)
-    records = route.price_records.order_by('scraped_at')
-    labels = [r.scraped_at.strftime('%d/%m %H:%M') for r in records]
-    prices = [float(r.amount) for r in records]
+    try:
+        resolution, max_points = parse_chart_params(request.GET, settings.CHART_MAX_POINTS)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    records = route.price_records.order_by('-first_seen', '-pk')
+    page_obj = Paginator(records, settings.ROUTE_RECORDS_PER_PAGE).get_page(request.GET.get('page'))
+    series = chart_series(route.price_records.order_by('first_seen'), resolution, max_points)
+    # Page links keep the chart settings of the current query string
+    page_query = request.GET.copy()
+    page_query.pop('page', None)
     return render(request, 'flights/route_detail.html', {
         'route': route,
-        'records': records,
-        'chart_labels': json.dumps(labels),
-        'chart_prices': json.dumps(prices),
+        'page_obj': page_obj,
+        'page_query': page_query.urlencode(),
+        'latest': records.first(),
+        'lowest': route.price_records.order_by('amount', 'first_seen').first(),
+        'chart_labels': json.dumps(series['labels']),
+        'chart_prices': json.dumps(series['prices']),
         'scraper_running': scraper_service.is_running(),
     })
 
@@ -109,21 +127,88 @@ def vpn_toggle(request):
 
 
 def api_status(request):
-    """Return current scraper status and VPN flag."""
+    """Return current scraper status, VPN flag and the scrape queue with ETAs."""
     return JsonResponse({
         'running': scraper_service.is_running(),
         'vpn': scraper_service.get_vpn(),
+        'queue': scraper_service.queue_status(),
     })
 
 
+def api_metrics(request):
+    """Return per-egress phase latencies, learned timeouts and page costs."""
+    return JsonResponse(scraper_service.get_metrics())
+
+
+def _prices_version(request, pk):
+    """(last write, scrape count) of a route's prices, read once per request from RouteStats."""
+    if not hasattr(request, '_prices_version'):
+        request._prices_version = RouteStats.objects.filter(route_id=pk).values_list(
+            'updated_at', 'record_count'
+        ).first()
+    return request._prices_version
+
+
+def _prices_etag(request, pk):
+    version = _prices_version(request, pk)
+    # The response also depends on the query (range, page, resolution)
+    key = f"{pk}|{version}|{request.GET.urlencode()}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _prices_last_modified(request, pk):
+    version = _prices_version(request, pk)
+    return version[0] if version else None
+
+
+@condition(etag_func=_prices_etag, last_modified_func=_prices_last_modified)
 def api_prices(request, pk):
+    """
+    Chart data of a route, answering 304 Not Modified while no price was
+    scraped since the client's ETag / Last-Modified.
+
+    `since` / `until` (ISO 8601) keep the records seen after / first seen
+    before those times; with `since` every point returned is later than it,
+    so polling clients can append them. `resolution` (hour/day/week/month) aggregates
+    prices per time bucket in SQL, adding per-bucket min and max;
+    `max_points` (default CHART_MAX_POINTS, 0 = no limit) caps the points.
+    With `limit` or `cursor` the raw records are paged instead: pass
+    `next_cursor` back as `cursor` until it is null.
+    """
     route = get_object_or_404(Route, pk=pk)
-    records = route.price_records.order_by('scraped_at')
-    data = {
-        'labels': [r.scraped_at.strftime('%d/%m %H:%M') for r in records],
-        'prices': [float(r.amount) for r in records],
-        'currency': records.first().currency if records.exists() else '?',
-    }
+    paged = 'cursor' in request.GET or 'limit' in request.GET
+    try:
+        resolution, max_points = parse_chart_params(request.GET, settings.CHART_MAX_POINTS)
+        since, until = parse_time(request.GET, 'since'), parse_time(request.GET, 'until')
+        if paged and resolution:
+            raise ValueError("cursor pagination pages raw records and cannot be combined with resolution")
+        try:
+            limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {settings.API_MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    records = route.price_records.all()
+    if since:
+        # A run extended after `since` counts as new: its last_seen moved
+        records = records.filter(last_seen__gt=since)
+    if until:
+        records = records.filter(first_seen__lte=until)
+
+    if paged:
+        try:
+            page, next_cursor = cursor_page(records, request.GET.get('cursor'), limit)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        data = chart_series(page, since=since)
+        data['next_cursor'] = next_cursor
+    else:
+        data = chart_series(records.order_by('first_seen'), resolution, max_points, since)
+    first = route.price_records.order_by('first_seen').values_list('currency', flat=True).first()
+    data['currency'] = first or '?'
     return JsonResponse(data)
 
 
@@ -83,10 +83,68 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets the dashboard read while a scrape writes; writers wait
+            # up to `timeout` seconds for the lock instead of failing with
+            # "database is locked", and take it up front (IMMEDIATE) so a
+            # read can't deadlock on its upgrade to a write.
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
     }
 }
 
 
+# Scraper concurrency
+# Number of routes scraped at the same time by web-triggered scrapes and by
+# run_scraper (overridable with --workers). Each worker drives its own browser.
+
+SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', 1))
+SCRAPER_WORKER_MODE = os.getenv('SCRAPER_WORKER_MODE', 'thread')  # 'thread' or 'process'
+
+# Routes on the same leg whose dates lie within this many days of each other
+# are priced from one results page (the fare carousel shows neighbouring days).
+SCRAPER_GROUP_DAYS = int(os.getenv('SCRAPER_GROUP_DAYS', 3))
+
+# Scrape results are written in one transaction per batch of this many routes,
+# or once the oldest buffered result is this many seconds old (checked at least
+# every second, also while the workers are still busy)
+SCRAPER_FLUSH_SIZE = int(os.getenv('SCRAPER_FLUSH_SIZE', 20))
+SCRAPER_FLUSH_SECONDS = float(os.getenv('SCRAPER_FLUSH_SECONDS', 5))
+
+# 'changes': a scrape that finds the same price as the previous one extends
+# that PriceRecord (last_seen, observations) instead of adding a row.
+# 'all': one row per scrape.
+PRICE_STORAGE = os.getenv('PRICE_STORAGE', 'changes')
+
+# Most points a price chart gets (route_detail and api_prices); longer
+# histories are downsampled with LTTB. Overridable with ?max_points=.
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', 500))
+
+# Records per page: route_detail's history table, and api_prices with
+# cursor pagination (?limit= may ask for up to API_MAX_PAGE_SIZE)
+ROUTE_RECORDS_PER_PAGE = int(os.getenv('ROUTE_RECORDS_PER_PAGE', 50))
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 500))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 5000))
+
+# Scrape queue: jobs claimed at once (priorities are re-checked between batches)
+SCRAPER_QUEUE_BATCH = int(os.getenv('SCRAPER_QUEUE_BATCH', 10))
+
+# Several scraper nodes may share the database. Each leases the routes it
+# scrapes and renews the leases every third of SCRAPER_LEASE_TTL seconds;
+# routes of a node that stopped renewing are handed to the others.
+SCRAPER_NODE_ID = os.getenv('SCRAPER_NODE_ID', '')  # default: hostname-pid
+SCRAPER_LEASE_TTL = int(os.getenv('SCRAPER_LEASE_TTL', 120))
+
+# Adaptive scheduling: each route's interval depends on days to departure and
+# on how much its price moves, clamped to these bounds (seconds). run_scraper
+# checks for due routes every SCRAPER_TICK seconds.
+SCRAPER_MIN_INTERVAL = int(os.getenv('SCRAPER_MIN_INTERVAL', 900))
+SCRAPER_MAX_INTERVAL = int(os.getenv('SCRAPER_MAX_INTERVAL', 86400))
+SCRAPER_TICK = int(os.getenv('SCRAPER_TICK', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -122,3 +180,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# Default primary key field type: BigAutoField, Django 6.0's default that the
+# migrations were created with, also on the older releases requirements.txt allows
+# https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'